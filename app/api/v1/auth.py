@@ -1,10 +1,14 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.core.database import get_db
-from app.core.security import create_access_token, verify_token
+from app.core.database import get_db, release_connection
+from app.core.phone import normalize_phone
+from app.core.security import (
+    create_access_token, verify_token, hash_password_async, verify_password_async, password_needs_rehash,
+)
 from app.schemas.user import OTPRequest, OTPVerify, UserCreate, UserLogin, Token
-from app.services.user_service import UserService
+from app.services.user_service import UserService, LOAD_AUTH, LOAD_LOOKUP
 from datetime import timedelta
 from config import settings
 
@@ -16,15 +20,15 @@ async def request_otp(otp_request: OTPRequest, db: Session = Depends(get_db)):
     user_service = UserService(db)
     
     # Pour le numéro de test, retourner toujours le même OTP
-    if otp_request.phone_number == "0505979884":
+    if normalize_phone(otp_request.phone_number) == normalize_phone("0505979884"):
         return {
             "message": "Code OTP envoyé",
             "otp_code": "1234",  # Code de test
             "expires_in_minutes": settings.otp_expire_minutes
         }
     
-    # Créer un OTP pour les autres numéros
-    otp = user_service.create_otp(otp_request.phone_number)
+    # Créer un OTP pour les autres numéros (store Redis synchrone : hors de la boucle d'événements)
+    otp = await asyncio.to_thread(user_service.create_otp, otp_request.phone_number)
     
     # En production, ici vous enverriez le SMS
     # Pour le développement, on retourne le code
@@ -41,19 +45,27 @@ async def verify_otp(otp_verify: OTPVerify, db: Session = Depends(get_db)):
     
     # Autoriser n'importe quel numéro à utiliser '1234' comme OTP (dev/demo)
     if otp_verify.otp_code == "1234":
-        user = user_service.get_user_by_phone(otp_verify.phone_number)
+        user = user_service.get_user_by_phone(otp_verify.phone_number, LOAD_AUTH)
         if not user:
             user_data = UserCreate(
                 phone_number=otp_verify.phone_number,
                 password=otp_verify.password or 'azerty'
             )
-            user = user_service.create_user(user_data)
+            # bcrypt dans le pool de hachage (la boucle d'événements n'est pas bloquée), sans retenir de connexion
+            release_connection(db)
+            user = user_service.create_user(user_data, hashed_password=await hash_password_async(user_data.password))
         else:
             # Mettre à jour le mot de passe si fourni
             if otp_verify.password:
                 from app.schemas.user import UserUpdate
-                user_service.update_user(user.id, UserUpdate(password=otp_verify.password))
-        user_service.mark_user_verified(otp_verify.phone_number)
+                release_connection(db)
+                hashed_password = await hash_password_async(otp_verify.password)
+                await asyncio.to_thread(
+                    user_service.update_user, user.id, UserUpdate(password=otp_verify.password),
+                    hashed_password=hashed_password
+                )
+        # Invalidation du cache des principaux (Redis) : hors de la boucle d'événements
+        await asyncio.to_thread(user_service.mark_user_verified, otp_verify.phone_number)
         access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
         access_token = create_access_token(
             data={"sub": user.phone_number}, expires_delta=access_token_expires
@@ -70,14 +82,14 @@ async def verify_otp(otp_verify: OTPVerify, db: Session = Depends(get_db)):
         }
     
     # Vérifier l'OTP pour les autres numéros
-    if user_service.verify_otp(otp_verify.phone_number, otp_verify.otp_code):
-        user = user_service.get_user_by_phone(otp_verify.phone_number)
+    if await asyncio.to_thread(user_service.verify_otp, otp_verify.phone_number, otp_verify.otp_code):
+        user = user_service.get_user_by_phone(otp_verify.phone_number, LOAD_AUTH)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Utilisateur non trouvé"
             )
-        user_service.mark_user_verified(otp_verify.phone_number)
+        await asyncio.to_thread(user_service.mark_user_verified, otp_verify.phone_number)
         access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
         access_token = create_access_token(
             data={"sub": user.phone_number}, expires_delta=access_token_expires
@@ -111,6 +123,11 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         
         # Nettoyer le numéro de téléphone (enlever les espaces)
         phone_number = user_data.phone_number.strip()
+        if normalize_phone(phone_number) is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Numéro de téléphone invalide"
+            )
         
         if not user_data.password or len(user_data.password) < 6:
             raise HTTPException(
@@ -121,7 +138,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         user_service = UserService(db)
         
         # Vérifier si l'utilisateur existe déjà
-        existing_user = user_service.get_user_by_phone(phone_number)
+        existing_user = user_service.get_user_by_phone(phone_number, LOAD_LOOKUP)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -131,8 +148,10 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         # Mettre à jour le phone_number dans user_data
         user_data.phone_number = phone_number
         
-        # Créer l'utilisateur
-        user = user_service.create_user(user_data)
+        # Créer l'utilisateur (bcrypt dans le pool de hachage, hors de la boucle d'événements,
+        # sans retenir de connexion pendant le calcul)
+        release_connection(db)
+        user = user_service.create_user(user_data, hashed_password=await hash_password_async(user_data.password))
         
         return {
             "message": "Utilisateur créé avec succès",
@@ -179,7 +198,7 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
         user_service = UserService(db)
         
         # Vérifier l'utilisateur
-        user = user_service.get_user_by_phone(user_login.phone_number)
+        user = user_service.get_user_by_phone(user_login.phone_number, LOAD_AUTH)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -193,22 +212,30 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
                 detail="Aucun mot de passe défini pour ce compte. Veuillez vous réinscrire."
             )
         
-        if not user_service.verify_password(user, user_login.password):
+        # bcrypt dans le pool de hachage : une rafale de connexions ne gèle pas les autres requêtes
+        # (la connexion à la base est rendue au pool pendant le calcul)
+        hashed_password, is_active, phone_number = user.hashed_password, user.is_active, user.phone_number
+        release_connection(db)
+        if not await verify_password_async(user_login.password, hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Numéro de téléphone ou mot de passe incorrect"
             )
         
-        if not user.is_active:
+        if not is_active:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Compte utilisateur désactivé"
             )
         
+        # Coût bcrypt modifié (BCRYPT_ROUNDS), compte actif uniquement : le hash est recalculé avec le mot de passe en clair disponible
+        if password_needs_rehash(hashed_password):
+            user_service.set_password_hash(user, await hash_password_async(user_login.password))
+        
         # Créer un token d'accès
         access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
         access_token = create_access_token(
-            data={"sub": user.phone_number}, expires_delta=access_token_expires
+            data={"sub": phone_number}, expires_delta=access_token_expires
         )
         
         return {
@@ -0,0 +1,194 @@
+import asyncio
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.orm import Session
+from app.api.v1.transactions import get_current_user
+from app.core.database import get_db, release_connection
+from app.core.responses import etag_matches
+from app.services.media_store import MEDIA_NAME, MEDIA_TYPES, MediaError, MediaTooLarge, media_store, parse_range
+from app.services.user_service import UserService
+
+router = APIRouter()
+
+# Type de média -> colonne users qui en garde l'URL
+MEDIA_FIELDS = {
+    "profile_picture": "profile_picture_url",
+    "front_id": "front_id_photo_url",
+    "back_id": "back_id_photo_url",
+    "selfie": "selfie_photo_url",
+}
+# Marge pour l'enveloppe multipart (délimiteurs, en-têtes de la partie) au-delà de MEDIA_MAX_BYTES
+MULTIPART_OVERHEAD = 16 * 1024
+# Champ multipart qui porte le fichier
+FILE_FIELD = b"file"
+# Contenu immuable (adressé par son empreinte) mais personnel : pas de cache partagé
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+class FilePartParser:
+    """Analyse incrémentale d'un corps multipart : seules les données du premier fichier `file` sont retenues
+
+    Les données de la partie sont rendues par write() au fil des morceaux reçus, sans mise en tampon du corps.
+    """
+
+    def __init__(self, boundary: bytes):
+        self.found = False
+        self.complete = False
+        self._in_file = False
+        self._data = []
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self.parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+            "on_end": self._end,
+        })
+
+    def write(self, chunk: bytes) -> bytes:
+        """Analyser un morceau du corps ; renvoie les octets du fichier qu'il contenait"""
+        self.parser.write(chunk)
+        data, self._data = b"".join(self._data), []
+        return data
+
+    def _part_begin(self) -> None:
+        self._headers = {}
+
+    def _header_field_data(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field, self._header_value = b"", b""
+
+    def _headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = not self.found and options.get(b"name") == FILE_FIELD and b"filename" in options
+        self.found = self.found or self._in_file
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self._data.append(data[start:end])
+
+    def _part_end(self) -> None:
+        self._in_file = False
+
+    def _end(self) -> None:
+        self.complete = True
+
+
+async def receive_media(request: Request):
+    """Lire le corps en flux et écrire le fichier au fur et à mesure : 413 dès que MEDIA_MAX_BYTES est dépassé
+
+    La limite vaut aussi pour un corps envoyé sans Content-Length (Transfer-Encoding: chunked).
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Champ multipart `file` requis")
+
+    parser = FilePartParser(boundary)
+    writer = await asyncio.to_thread(media_store.writer)
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > media_store.max_bytes + MULTIPART_OVERHEAD:
+                raise MediaTooLarge(f"Fichier trop volumineux (maximum {media_store.max_bytes} octets)")
+            data = parser.write(chunk)
+            if data:
+                await asyncio.to_thread(writer.write, data)
+        parser.parser.finalize()
+        if not parser.complete:
+            raise MediaError("Corps multipart incomplet")
+        if not parser.found:
+            raise MediaError("Champ multipart `file` requis")
+        return await asyncio.to_thread(writer.finish)
+    except MediaTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except MultipartParseError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Corps multipart invalide")
+    except MediaError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        await asyncio.to_thread(writer.close)
+
+
+@router.post("/{kind}")
+async def upload_media(
+    kind: str,
+    request: Request,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Envoyer une photo (multipart, champ `file`) : stockée par empreinte, URL enregistrée dans le profil"""
+    field = MEDIA_FIELDS.get(kind)
+    if field is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Type de média inconnu")
+
+    # Refus avant lecture du corps quand la taille est annoncée
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > media_store.max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Fichier trop volumineux")
+
+    release_connection(db)
+    stored = await receive_media(request)
+
+    UserService(db).set_media_url(current_user.id, field, stored.url)
+    return {
+        "url": stored.url,
+        "field": field,
+        "sha256": stored.digest,
+        "size": stored.size,
+        "content_type": stored.content_type,
+    }
+
+
+@router.get("/{name}")
+async def download_media(name: str, request: Request):
+    """Télécharger un média en flux (ETag = empreinte du contenu, If-None-Match -> 304, Range -> 206)"""
+    path = media_store.path(name)
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Média non trouvé")
+
+    digest, extension = MEDIA_NAME.fullmatch(name).groups()
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    size = os.path.getsize(path)
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except MediaError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    else:
+        (start, end), status_code = byte_range, status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        media_store.read(path, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type=MEDIA_TYPES[extension],
+    )
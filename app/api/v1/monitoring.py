@@ -0,0 +1,35 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from app.core.database import pool_status
+from app.core.metrics import metrics
+from config import settings
+
+
+def require_monitoring_token(x_monitoring_token: Optional[str] = Header(None)):
+    """Accès réservé à l'exploitation : en-tête X-Monitoring-Token égal à MONITORING_TOKEN"""
+    if not settings.monitoring_token:
+        if settings.debug:
+            return
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Monitoring désactivé (MONITORING_TOKEN non défini)"
+        )
+    if not x_monitoring_token or not hmac.compare_digest(x_monitoring_token.encode(), settings.monitoring_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Jeton de monitoring invalide"
+        )
+
+
+router = APIRouter(dependencies=[Depends(require_monitoring_token)])
+
+@router.get("/pool", response_model=dict)
+async def get_pool_status():
+    """État du pool de connexions (empruntées, libres, débordement, temps d'attente)"""
+    return pool_status()
+
+@router.get("/metrics", response_model=dict)
+async def get_metrics():
+    """Métriques du processus courant (compteurs, jauges, durées)"""
+    return metrics.snapshot()
@@ -1,67 +1,165 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import off_loop
+from app.core.database import get_db, get_read_db, get_async_read_db
+from app.core.replicas import issue_read_token, session_position, READ_TOKEN_HEADER
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.responses import (
+    WALLET_SERIALIZER, FastJSONResponse, conditional, history_etag, json_response, serialize,
+    transactions_json, version_etag,
+)
 from app.core.security import verify_token
-from app.schemas.transaction import TransactionCreate, Transaction, Wallet
-from app.services.transaction_service import TransactionService
-from app.services.user_service import UserService
+from app.schemas.transaction import (
+    TransactionCreate, Transaction, Wallet, WalletBalanceAt, BatchTransferRequest, BatchTransferResult,
+)
+from app.services.transaction_service import TransactionService, AsyncTransactionService
+from app.services.user_service import UserService, AsyncUserService, LOAD_LOOKUP
+from app.services.ledger_service import LedgerService, external_account
+from app.services.payout_service import PayoutService
+from app.services.wallet_cache import wallet_cache
+from config import settings
 from typing import List, Optional
+from datetime import datetime, timezone
 from decimal import Decimal
+import asyncio
 from pydantic import BaseModel
 
 router = APIRouter()
 
 def get_current_user(token: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """Récupérer l'utilisateur actuel à partir du token"""
+    """Récupérer l'utilisateur actuel à partir du token
+
+    Seul le principal (id, numéro, statut) est chargé, et mis en cache : une requête authentifiée
+    ne lit la table users qu'à l'expiration du cache ou après une modification du compte.
+    """
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token d'authentification requis"
         )
     
-    user_service = UserService(db)
-    user = user_service.get_user_by_phone(token.get("sub"))
+    user = UserService(db).get_principal(token.get("sub"))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Utilisateur non trouvé"
         )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Compte utilisateur désactivé"
+        )
     return user
 
+def require_positive_amount(amount: Decimal) -> None:
+    """400 si le montant n'est pas strictement positif (le grand livre refuse les montants négatifs)"""
+    if amount <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Le montant doit être supérieur à 0"
+        )
+
+def wallet_response(request: Request, user_id: int, wallet, version: int, is_active: bool) -> Response:
+    """Portefeuille (ligne ou instantané du cache) ; 304 si le client a déjà cette version du solde"""
+    etag = version_etag("wallet", user_id, version, is_active)
+    return conditional(request, etag, lambda: FastJSONResponse(serialize(WALLET_SERIALIZER, wallet)))
+
 @router.get("/wallet", response_model=Wallet)
 async def get_wallet(
+    request: Request,
     phone: Optional[str] = Query(None, description="Numéro de téléphone de l'utilisateur"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+    adb: Optional[AsyncSession] = Depends(get_async_read_db)
 ):
-    """Récupérer le solde du portefeuille par numéro de téléphone"""
-    transaction_service = TransactionService(db)
-    user_service = UserService(db)
+    """Récupérer le solde du portefeuille par numéro de téléphone
+
+    Servi par le cache des soldes (mis à jour à chaque écriture), sinon par un réplica si possible
+    (en-tête X-Read-Token pour lire ses propres écritures) ; 304 si If-None-Match porte la version actuelle
+    """
+    # Si pas de numéro fourni, erreur
+    if not phone:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Numéro de téléphone requis"
+        )
     
-    # Si un numéro de téléphone est fourni, l'utiliser
-    if phone:
-        # Nettoyer le numéro (enlever +225, espaces, etc.)
-        clean_phone = phone.replace('+', '').replace(' ', '').strip()
-        if clean_phone.startswith('225') and len(clean_phone) > 10:
-            clean_phone = clean_phone[3:]
-        
-        user = user_service.get_user_by_phone(clean_phone)
+    read_token = request.headers.get(READ_TOKEN_HEADER)
+    
+    # Mode asynchrone : aucune requête ne bloque la boucle d'événements
+    if adb is not None:
+        user = await AsyncUserService(adb).get_user_by_phone(phone, LOAD_LOOKUP)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Utilisateur non trouvé"
+            )
+        cached = await off_loop(wallet_cache.backend, wallet_cache.get, user.id, read_token)
+        if cached is not None:
+            return wallet_response(request, user.id, cached, cached["version"], cached["is_active"])
+        # Position couverte par la lecture : celle du réplica, sinon celle du primaire avant la lecture
+        position = adb.info["read_position"]
+        if position is None:
+            position = await adb.run_sync(session_position)
+        wallet = await AsyncTransactionService(adb).get_wallet(user.id)
+    else:
+        user = UserService(read_db).get_user_by_phone(phone, LOAD_LOOKUP)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Utilisateur non trouvé"
             )
-        wallet = transaction_service.get_or_create_wallet(user.id)
-    return wallet
+        cached = await off_loop(wallet_cache.backend, wallet_cache.get, user.id, read_token)
+        if cached is not None:
+            return wallet_response(request, user.id, cached, cached["version"], cached["is_active"])
+        position = read_db.info["read_position"]
+        if position is None:
+            position = session_position(read_db)
+        wallet = TransactionService(read_db).get_wallet(user.id)
+    
+    # Premier accès : le portefeuille est créé sur le primaire
+    if not wallet:
+        position = session_position(db)
+        wallet = TransactionService(db).get_or_create_wallet(user.id)
+    await off_loop(wallet_cache.backend, wallet_cache.put, wallet, position)
+    return wallet_response(request, user.id, wallet, wallet.version, wallet.is_active)
+
+@router.get("/wallet/balance-at", response_model=WalletBalanceAt)
+async def get_wallet_balance_at(
+    phone: str = Query(..., description="Numéro de téléphone de l'utilisateur"),
+    at: datetime = Query(..., description="Date et heure (ISO 8601) du solde demandé"),
+    db: Session = Depends(get_read_db)
+):
+    """Solde du portefeuille à une date donnée, reconstitué depuis le grand livre
+    (dernier instantané antérieur + écritures suivantes)"""
+    user = UserService(db).get_user_by_phone(phone, LOAD_LOOKUP)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utilisateur non trouvé"
+        )
+    wallet = TransactionService(db).get_wallet(user.id)
+    if not wallet:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portefeuille non trouvé"
+        )
     
-    # Si pas de numéro fourni, erreur
-    raise HTTPException(
-        status_code=status.HTTP_400_BAD_REQUEST,
-        detail="Numéro de téléphone requis"
+    # Une date sans fuseau est interprétée en UTC
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return WalletBalanceAt(
+        wallet_id=wallet.id,
+        at=at,
+        balance=LedgerService(db).balance_at(wallet.id, at),
+        currency=wallet.currency or "XOF"
     )
 
 @router.post("/deposit", response_model=Transaction)
 async def create_deposit(
     transaction_data: TransactionCreate,
+    response: Response,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -72,26 +170,35 @@ async def create_deposit(
             detail="Type de transaction invalide pour un dépôt"
         )
     
+    require_positive_amount(transaction_data.amount)
+    
     transaction_service = TransactionService(db)
     
-    # Créer la transaction
-    transaction = transaction_service.create_transaction(current_user.id, transaction_data)
+    # Créer la transaction (validée avec le solde, dans le même commit)
+    transaction = transaction_service.create_transaction(current_user.id, transaction_data, auto_commit=False)
     
-    # Mettre à jour le solde du portefeuille
+    # Créditer le portefeuille (UPDATE ... RETURNING + écriture du grand livre contre l'opérateur)
     transaction_service.update_wallet_balance(
         current_user.id, 
         transaction_data.amount, 
-        "add"
+        "add",
+        counter_account=external_account(transaction_data.network),
+        transaction_reference=transaction.reference
     )
     
     # Marquer la transaction comme complétée
-    transaction_service.update_transaction_status(transaction.id, "completed")
+    transaction.status = "completed"
+    db.commit()
+    db.refresh(transaction)
     
+    # Jeton read-your-writes pour les lectures suivantes du client
+    response.headers[READ_TOKEN_HEADER] = issue_read_token(db)
     return transaction
 
 @router.post("/withdrawal", response_model=Transaction)
 async def create_withdrawal(
     transaction_data: TransactionCreate,
+    response: Response,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -102,40 +209,42 @@ async def create_withdrawal(
             detail="Type de transaction invalide pour un retrait"
         )
     
-    transaction_service = TransactionService(db)
+    require_positive_amount(transaction_data.amount)
     
-    # Vérifier le solde disponible
-    current_balance = transaction_service.get_wallet_balance(current_user.id)
-    if current_balance < transaction_data.amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Solde insuffisant"
-        )
+    transaction_service = TransactionService(db)
     
-    # Créer la transaction
-    transaction = transaction_service.create_transaction(current_user.id, transaction_data)
+    # Créer la transaction (validée avec le solde, dans le même commit)
+    transaction = transaction_service.create_transaction(current_user.id, transaction_data, auto_commit=False)
     
-    # Mettre à jour le solde du portefeuille
+    # Débiter le portefeuille : le contrôle du solde est porté par l'UPDATE conditionnel (pas de lecture préalable)
     updated_wallet = transaction_service.update_wallet_balance(
         current_user.id, 
         transaction_data.amount, 
-        "subtract"
+        "subtract",
+        counter_account=external_account(transaction_data.network),
+        transaction_reference=transaction.reference
     )
     
     if not updated_wallet:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Solde insuffisant"
         )
     
     # Marquer la transaction comme complétée
-    transaction_service.update_transaction_status(transaction.id, "completed")
+    transaction.status = "completed"
+    db.commit()
+    db.refresh(transaction)
     
+    # Jeton read-your-writes pour les lectures suivantes du client
+    response.headers[READ_TOKEN_HEADER] = issue_read_token(db)
     return transaction
 
 @router.post("/transfer", response_model=Transaction)
 async def create_transfer(
     transaction_data: TransactionCreate,
+    response: Response,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -146,6 +255,8 @@ async def create_transfer(
             detail="Type de transaction invalide pour un transfert"
         )
     
+    require_positive_amount(transaction_data.amount)
+    
     if not transaction_data.recipient_phone:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -155,84 +266,151 @@ async def create_transfer(
     transaction_service = TransactionService(db)
     user_service = UserService(db)
     
-    # Vérifier que le destinataire existe
-    recipient = user_service.get_user_by_phone(transaction_data.recipient_phone)
+    # Vérifier que le destinataire existe (principal seulement : id, numéro, statut ; cache Redis hors de la boucle)
+    recipient = await asyncio.to_thread(user_service.get_principal, transaction_data.recipient_phone)
     if not recipient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Destinataire non trouvé"
         )
     
-    # Vérifier le solde disponible
-    current_balance = transaction_service.get_wallet_balance(current_user.id)
-    if current_balance < transaction_data.amount:
+    if recipient.id == current_user.id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Solde insuffisant"
+            detail="Vous ne pouvez pas vous transférer de l'argent à vous-même"
         )
     
-    # Créer la transaction
-    transaction = transaction_service.create_transaction(current_user.id, transaction_data)
-    
-    # Débiter le compte de l'expéditeur
-    updated_wallet = transaction_service.update_wallet_balance(
-        current_user.id, 
-        transaction_data.amount, 
-        "subtract"
+    # Transaction, soldes et grand livre dans un seul commit ; verrous dans l'ordre des portefeuilles,
+    # rejoué automatiquement en cas d'interblocage (attente entre tentatives hors de la boucle d'événements)
+    result = await asyncio.to_thread(
+        transaction_service.transfer,
+        current_user.id,
+        recipient.id,
+        transaction_data.amount,
+        [(current_user.id, transaction_data)]
     )
     
-    if not updated_wallet:
+    if not result:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Solde insuffisant"
         )
     
-    # Créditer le compte du destinataire
-    transaction_service.update_wallet_balance(
-        recipient.id, 
-        transaction_data.amount, 
-        "add"
-    )
-    
-    # Marquer la transaction comme complétée
-    transaction_service.update_transaction_status(transaction.id, "completed")
+    transaction = result.transactions[0]
+    db.refresh(transaction)
     
+    # Jeton read-your-writes pour les lectures suivantes du client
+    response.headers[READ_TOKEN_HEADER] = issue_read_token(db)
     return transaction
 
+@router.post("/batch-transfer", response_model=BatchTransferResult)
+async def create_batch_transfer(
+    batch: BatchTransferRequest,
+    response: Response,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Paiement groupé (salaires, cashback) vers des utilisateurs Fintel
+
+    Le total des lignes valides est débité une seule fois ; chaque ligne est créditée ou rejetée
+    (destinataire inconnu ou inactif, montant invalide) et le rapport détaille le résultat ligne par ligne.
+    Si le solde ne couvre pas le total, rien n'est exécuté.
+    """
+    if not batch.lines:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Aucune ligne de paiement"
+        )
+    if len(batch.lines) > settings.batch_transfer_max_lines:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Trop de lignes ({len(batch.lines)}), maximum {settings.batch_transfer_max_lines} par lot"
+        )
+    
+    # Numéros résolus sous leur forme canonique (users.phone_e164) par PayoutService
+    lines = [(line.recipient_phone, line.amount, line.description) for line in batch.lines]
+    
+    # Dans un thread : l'attente entre tentatives (interblocage) ne bloque pas la boucle d'événements
+    report = await asyncio.to_thread(PayoutService(db).batch_transfer, current_user, lines, batch.description)
+    if report is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Solde insuffisant pour le total du paiement groupé"
+        )
+    
+    # Jeton read-your-writes pour les lectures suivantes du client
+    response.headers[READ_TOKEN_HEADER] = issue_read_token(db)
+    return report
+
 @router.get("/history", response_model=List[Transaction])
 async def get_transaction_history(
+    request: Request,
     phone: Optional[str] = Query(None, description="Numéro de téléphone de l'utilisateur"),
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Curseur de la page suivante (en-tête X-Next-Cursor de la page précédente)"),
+    db: Session = Depends(get_read_db),
+    adb: Optional[AsyncSession] = Depends(get_async_read_db)
 ):
-    """Récupérer l'historique des transactions par numéro de téléphone"""
-    transaction_service = TransactionService(db)
-    user_service = UserService(db)
+    """Récupérer l'historique des transactions par numéro de téléphone
+
+    Pagination par curseur : la réponse contient l'en-tête X-Next-Cursor tant qu'il reste des
+    transactions, à renvoyer en paramètre `cursor`. Le paramètre `offset` reste accepté pour
+    les anciens clients mais son coût augmente avec la profondeur.
+
+    Lecture servie par un réplica si possible (en-tête X-Read-Token pour lire ses propres écritures).
+    En-tête ETag : renvoyé dans If-None-Match, il donne un 304 tant que la page n'a pas changé.
+    """
+    # Si pas de numéro fourni, erreur
+    if not phone:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Numéro de téléphone requis"
+        )
     
-    # Si un numéro de téléphone est fourni, l'utiliser
-    if phone:
-        # Nettoyer le numéro (enlever +225, espaces, etc.)
-        clean_phone = phone.replace('+', '').replace(' ', '').strip()
-        if clean_phone.startswith('225') and len(clean_phone) > 10:
-            clean_phone = clean_phone[3:]
-        
-        user = user_service.get_user_by_phone(clean_phone)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Utilisateur non trouvé"
-            )
-        
-    transactions = transaction_service.get_user_transactions(
-            user.id, limit, offset
-    )
-    return transactions
+    # Mode asynchrone : aucune requête ne bloque la boucle d'événements
+    if adb is not None:
+        user_service = AsyncUserService(adb)
+        transaction_service = AsyncTransactionService(adb)
+        user = await user_service.get_user_by_phone(phone, LOAD_LOOKUP)
+    else:
+        user_service = UserService(db)
+        transaction_service = TransactionService(db)
+        user = user_service.get_user_by_phone(phone, LOAD_LOOKUP)
     
-    # Si pas de numéro fourni, erreur
-    raise HTTPException(
-        status_code=status.HTTP_400_BAD_REQUEST,
-        detail="Numéro de téléphone requis"
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utilisateur non trouvé"
+        )
+    
+    # Ancienne pagination par offset (compatibilité)
+    if offset and not cursor:
+        transactions = transaction_service.get_user_transactions(user.id, limit, offset)
+        transactions = await transactions if adb is not None else transactions
+        return conditional(
+            request, history_etag(transactions, user.id, limit, offset),
+            lambda: json_response(transactions_json(transactions)),
+        )
+    
+    try:
+        # Les mois archivés sont lus sur disque : le chemin synchrone passe par un thread
+        if adb is not None:
+            page = transaction_service.get_user_transactions_page(user.id, limit, cursor)
+        else:
+            page = asyncio.to_thread(transaction_service.get_user_transactions_page, user.id, limit, cursor)
+        transactions, next_cursor = await page
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    # Lignes sérialisées directement en JSON (pas de modèle Pydantic par transaction) ;
+    # 304 si aucune ligne de la page n'a changé (nouvelle transaction, changement de statut)
+    return conditional(
+        request, history_etag(transactions, user.id, limit, cursor, next_cursor),
+        lambda: json_response(transactions_json(transactions), headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None),
     )
 
 # Schéma pour les transferts Fintel (sans token)
@@ -245,6 +423,7 @@ class FintelTransferRequest(BaseModel):
 @router.post("/fintel-transfer", response_model=dict)
 async def create_fintel_transfer(
     transfer_data: FintelTransferRequest,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
@@ -258,34 +437,26 @@ async def create_fintel_transfer(
     # Log du montant reçu
     print(f"💰 MONTANT REÇU DANS L'API: {transfer_data.amount} (type: {type(transfer_data.amount)})")
     
-    # Nettoyer les numéros de téléphone (enlever +225, espaces, etc.)
-    sender_phone = transfer_data.sender_phone.replace('+', '').replace(' ', '').strip()
-    recipient_phone = transfer_data.recipient_phone.replace('+', '').replace(' ', '').strip()
-    
-    # Enlever l'indicatif 225 si présent
-    if sender_phone.startswith('225') and len(sender_phone) > 10:
-        sender_phone = sender_phone[3:]
-    if recipient_phone.startswith('225') and len(recipient_phone) > 10:
-        recipient_phone = recipient_phone[3:]
-    
-    # Vérifier que l'expéditeur existe
-    sender = user_service.get_user_by_phone(sender_phone)
+    # Vérifier que l'expéditeur existe (numéro sous toute écriture : +225, espaces...)
+    sender = user_service.get_user_by_phone(transfer_data.sender_phone, LOAD_LOOKUP)
     if not sender:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Expéditeur non trouvé"
         )
     
+    sender_phone = sender.phone_number
     print(f"👤 Expéditeur trouvé: user_id={sender.id}, phone={sender_phone}, name={sender.first_name or 'N/A'}")
     
     # Vérifier que le destinataire existe (c'est un numéro Fintel)
-    recipient = user_service.get_user_by_phone(recipient_phone)
+    recipient = user_service.get_user_by_phone(transfer_data.recipient_phone, LOAD_LOOKUP)
     if not recipient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Le destinataire n'est pas un utilisateur Fintel"
         )
     
+    recipient_phone = recipient.phone_number
     print(f"👤 Destinataire trouvé: user_id={recipient.id}, phone={recipient_phone}, name={recipient.first_name or 'N/A'}")
     
     # Vérifier qu'on ne se transfère pas à soi-même
@@ -296,67 +467,12 @@ async def create_fintel_transfer(
         )
     
     # Vérifier que le montant est positif
-    if transfer_data.amount <= 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Le montant doit être supérieur à 0"
-        )
-    
-    # Vérifier le solde disponible de l'expéditeur (le solde peut être égal au montant, donc descendre à 0)
-    sender_balance = transaction_service.get_wallet_balance(sender.id)
-    if sender_balance < transfer_data.amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Solde insuffisant. Votre solde actuel est de {sender_balance} XOF. Vous devez avoir au moins {transfer_data.amount} XOF."
-        )
+    require_positive_amount(transfer_data.amount)
     
     try:
         # PROCESSUS SIMPLE : Débiter l'expéditeur, créditer le destinataire
         
-        # 1. Récupérer les soldes initiaux
-        initial_sender_balance = transaction_service.get_wallet_balance(sender.id)
-        initial_recipient_balance = transaction_service.get_wallet_balance(recipient.id)
-        
-        print(f"📊 AVANT TRANSFERT:")
-        print(f"   Expéditeur {sender_phone}: {initial_sender_balance} XOF")
-        print(f"   Destinataire {recipient_phone}: {initial_recipient_balance} XOF")
-        print(f"   Montant: {transfer_data.amount} XOF")
-        
-        # 2. Débiter l'expéditeur
-        sender_wallet = transaction_service.update_wallet_balance(
-            sender.id,
-            transfer_data.amount,
-            "subtract",
-            auto_commit=False
-        )
-        
-        if not sender_wallet:
-            db.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Solde insuffisant"
-            )
-        
-        print(f"✅ Débit effectué: {sender_phone} → {sender_wallet.balance} XOF")
-        
-        # 3. Créditer le destinataire
-        recipient_wallet = transaction_service.update_wallet_balance(
-            recipient.id,
-            transfer_data.amount,
-            "add",
-            auto_commit=False
-        )
-        
-        if not recipient_wallet:
-            db.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erreur lors du crédit du destinataire"
-            )
-        
-        print(f"✅ Crédit effectué: {recipient_phone} → {recipient_wallet.balance} XOF")
-        
-        # 4. Créer les transactions SANS commit auto (pour que tout soit dans la même transaction atomique)
+        # 1. Transactions de l'expéditeur et du destinataire
         sender_transaction_data = TransactionCreate(
             transaction_type="transfer",
             amount=transfer_data.amount,
@@ -364,17 +480,6 @@ async def create_fintel_transfer(
             description=f"Envoi vers {recipient.first_name or recipient_phone}",
             recipient_phone=recipient_phone
         )
-        sender_transaction = transaction_service.create_transaction(
-            sender.id,
-            sender_transaction_data,
-            auto_commit=False  # Pas de commit auto, sera fait avec le commit global
-        )
-        transaction_service.update_transaction_status(
-            sender_transaction.id,
-            "completed",
-            auto_commit=False  # Pas de commit auto, sera fait avec le commit global
-        )
-        
         recipient_transaction_data = TransactionCreate(
             transaction_type="transfer",
             amount=transfer_data.amount,
@@ -382,62 +487,44 @@ async def create_fintel_transfer(
             description=f"Reçu de {sender.first_name or sender_phone}",
             recipient_phone=sender_phone
         )
-        recipient_transaction = transaction_service.create_transaction(
+        recipient_name = recipient.first_name or recipient_phone
+        
+        # 2. Débiter l'expéditeur et créditer le destinataire, transactions comprises, en un seul commit :
+        # le solde (qui peut descendre à 0) est contrôlé par l'UPDATE conditionnel lui-même, les
+        # portefeuilles sont verrouillés dans l'ordre de leurs id et le transfert est rejoué en cas d'interblocage
+        # (dans un thread : l'attente entre tentatives ne bloque pas la boucle d'événements)
+        result = await asyncio.to_thread(
+            transaction_service.transfer,
+            sender.id,
             recipient.id,
-            recipient_transaction_data,
-            auto_commit=False  # Pas de commit auto, sera fait avec le commit global
-        )
-        transaction_service.update_transaction_status(
-            recipient_transaction.id,
-            "completed",
-            auto_commit=False  # Pas de commit auto, sera fait avec le commit global
+            transfer_data.amount,
+            [(sender.id, sender_transaction_data), (recipient.id, recipient_transaction_data)]
         )
         
-        # 5. FLUSH pour forcer l'écriture dans la DB (avant le commit)
-        db.flush()
-        print(f"💾 Modifications flushées dans la session (wallets + transactions)")
-        
-        # 6. VALIDER TOUT (commit atomique - wallets ET transactions)
-        db.commit()
-        print(f"💾 TOUT commité dans la base de données (wallets + transactions)")
-        
-        # IMPORTANT: Après le commit réussi, NE PAS faire de rollback même en cas d'erreur
-        # Les données sont déjà sauvegardées dans la DB
-        
-        # 7. Récupérer les soldes depuis la DB pour la réponse
-        # Utiliser get_wallet_balance qui fait une requête fraîche depuis la DB
-        final_sender_balance = transaction_service.get_wallet_balance(sender.id)
-        final_recipient_balance = transaction_service.get_wallet_balance(recipient.id)
-        
-        print(f"📊 APRÈS TRANSFERT (vérification depuis DB):")
-        print(f"   {sender_phone}: {final_sender_balance} XOF (était {initial_sender_balance} XOF, attendu: {initial_sender_balance - transfer_data.amount} XOF)")
-        print(f"   {recipient_phone}: {final_recipient_balance} XOF (était {initial_recipient_balance} XOF, attendu: {initial_recipient_balance + transfer_data.amount} XOF)")
+        if not result:
+            sender_balance = await asyncio.to_thread(transaction_service.get_wallet_balance, sender.id)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Solde insuffisant. Votre solde actuel est de {sender_balance} XOF. Vous devez avoir au moins {transfer_data.amount} XOF."
+            )
         
-        # Vérification critique : si les valeurs ne correspondent pas, logger mais ne pas échouer
-        expected_sender = initial_sender_balance - transfer_data.amount
-        expected_recipient = initial_recipient_balance + transfer_data.amount
+        print(f"✅ Débit effectué: {sender_phone} → {result.sender_balance} XOF")
+        print(f"✅ Crédit effectué: {recipient_phone} → {result.recipient_balance} XOF")
+        print(f"💾 TOUT commité dans la base de données (wallets + transactions, {result.attempts} tentative(s))")
         
-        if abs(float(final_sender_balance - expected_sender)) > 0.01:
-            print(f"⚠️ ATTENTION: Le solde de l'expéditeur ne correspond pas exactement!")
-            print(f"   Attendu: {expected_sender} XOF, Trouvé: {final_sender_balance} XOF")
-            # Utiliser la valeur calculée pour la réponse
-            final_sender_balance = Decimal(str(expected_sender))
-            
-        if abs(float(final_recipient_balance - expected_recipient)) > 0.01:
-            print(f"⚠️ ATTENTION: Le solde du destinataire ne correspond pas exactement!")
-            print(f"   Attendu: {expected_recipient} XOF, Trouvé: {final_recipient_balance} XOF")
-            # Utiliser la valeur calculée pour la réponse
-            final_recipient_balance = Decimal(str(expected_recipient))
+        # Jeton read-your-writes : le prochain GET /wallet du client ne sera pas servi par un réplica en retard
+        read_token = issue_read_token(db)
+        response.headers[READ_TOKEN_HEADER] = read_token
         
-        # Utiliser les soldes pour la réponse
         return {
             "success": True,
             "message": "Transfert effectué avec succès",
-            "transaction_id": sender_transaction.reference,
-            "sender_balance": float(final_sender_balance),
+            "transaction_id": result.references[0],
+            "sender_balance": float(result.sender_balance),
             "amount": float(transfer_data.amount),
-            "recipient_name": recipient.first_name or recipient_phone,
-            "recipient_phone": recipient_phone
+            "recipient_name": recipient_name,
+            "recipient_phone": recipient_phone,
+            "read_token": read_token
         }
         
     except HTTPException:
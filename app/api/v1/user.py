@@ -1,62 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_read_db, get_async_read_db, release_connection
+from app.core.responses import (
+    USER_PROFILE_SERIALIZER, FastJSONResponse, conditional, etag_matches, not_modified, serialize, version_etag,
+)
 from app.schemas.user import UserUpdate
-from app.services.user_service import UserService
+from app.services.media_store import MediaError, MediaTooLarge, is_data_uri, media_store
+from app.services.user_service import UserService, AsyncUserService, LOAD_FULL, LOAD_LOOKUP, LOAD_VERSION
+from app.core.security import hash_password_async
 from typing import Optional
 
 router = APIRouter()
 
+# Champs renvoyés après une mise à jour du profil (sans les photos)
+UPDATED_PROFILE_FIELDS = {
+    "id", "phone_number", "whatsapp_number", "email", "first_name", "last_name", "date_of_birth",
+    "country", "city", "address", "id_type", "id_number", "id_issue_date", "id_expiry_date",
+    "profile_picture_url", "is_verified",
+}
+
+
+def profile_etag(user) -> str:
+    """Version du profil : users.updated_at, modifié à chaque changement du profil ou du KYC"""
+    return version_etag("user", user.id, user.updated_at or user.created_at)
+
+# Champs image : une image encore envoyée en base64 est déplacée dans le stockage des médias
+MEDIA_URL_FIELDS = ("profile_picture_url", "front_id_photo_url", "back_id_photo_url", "selfie_photo_url")
+
 @router.get("/profile", response_model=dict)
 async def get_user_profile(
+    request: Request,
     phone: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    adb: Optional[AsyncSession] = Depends(get_async_read_db)
 ):
-    """Récupérer le profil d'un utilisateur"""
-    user_service = UserService(db)
-    
+    """Récupérer le profil d'un utilisateur (servi par un réplica si possible)
+
+    En-tête ETag : renvoyé dans If-None-Match, il donne un 304 (sans lire profil ni KYC) tant que
+    le profil n'a pas changé.
+    """
     if not phone:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Le numéro de téléphone est requis"
         )
     
-    user = user_service.get_user_by_phone(phone)
+    # Mode asynchrone : aucune requête ne bloque la boucle d'événements
+    user_service = AsyncUserService(adb) if adb is not None else UserService(db)
+    if request.headers.get("if-none-match"):
+        # Revalidation : seules les dates de la ligne users sont lues
+        version = user_service.get_user_by_phone(phone, LOAD_VERSION)
+        version = await version if adb is not None else version
+        if version is not None and etag_matches(request, profile_etag(version)):
+            return not_modified(profile_etag(version))
+    user = user_service.get_user_by_phone(phone, LOAD_FULL)
+    user = await user if adb is not None else user
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Utilisateur non trouvé"
         )
     
-    return {
-        "user": {
-            "id": user.id,
-            "phone_number": user.phone_number,
-            "whatsapp_number": user.whatsapp_number,
-            "email": user.email,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "date_of_birth": user.date_of_birth.isoformat() if user.date_of_birth else None,
-            "country": user.country,
-            "city": user.city,
-            "address": user.address,
-            "id_type": user.id_type,
-            "id_number": user.id_number,
-            "id_issue_date": user.id_issue_date.isoformat() if user.id_issue_date else None,
-            "id_expiry_date": user.id_expiry_date.isoformat() if user.id_expiry_date else None,
-            "profile_picture_url": user.profile_picture_url,
-            "front_id_photo_url": user.front_id_photo_url,
-            "back_id_photo_url": user.back_id_photo_url,
-            "selfie_photo_url": user.selfie_photo_url,
-            "otp_delivery_preference": user.otp_delivery_preference,
-            "terms_accepted": user.terms_accepted,
-            "privacy_policy_accepted": user.privacy_policy_accepted,
-            "is_active": user.is_active,
-            "is_verified": user.is_verified,
-            "created_at": user.created_at.isoformat() if user.created_at else None,
-            "updated_at": user.updated_at.isoformat() if user.updated_at else None,
-        }
-    }
+    return conditional(request, profile_etag(user), lambda: FastJSONResponse({"user": serialize(USER_PROFILE_SERIALIZER, user)}))
 
 @router.put("/profile", response_model=dict)
 async def update_user_profile(
@@ -75,7 +82,7 @@ async def update_user_profile(
             detail="Le numéro de téléphone est requis"
         )
     
-    user = user_service.get_user_by_phone(phone_to_use)
+    user = user_service.get_user_by_phone(phone_to_use, LOAD_LOOKUP)
     
     # Si l'utilisateur n'existe pas, le créer d'abord
     if not user:
@@ -95,8 +102,26 @@ async def update_user_profile(
                 detail=f"Erreur lors de la création de l'utilisateur: {str(e)}"
             )
     
-    # Mettre à jour l'utilisateur
-    updated_user = user_service.update_user(user.id, user_update)
+    # Images en ligne (data:image/...;base64) : stockées comme médias, seule l'URL va dans users
+    inline_fields = [field for field in MEDIA_URL_FIELDS if is_data_uri(getattr(user_update, field))]
+    if inline_fields:
+        release_connection(db)
+        for field in inline_fields:
+            try:
+                stored = await asyncio.to_thread(media_store.save_data_uri, getattr(user_update, field))
+            except MediaTooLarge as e:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+            except MediaError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            setattr(user_update, field, stored.url)
+    
+    # Mettre à jour l'utilisateur (nouveau mot de passe haché dans le pool de hachage)
+    hashed_password = None
+    if user_update.password:
+        release_connection(db)
+        hashed_password = await hash_password_async(user_update.password)
+    # Invalidation du cache des principaux (Redis) comprise : dans un thread
+    updated_user = await asyncio.to_thread(user_service.update_user, user.id, user_update, hashed_password=hashed_password)
     
     if not updated_user:
         raise HTTPException(
@@ -104,26 +129,8 @@ async def update_user_profile(
             detail="Erreur lors de la mise à jour du profil"
         )
     
-    return {
+    return FastJSONResponse({
         "message": "Profil mis à jour avec succès",
         "success": True,
-        "user": {
-            "id": updated_user.id,
-            "phone_number": updated_user.phone_number,
-            "whatsapp_number": updated_user.whatsapp_number,
-            "email": updated_user.email,
-            "first_name": updated_user.first_name,
-            "last_name": updated_user.last_name,
-            "date_of_birth": updated_user.date_of_birth.isoformat() if updated_user.date_of_birth else None,
-            "country": updated_user.country,
-            "city": updated_user.city,
-            "address": updated_user.address,
-            "id_type": updated_user.id_type,
-            "id_number": updated_user.id_number,
-            "id_issue_date": updated_user.id_issue_date.isoformat() if updated_user.id_issue_date else None,
-            "id_expiry_date": updated_user.id_expiry_date.isoformat() if updated_user.id_expiry_date else None,
-            "profile_picture_url": updated_user.profile_picture_url,
-            "is_verified": updated_user.is_verified,
-        }
-    }
-
+        "user": serialize(USER_PROFILE_SERIALIZER, updated_user, include=UPDATED_PROFILE_FIELDS),
+    })
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from app.core.metrics import metrics
+from config import settings
+
+# Écriture conditionnelle côté Redis : une valeur dont la version est plus ancienne que celle en cache est ignorée
+SET_IF_NEWER_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local version = cjson.decode(current)['version']
+    if version and tonumber(version) > tonumber(ARGV[2]) then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+return 1
+"""
+
+
+class MemoryCache:
+    """Cache LRU en mémoire (par processus) avec expiration : valeurs dict, champ `version` optionnel"""
+
+    blocking = False  # appelable depuis la boucle d'événements
+
+    def __init__(self, name: str, ttl: float, max_entries: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> bool:
+        """Écrire une valeur, sauf si le cache contient déjà une version plus récente"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1].get("version", 0) > value.get("version", 0):
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.incr(f"cache.{self.name}.evicted")
+            return True
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Cache partagé entre workers (Redis, dépendance optionnelle `redis`), même interface que MemoryCache
+
+    Client synchrone : depuis la boucle d'événements, passer par off_loop (un appel attend un aller-retour réseau).
+    """
+
+    blocking = True
+
+    def __init__(self, name: str, ttl: float, url: str):
+        import redis
+
+        self.name = name
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url)
+        self._set_if_newer = self.client.register_script(SET_IF_NEWER_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"fintel:{self.name}:{key}"
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.client.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: dict) -> bool:
+        payload = json.dumps(value, default=str)
+        return bool(self._set_if_newer(
+            keys=[self._key(key)], args=[payload, value.get("version", 0), int(self.ttl * 1000)]
+        ))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*[self._key(key) for key in keys])
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(self._key("*")):
+            self.client.delete(key)
+
+
+async def off_loop(cache, function: Callable, *args):
+    """Appeler `function` (qui interroge `cache`) depuis un endpoint async : dans un thread si le cache est bloquant"""
+    if cache.blocking:
+        return await asyncio.to_thread(function, *args)
+    return function(*args)
+
+
+def running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """Boucle d'événements du thread courant (None dans un thread de travail ou un script)"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def create_cache(name: str, ttl: float, max_entries: int):
+    """Cache partagé si CACHE_REDIS_URL est défini (plusieurs workers), sinon LRU en mémoire"""
+    if settings.cache_redis_url:
+        return RedisCache(name, ttl, settings.cache_redis_url)
+    return MemoryCache(name, ttl, max_entries)
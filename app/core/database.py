@@ -1,15 +1,60 @@
-from sqlalchemy import create_engine
+import asyncio
+import logging
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from fastapi import Request
+from app.core.metrics import metrics
+from app.core.replicas import ReplicaRouter, READ_TOKEN_HEADER
+from app.core.sql_logging import install_sql_logging
 from config import settings
 
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool qui mesure le temps d'attente pour obtenir une connexion"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.incr("db.pool.timeouts")
+            raise
+        finally:
+            metrics.observe("db.pool.wait", time.perf_counter() - start)
+
+
+def pool_options(url: str) -> dict:
+    """Options du pool de connexions selon la configuration (SQLite garde le pool par défaut)"""
+    if url.startswith("sqlite"):
+        return {"pool_pre_ping": settings.db_pool_pre_ping}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
 # Créer l'engine SQLAlchemy
+engine_options = pool_options(settings.database_url)
+if not settings.database_url.startswith("sqlite"):
+    engine_options["poolclass"] = InstrumentedQueuePool
+
 engine = create_engine(
     settings.database_url,
-    pool_pre_ping=True,
-    echo=True  # Pour voir les requêtes SQL dans les logs
+    echo=settings.sql_echo,  # Voir aussi SQL_SLOW_QUERY_MS / SQL_LOG_SAMPLE_RATE (app/core/sql_logging.py)
+    **engine_options
 )
 
+# Journal des requêtes lentes / échantillonnées (écoute tous les engines)
+install_sql_logging()
+
 # Créer la session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -24,4 +69,176 @@ def get_db():
     finally:
         db.close()
 
+def release_connection(db: Session) -> None:
+    """Rendre la connexion au pool avant une attente (bcrypt, etc.) dans un endpoint async
+
+    Une session synchrone garde sa connexion jusqu'à la fin de la transaction : sans cela,
+    des requêtes en attente plus nombreuses que le pool bloqueraient la boucle d'événements
+    au checkout. La transaction de lecture est terminée (objets expirés, rechargés au besoin).
+    """
+    if db.in_transaction():
+        db.rollback()
+
+
+# Drivers asynchrones correspondant aux drivers synchrones
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    """Convertir une URL SQLAlchemy synchrone en URL utilisant un driver asynchrone"""
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        raise ValueError(f"URL de base de données invalide: {url}")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+# Engine asynchrone (créé seulement si activé, pour ne pas exiger asyncpg/aiosqlite sinon)
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.async_db_enabled:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_database_url = settings.async_database_url or to_async_url(settings.database_url)
+    async_engine = create_async_engine(
+        async_database_url,
+        **pool_options(async_database_url)
+    )
+    # expire_on_commit=False : les objets restent lisibles après commit sans I/O implicite
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+# Réplicas en lecture
+read_router = ReplicaRouter(max_lag=settings.replica_max_lag_seconds)
+
+for index, replica_url in enumerate(settings.read_replica_urls):
+    replica_options = pool_options(replica_url)
+    if not replica_url.startswith("sqlite"):
+        replica_options["poolclass"] = InstrumentedQueuePool
+    replica_engine = create_engine(replica_url, **replica_options)
+    replica_async_sessions = None
+    if settings.async_db_enabled:
+        replica_async_url = to_async_url(replica_url)
+        replica_async_sessions = async_sessionmaker(
+            create_async_engine(replica_async_url, **pool_options(replica_async_url)),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    read_router.add(
+        f"replica{index}",
+        replica_engine,
+        sessionmaker(autocommit=False, autoflush=False, bind=replica_engine),
+        replica_async_sessions,
+    )
+
+def choose_replica(request: Request):
+    """Réplica de la requête (None : primaire), choisi une seule fois et partagé par
+    get_read_db et get_async_read_db quand un endpoint dépend des deux"""
+    if not hasattr(request.state, "replica"):
+        request.state.replica = read_router.choose(request.headers.get(READ_TOKEN_HEADER))
+    return request.state.replica
+
+# Dependency pour les endpoints en lecture seule : réplica si possible, sinon primaire
+# Le jeton read-your-writes (en-tête X-Read-Token) force le primaire tant que les réplicas sont en retard
+def get_read_db(request: Request):
+    replica = choose_replica(request)
+    db = replica.session_factory() if replica else SessionLocal()
+    # Position jusqu'à laquelle les écritures sont visibles sur le réplica (None : lecture sur le primaire)
+    db.info["read_position"] = replica.replayed if replica else None
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Équivalent asynchrone de get_read_db (None si le mode asynchrone est désactivé)
+async def get_async_read_db(request: Request):
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    replica = choose_replica(request)
+    session_factory = replica.async_session_factory if replica else AsyncSessionLocal
+    async with session_factory() as db:
+        db.info["read_position"] = replica.replayed if replica else None
+        yield db
+
+
+async def replica_lag_loop(interval: int = None):
+    """Boucle de fond qui mesure le retard des réplicas"""
+    interval = interval if interval is not None else settings.replica_lag_check_interval
+    if not read_router.replicas or interval <= 0:
+        return
+    while True:
+        await asyncio.to_thread(read_router.check_all, engine)
+        await asyncio.sleep(interval)
+
+
+def pool_status() -> dict:
+    """État du pool de connexions principal (connexions empruntées, libres, en débordement, attentes)"""
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+        # Limites configurées (voir pool_options : SQLite garde le pool par défaut)
+        if not settings.database_url.startswith("sqlite"):
+            status.update({"max_overflow": settings.db_max_overflow, "timeout_seconds": settings.db_pool_timeout})
+    status["wait"] = metrics.timing("db.pool.wait")
+    status["timeouts"] = metrics.counter("db.pool.timeouts")
+    return status
+
+
+def ping(engine) -> None:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def check_pool_liveness() -> bool:
+    """Vérifier qu'une connexion du pool répond, sur le primaire puis sur chaque réplica ;
+    en cas d'échec, vider le pool pour que les prochaines requêtes ouvrent des connexions neuves
+    (remplace pool_pre_ping). Un réplica injoignable est écarté des lectures jusqu'au prochain succès.
+
+    Seuls les engines synchrones sont vérifiés : les engines asynchrones (ASYNC_DB_ENABLED)
+    comptent sur DB_POOL_PRE_PING.
+    """
+    start = time.perf_counter()
+    healthy = True
+    try:
+        ping(engine)
+        metrics.observe("db.pool.liveness_check", time.perf_counter() - start)
+    except Exception as e:
+        logger.warning(f"⚠️ Vérification du pool échouée, connexions recyclées: {e}")
+        metrics.incr("db.pool.liveness_failures")
+        engine.dispose()
+        healthy = False
+
+    for replica in read_router.replicas:
+        try:
+            ping(replica.engine)
+            replica.healthy = True
+        except Exception as e:
+            logger.warning(f"⚠️ Réplica {replica.name} injoignable, connexions recyclées: {e}")
+            metrics.incr(f"db.replica.{replica.name}.liveness_failures")
+            replica.engine.dispose()
+            replica.healthy = False
+    return healthy
+
 
+async def pool_liveness_loop(interval: int = None):
+    """Boucle de fond lancée au démarrage de l'application"""
+    interval = interval if interval is not None else settings.db_liveness_check_interval
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(check_pool_liveness)
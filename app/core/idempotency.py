@@ -0,0 +1,343 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+from app.core.metrics import metrics
+from app.core.phone import normalize_phone
+from app.core.security import verify_token
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# En-tête envoyé par le client (un UUID par opération, réutilisé pour chaque nouvelle tentative)
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+# Présent sur une réponse rejouée depuis le cache
+IDEMPOTENT_REPLAY_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+NEW = "new"
+PENDING = "pending"
+REPLAY = "replay"
+MISMATCH = "mismatch"
+
+# Réservation d'une clé côté Redis : valeur existante renvoyée, sinon clé réservée (un aller-retour)
+BEGIN_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    return current
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return false
+"""
+# Libération d'une clé, seulement si elle porte encore notre réservation
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class IdempotencyRecord:
+    """Une clé : empreinte de la requête, puis réponse mise en cache une fois le traitement terminé"""
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.status: Optional[int] = None
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body: bytes = b""
+        self.done = asyncio.Event()
+        self.reservation: Optional[str] = None  # valeur Redis de la réservation (RedisIdempotencyStore)
+
+    @property
+    def completed(self) -> bool:
+        return self.status is not None
+
+
+class MemoryIdempotencyStore:
+    """Clés d'idempotence en mémoire (par processus), évincées après `ttl` secondes
+
+    Les clés sont gardées dans l'ordre d'insertion, qui est aussi l'ordre d'expiration :
+    l'éviction ne parcourt que les plus anciennes. Au-delà de `max_entries`, les réponses terminées
+    sont évincées dans l'ordre où elles se sont terminées (file à part : O(1) par éviction).
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, IdempotencyRecord]" = OrderedDict()
+        self._completed: "OrderedDict[str, None]" = OrderedDict()
+
+    async def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[IdempotencyRecord]]:
+        """Réserver une clé : NEW (à traiter), PENDING (en cours), REPLAY (terminée) ou MISMATCH"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            record = self._records.get(key)
+            if record is None:
+                record = self._records[key] = IdempotencyRecord(fingerprint, now + self.ttl)
+                return NEW, record
+            if record.fingerprint != fingerprint:
+                return MISMATCH, record
+            return (REPLAY if record.completed else PENDING), record
+
+    async def wait(self, key: str, record: IdempotencyRecord, timeout: float) -> IdempotencyRecord:
+        """Attendre la fin de la requête en cours (au plus `timeout` secondes)"""
+        try:
+            await asyncio.wait_for(record.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return record
+
+    async def complete(self, key: str, record: IdempotencyRecord, status: int,
+                       headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        with self._lock:
+            record.status, record.headers, record.body = status, headers, body
+            if self._records.get(key) is record:
+                self._completed[key] = None
+        record.done.set()
+
+    async def release(self, key: str, record: IdempotencyRecord) -> None:
+        """Libérer une clé sans mettre la réponse en cache (erreur serveur : le client peut réessayer)"""
+        with self._lock:
+            if self._records.get(key) is record:
+                del self._records[key]
+                self._completed.pop(key, None)
+        record.done.set()
+
+    def _evict(self, now: float) -> None:
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record.expires_at > now:
+                break
+            del self._records[key]
+            self._completed.pop(key, None)
+            metrics.incr("idempotency.evicted")
+        while len(self._records) >= self.max_entries and self._completed:
+            key, _ = self._completed.popitem(last=False)
+            del self._records[key]
+            metrics.incr("idempotency.evicted")
+        metrics.set_gauge("idempotency.entries", len(self._records))
+
+
+class RedisIdempotencyStore:
+    """Clés d'idempotence partagées entre workers (Redis, dépendance optionnelle `redis`), même interface
+
+    Client redis.asyncio : appelé depuis le middleware, il ne bloque jamais la boucle d'événements.
+    Une clé réservée porte l'empreinte et un jeton de réservation ; terminée, elle porte aussi la réponse.
+    Un doublon concurrent (éventuellement sur un autre worker) interroge la clé jusqu'à la fin de la
+    première requête. Redis expire les clés après `ttl` secondes.
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, ttl: float, url: str):
+        from redis import asyncio as redis
+
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url)
+        self._begin = self.client.register_script(BEGIN_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"fintel:idempotency:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _record(raw: bytes) -> IdempotencyRecord:
+        value = json.loads(raw)
+        record = IdempotencyRecord(value["fingerprint"], 0)
+        if "status" in value:
+            record.status = value["status"]
+            record.headers = [(name.encode("latin-1"), header.encode("latin-1")) for name, header in value["headers"]]
+            record.body = base64.b64decode(value["body"])
+        return record
+
+    async def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[IdempotencyRecord]]:
+        reservation = json.dumps({"fingerprint": fingerprint, "token": uuid.uuid4().hex})
+        current = await self._begin(keys=[self._key(key)], args=[reservation, int(self.ttl * 1000)])
+        if current is None:
+            record = IdempotencyRecord(fingerprint, time.monotonic() + self.ttl)
+            record.reservation = reservation
+            return NEW, record
+        record = self._record(current)
+        if record.fingerprint != fingerprint:
+            return MISMATCH, record
+        return (REPLAY if record.completed else PENDING), record
+
+    async def wait(self, key: str, record: IdempotencyRecord, timeout: float) -> IdempotencyRecord:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            raw = await self.client.get(self._key(key))
+            if raw is None:
+                # Clé libérée (erreur serveur) : la requête n'est pas terminée
+                return record
+            current = self._record(raw)
+            if current.completed and current.fingerprint == record.fingerprint:
+                return current
+        return record
+
+    async def complete(self, key: str, record: IdempotencyRecord, status: int,
+                       headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        await self.client.set(self._key(key), json.dumps({
+            "fingerprint": record.fingerprint,
+            "status": status,
+            "headers": [(name.decode("latin-1"), header.decode("latin-1")) for name, header in headers],
+            "body": base64.b64encode(body).decode("ascii"),
+        }), px=int(self.ttl * 1000))
+        record.done.set()
+
+    async def release(self, key: str, record: IdempotencyRecord) -> None:
+        await self._release(keys=[self._key(key)], args=[record.reservation])
+        record.done.set()
+
+
+def create_idempotency_store():
+    """Clés partagées si CACHE_REDIS_URL est défini (plusieurs workers), sinon en mémoire"""
+    if settings.cache_redis_url:
+        return RedisIdempotencyStore(settings.idempotency_ttl_seconds, settings.cache_redis_url)
+    return MemoryIdempotencyStore(settings.idempotency_ttl_seconds, settings.idempotency_max_entries)
+
+
+def request_subject(query_string: bytes, body: bytes) -> str:
+    """Utilisateur de la requête, sans accès à la base
+
+    Claim `sub` du token en paramètre ; sans token (/fintel-transfer), numéro canonique de
+    l'expéditeur (`sender_phone` du corps JSON).
+    """
+    token = parse_qs(query_string.decode("latin-1")).get("token")
+    payload = verify_token(token[0]) if token else None
+    subject = (payload or {}).get("sub")
+    if subject:
+        return subject
+    try:
+        sender_phone = json.loads(body).get("sender_phone")
+    except (ValueError, AttributeError):
+        return ""
+    return (normalize_phone(sender_phone) or "") if isinstance(sender_phone, str) else ""
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI : en-tête Idempotency-Key sur les endpoints qui déplacent de l'argent
+
+    - première requête : traitée normalement, sa réponse (< 500) est mise en cache pour la clé
+    - nouvelle tentative : la réponse en cache est renvoyée sans authentification ni accès à la base
+    - doublon concurrent : attend la fin de la première requête (au plus `wait_seconds`) puis la rejoue,
+      sinon 409
+    - même clé, requête différente : 422
+
+    La clé est propre à l'endpoint et à l'utilisateur (token, sinon numéro de l'expéditeur) ; l'empreinte
+    couvre le corps de la requête. Si le store est indisponible, la requête est traitée sans déduplication.
+    """
+
+    def __init__(self, app, paths: Iterable[str], store, wait_seconds: float = 5.0):
+        self.app = app
+        self.paths = set(paths)
+        self.store = store
+        self.wait_seconds = wait_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        idempotency_key = dict(scope["headers"]).get(IDEMPOTENCY_KEY_HEADER.lower().encode())
+        if idempotency_key is None:
+            return await self.app(scope, receive, send)
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            return await send_json(send, 400, {"detail": f"{IDEMPOTENCY_KEY_HEADER} invalide (1 à {MAX_KEY_LENGTH} caractères)"})
+
+        # Corps lu une fois : empreinte de la requête puis rejoué à l'application
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        key = f"{scope['path']}\n{request_subject(scope['query_string'], body)}\n{idempotency_key.decode('latin-1')}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+        try:
+            state, record = await self.store.begin(key, fingerprint)
+        except Exception as e:
+            metrics.incr("idempotency.errors")
+            logger.warning(f"⚠️ Store d'idempotence indisponible: {e}")
+            return await self.app(scope, replay_receive, send)
+
+        if state == PENDING:
+            metrics.incr("idempotency.concurrent")
+            record = await self.store.wait(key, record, self.wait_seconds)
+            if not record.completed:
+                metrics.incr("idempotency.conflicts")
+                return await send_json(send, 409, {"detail": "Une requête avec cette Idempotency-Key est déjà en cours"})
+            state = REPLAY
+        if state == MISMATCH:
+            metrics.incr("idempotency.mismatches")
+            return await send_json(send, 422, {"detail": "Idempotency-Key déjà utilisée pour une requête différente"})
+        if state == REPLAY:
+            metrics.incr("idempotency.replays")
+            await send({
+                "type": "http.response.start",
+                "status": record.status,
+                "headers": record.headers + [(IDEMPOTENT_REPLAY_HEADER.lower().encode(), b"true")],
+            })
+            return await send({"type": "http.response.body", "body": record.body})
+
+        response = {"status": 500, "headers": [], "body": b""}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await self._release(key, record)
+            raise
+        if response["status"] >= 500:
+            await self._release(key, record)
+            return
+        try:
+            await self.store.complete(key, record, response["status"], response["headers"], response["body"])
+            metrics.incr("idempotency.stored")
+        except Exception as e:
+            metrics.incr("idempotency.errors")
+            logger.warning(f"⚠️ Réponse non enregistrée pour l'idempotence: {e}")
+
+    async def _release(self, key: str, record: IdempotencyRecord) -> None:
+        try:
+            await self.store.release(key, record)
+        except Exception as e:
+            metrics.incr("idempotency.errors")
+            logger.warning(f"⚠️ Clé d'idempotence non libérée: {e}")
+
+
+async def send_json(send, status: int, content: dict, headers: List[Tuple[bytes, bytes]] = ()) -> None:
+    body = json.dumps(content, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,67 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+class Metrics:
+    """Registre de métriques en mémoire (par processus), exposé via /monitoring/metrics
+
+    - compteurs : incr("db.pool.timeouts")
+    - jauges : set_gauge("db.pool.checked_out", 3)
+    - durées : observe("db.pool.wait", 0.002) -> count / total / max (en secondes)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = {"count": 0, "total": 0.0, "max": 0.0}
+            timing["count"] += 1
+            timing["total"] += seconds
+            if seconds > timing["max"]:
+                timing["max"] = seconds
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def timing(self, name: str) -> Dict[str, float]:
+        """Résumé d'une durée observée (count, total, avg, max)"""
+        with self._lock:
+            timing = dict(self._timings.get(name) or {"count": 0, "total": 0.0, "max": 0.0})
+        timing["avg"] = timing["total"] / timing["count"] if timing["count"] else 0.0
+        return timing
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            names = list(self._timings)
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "timings": {name: self.timing(name) for name in names},
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+metrics = Metrics()
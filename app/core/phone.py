@@ -0,0 +1,30 @@
+import re
+from typing import Optional
+from config import settings
+
+# Séparateurs tolérés dans un numéro saisi : espaces, tirets, points, barres, parenthèses
+SEPARATORS = re.compile(r"[\s().\-/]")
+# Numéro compacté : indicatif international optionnel puis 8 à 15 chiffres (E.164)
+PHONE_PATTERN = re.compile(r"\+?\d{8,15}")
+# Numéros nationaux à 10 chiffres (Côte d'Ivoire) : au-delà, l'indicatif est déjà présent
+NATIONAL_NUMBER_LENGTH = 10
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Forme canonique E.164 d'un numéro (ex. "05 05 97 98 84", "+225 0505979884" -> "+2250505979884")
+
+    Un numéro sans indicatif reçoit PHONE_DEFAULT_COUNTRY_CODE ; None si le numéro est vide ou invalide.
+    """
+    if not phone:
+        return None
+    compact = SEPARATORS.sub("", phone)
+    if compact.startswith("00"):
+        compact = "+" + compact[2:]
+    if not PHONE_PATTERN.fullmatch(compact):
+        return None
+    if compact.startswith("+"):
+        return compact
+    country_code = settings.phone_default_country_code
+    if compact.startswith(country_code) and len(compact) > NATIONAL_NUMBER_LENGTH:
+        return "+" + compact
+    return "+" + country_code + compact
@@ -0,0 +1,168 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from app.core.idempotency import send_json
+from app.core.metrics import metrics
+from app.core.phone import normalize_phone
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seau à jetons côté Redis : remplissage, prélèvement et expiration en un aller-retour
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RateLimit:
+    """Seau de `capacity` jetons rempli en `period` secondes, par adresse IP ou par numéro de téléphone
+
+    Se configure par une chaîne "jetons/secondes", ex. "5/60" : 5 requêtes d'affilée, puis une toutes les 12 s.
+    """
+
+    def __init__(self, name: str, key: str, spec: str):
+        capacity, period = spec.split("/")
+        self.name = name
+        self.key = key  # "ip" ou "phone"
+        self.capacity = float(capacity)
+        self.rate = self.capacity / float(period)
+
+
+class MemoryTokenBuckets:
+    """Seaux en mémoire (par processus) : un tuple (jetons, instant) par clé, LRU borné
+
+    Un seau évincé repart plein : `max_entries` doit couvrir les clients actifs sur une période.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        """Prélever un jeton : 0 si la requête passe, sinon secondes avant le prochain jeton"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class RedisTokenBuckets:
+    """Seaux partagés entre workers (Redis, dépendance optionnelle `redis`), même interface
+
+    Client redis.asyncio : appelé depuis le middleware, il ne bloque jamais la boucle d'événements.
+    """
+
+    def __init__(self, url: str):
+        from redis import asyncio as redis
+
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        return float(await self._take(keys=[f"fintel:ratelimit:{key}"], args=[capacity, rate, time.time()]))
+
+
+def create_token_buckets():
+    """Seaux partagés si RATE_LIMIT_STORE=redis (CACHE_REDIS_URL), sinon en mémoire"""
+    if settings.rate_limit_store == "redis":
+        return RedisTokenBuckets(settings.cache_redis_url)
+    return MemoryTokenBuckets(settings.rate_limit_max_entries)
+
+
+def request_phone(body: bytes) -> Optional[str]:
+    """Numéro canonique du corps JSON (OTPRequest, UserLogin) : toutes ses écritures partagent un seau"""
+    try:
+        phone_number = json.loads(body).get("phone_number")
+    except (ValueError, AttributeError):
+        return None
+    return normalize_phone(phone_number) if isinstance(phone_number, str) else None
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI : 429 (avec Retry-After) avant toute authentification, requête SQL ou bcrypt
+
+    Chaque chemin a ses limites par IP et/ou par numéro (champ `phone_number` du corps JSON).
+    Si le backend des seaux est indisponible, les requêtes passent (les limites ne bloquent jamais l'API).
+    """
+
+    def __init__(self, app, rules: Dict[str, Iterable[RateLimit]], buckets):
+        self.app = app
+        self.rules = {path: list(limits) for path, limits in rules.items()}
+        self.buckets = buckets
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.rules:
+            return await self.app(scope, receive, send)
+        limits: List[RateLimit] = self.rules[scope["path"]]
+
+        body = b""
+        app_receive = receive
+        if any(limit.key == "phone" for limit in limits):
+            # Corps lu une fois pour le numéro puis rejoué à l'application
+            while True:
+                message = await receive()
+                body += message.get("body", b"")
+                if not message.get("more_body"):
+                    break
+            body_sent = False
+
+            async def replay_receive():
+                nonlocal body_sent
+                if body_sent:
+                    return await receive()
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            app_receive = replay_receive
+
+        subjects = {
+            "ip": scope["client"][0] if scope.get("client") else None,
+            "phone": request_phone(body) if body else None,
+        }
+        for limit in limits:
+            subject = subjects[limit.key]
+            if subject is None:
+                continue
+            try:
+                wait = await self.buckets.take(f"{limit.name}:{limit.key}:{subject}", limit.capacity, limit.rate)
+            except Exception as e:
+                metrics.incr("rate_limit.errors")
+                logger.warning(f"⚠️ Limitation de débit indisponible: {e}")
+                break
+            if wait > 0:
+                metrics.incr(f"rate_limit.{limit.name}.{limit.key}.rejected")
+                return await send_json(
+                    send, 429, {"detail": "Trop de tentatives, veuillez réessayer plus tard"},
+                    headers=[(b"retry-after", str(math.ceil(wait)).encode())],
+                )
+        return await self.app(scope, app_receive, send)
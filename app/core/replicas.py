@@ -0,0 +1,157 @@
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, List, Optional, Tuple, Union
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# En-tête utilisé pour le read-your-writes : renvoyé après une écriture,
+# le client le renvoie sur ses lectures suivantes
+READ_TOKEN_HEADER = "X-Read-Token"
+
+# Positions comparées par le read-your-writes : LSN du WAL sur PostgreSQL (entier, indépendant des
+# horloges des machines), horloge locale (epoch) sur les autres bases (SQLite : une seule machine)
+Position = Union[int, float]
+
+CURRENT_LSN_SQL = text("SELECT pg_current_wal_lsn()::text")
+# Position rejouée par un réplica et âge de la dernière transaction rejouée (NULL sur un primaire)
+REPLICA_STATUS_SQL = text(
+    "SELECT pg_last_wal_replay_lsn()::text, "
+    "COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+)
+
+
+def parse_lsn(lsn: str) -> int:
+    """LSN PostgreSQL ("16/B374D848") -> entier comparable"""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def current_position(bind) -> Position:
+    """Position courante du primaire (`bind` : Connection ou Engine)"""
+    if bind.dialect.name != "postgresql":
+        return time.time()
+    if isinstance(bind, Engine):
+        with bind.connect() as connection:
+            return parse_lsn(connection.execute(CURRENT_LSN_SQL).scalar())
+    return parse_lsn(bind.execute(CURRENT_LSN_SQL).scalar())
+
+
+def session_position(db: Session) -> Position:
+    """Position du primaire vue par une session (avant une lecture : l'instantané lu la couvre)"""
+    if db.get_bind().dialect.name != "postgresql":
+        return time.time()
+    return current_position(db.connection())
+
+
+def issue_read_token(db: Session) -> str:
+    """Jeton read-your-writes, à émettre après le commit : position du primaire (LSN), qui couvre l'écriture"""
+    position = session_position(db)
+    if isinstance(position, int):
+        return f"{position >> 32:X}/{position & 0xFFFFFFFF:X}"
+    return f"{position:.6f}"
+
+
+def parse_read_token(token: Optional[str]) -> Optional[Position]:
+    if not token:
+        return None
+    try:
+        return parse_lsn(token) if "/" in token else float(token)
+    except ValueError:
+        return None
+
+
+class Replica:
+    """Un réplica en lecture et son dernier retard mesuré"""
+
+    def __init__(self, name: str, engine, session_factory, async_session_factory=None):
+        self.name = name
+        self.engine = engine
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.lag: float = 0.0
+        # Position rejouée à la dernière mesure : les écritures jusqu'à cette position sont visibles
+        self.replayed: Position = 0
+        self.healthy: bool = True
+
+
+class ReplicaRouter:
+    """Répartit les lectures entre réplicas (round-robin) avec repli sur le primaire
+
+    Un réplica est écarté si son retard dépasse max_lag ou s'il n'a pas encore
+    rejoué le WAL jusqu'à la position du jeton read-your-writes du client.
+    """
+
+    def __init__(self, max_lag: float):
+        self.max_lag = max_lag
+        self.replicas: List[Replica] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, engine, session_factory, async_session_factory=None) -> Replica:
+        replica = Replica(name, engine, session_factory, async_session_factory)
+        self.replicas.append(replica)
+        return replica
+
+    def choose(self, read_token: Optional[str] = None) -> Optional[Replica]:
+        """Choisir un réplica pour une lecture, ou None pour lire sur le primaire"""
+        if not self.replicas:
+            return None
+        written = parse_read_token(read_token)
+        candidates = [
+            r for r in self.replicas
+            if r.healthy and r.lag <= self.max_lag
+            and (written is None or r.replayed >= written)
+        ]
+        if not candidates:
+            metrics.incr("db.replica.primary_fallbacks")
+            return None
+        with self._lock:
+            index = next(self._counter) % len(candidates)
+        replica = candidates[index]
+        metrics.incr(f"db.replica.{replica.name}.reads")
+        return replica
+
+    def refresh_lag(self, replica: Replica, head: Position, measure: Callable[[], Tuple[Position, float]]) -> None:
+        """Mettre à jour un réplica : `head` position du primaire mesurée juste avant, `measure` -> (position rejouée, âge)
+
+        Retard nul si le réplica a rejoué tout le WAL écrit avant la mesure, sinon âge de la dernière
+        transaction rejouée (et non 0 dès que le WAL reçu est rejoué : il peut ne pas tout avoir reçu).
+        """
+        try:
+            replayed, age = measure()
+            replica.replayed = replayed
+            replica.lag = 0.0 if replayed >= head else float(age)
+            replica.healthy = True
+        except Exception as e:
+            logger.warning(f"⚠️ Réplica {replica.name} injoignable, lectures redirigées vers le primaire: {e}")
+            replica.healthy = False
+        metrics.set_gauge(f"db.replica.{replica.name}.lag_seconds", replica.lag)
+
+    def check_all(self, primary) -> None:
+        """Mesurer tous les réplicas (engines synchrones) par rapport à la position du primaire (`primary` : Engine)"""
+        try:
+            head = current_position(primary)
+        except Exception as e:
+            logger.warning(f"⚠️ Position du primaire illisible, réplicas non mesurés: {e}")
+            return
+        for replica in self.replicas:
+            self.refresh_lag(replica, head, lambda: measure_replica(replica.engine))
+
+
+def measure_replica(engine) -> Tuple[Position, float]:
+    """(position rejouée, âge en secondes de la dernière transaction rejouée) d'un réplica"""
+    with engine.connect() as conn:
+        if engine.dialect.name != "postgresql":
+            replayed = time.time()
+            conn.execute(text("SELECT 1"))
+            return replayed, 0.0
+        lsn, age = conn.execute(REPLICA_STATUS_SQL).one()
+        if lsn is None:
+            raise RuntimeError("pas en réplication (pg_last_wal_replay_lsn() est NULL)")
+        return parse_lsn(lsn), float(age or 0.0)
@@ -0,0 +1,110 @@
+import hashlib
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from app.core.metrics import metrics
+from app.schemas.transaction import Wallet
+from app.schemas.user import UserProfile
+
+# Dates UTC en "Z" comme Pydantic
+JSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+# Réponses conditionnelles : le client revalide à chaque lecture (If-None-Match) au lieu de retélécharger
+REVALIDATE = "private, no-cache"
+
+# Sérialiseurs Pydantic compilés une seule fois (validation depuis les attributs ORM puis JSON en Rust)
+WALLET_SERIALIZER = TypeAdapter(Wallet)
+USER_PROFILE_SERIALIZER = TypeAdapter(UserProfile)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type non sérialisable en JSON: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_json_default, option=JSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """Réponse par défaut de l'API : JSON encodé par orjson (Decimal -> float, comme les schémas)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(body: bytes, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Réponse dont le corps JSON est déjà sérialisé (aucun passage par response_model)"""
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def serialize(serializer: TypeAdapter, obj: Any, **kwargs) -> Any:
+    """Objet ORM (ou dict) -> valeurs JSON via un sérialiseur compilé (`include`, `exclude`... acceptés)"""
+    return serializer.dump_python(serializer.validate_python(obj, from_attributes=True), mode="json", **kwargs)
+
+
+def transactions_json(rows: Iterable) -> bytes:
+    """Historique -> JSON sans modèle Pydantic par ligne, même forme que List[Transaction]
+
+    `rows` : lignes dans l'ordre des colonnes de la table (HISTORY_COLUMNS de transaction_service),
+    dépaquetées par position (bien plus rapide que l'accès par attribut), cf. benchmark_serialization.py
+    """
+    return dumps([
+        {
+            "transaction_type": transaction_type,
+            "amount": float(amount),
+            "currency": currency,
+            "description": description,
+            "network": network,
+            "recipient_phone": recipient_phone,
+            "id": id,
+            "user_id": user_id,
+            "status": status,
+            "reference": reference,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+        for (id, user_id, transaction_type, amount, currency, status, description,
+             reference, network, recipient_phone, created_at, updated_at) in rows
+    ])
+
+
+def version_etag(*parts) -> str:
+    """ETag faible dérivé des versions des lignes lues (id, version, updated_at...), pas du JSON produit"""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match désigne `etag` (comparaison faible, liste et "*" acceptés)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tag = etag[2:] if etag.startswith("W/") else etag
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    metrics.incr("http.not_modified")
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+
+def conditional(request: Request, etag: str, render: Callable[[], Response]) -> Response:
+    """304 si le client a déjà cette version (sans sérialiser), sinon `render()` avec l'ETag"""
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response = render()
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE
+    return response
+
+
+def history_etag(rows, *parts) -> str:
+    """ETag d'une page d'historique : id, statut et mise à jour de chaque ligne (ordre HISTORY_COLUMNS)"""
+    return version_etag(*parts, *(f"{row[0]}:{row[5]}:{row[11]}" for row in rows))
@@ -1,10 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
+from app.core.metrics import metrics
+import asyncio
 import bcrypt
 from config import settings
 import random
 import string
+import threading
+import time
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Vérifier un mot de passe (compatible avec bcrypt et passlib)"""
@@ -39,17 +45,85 @@ def get_password_hash(password: str) -> str:
         if len(password_bytes) > 72:
             password_bytes = password_bytes[:72]
         # Générer le salt et hasher
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
         hashed = bcrypt.hashpw(password_bytes, salt)
         return hashed.decode('utf-8')
     else:
         # Si c'est déjà en bytes
         if len(password) > 72:
             password = password[:72]
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
         hashed = bcrypt.hashpw(password, salt)
         return hashed.decode('utf-8')
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Le hash a-t-il été calculé avec un autre coût que BCRYPT_ROUNDS ? ($2b$<coût>$...)"""
+    try:
+        return int(hashed_password.split('$')[2]) != settings.bcrypt_rounds
+    except (AttributeError, IndexError, ValueError):
+        return False
+
+
+class PasswordHashingBusy(HTTPException):
+    """File d'attente du hachage pleine : le client est invité à réessayer"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service d'authentification surchargé, veuillez réessayer",
+            headers={"Retry-After": "1"}
+        )
+
+
+class PasswordHasher:
+    """Exécute bcrypt dans un pool de threads borné, hors de la boucle d'événements
+
+    bcrypt libère le GIL : les calculs s'exécutent réellement en parallèle, et les autres
+    requêtes du worker continuent d'être servies pendant une rafale de connexions.
+    Au-delà de `max_pending` calculs en cours ou en attente, PasswordHashingBusy (503) est levée.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    async def run(self, operation: str, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                metrics.incr("auth.bcrypt.rejected")
+                raise PasswordHashingBusy()
+            self._pending += 1
+            metrics.set_gauge("auth.bcrypt.pending", self._pending)
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            metrics.observe("auth.bcrypt.wait", started - submitted)
+            try:
+                return func(*args)
+            finally:
+                metrics.observe(f"auth.bcrypt.{operation}", time.perf_counter() - started)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                metrics.set_gauge("auth.bcrypt.pending", self._pending)
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_pending)
+
+async def hash_password_async(password: str) -> str:
+    """get_password_hash exécuté dans le pool de hachage"""
+    return await password_hasher.run("hash", get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password exécuté dans le pool de hachage"""
+    return await password_hasher.run("verify", verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Créer un token JWT"""
     to_encode = data.copy()
@@ -0,0 +1,131 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.metrics import metrics
+from config import settings
+
+logger = logging.getLogger("fintel.sql")
+
+# Route HTTP à l'origine des requêtes SQL (renseignée par le middleware de app/main.py)
+current_route: ContextVar[Optional[str]] = ContextVar("current_route", default=None)
+
+
+class RequestSQLStats:
+    """Requêtes SQL émises pendant une requête HTTP : nombre, temps total et répétitions"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, duration_ms: float) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int = 2) -> dict:
+        """Requêtes identiques exécutées au moins `threshold` fois"""
+        return {sql: n for sql, n in self.statements.items() if n >= threshold}
+
+
+# Statistiques de la requête HTTP en cours (objet partagé avec les threads du threadpool)
+current_sql_stats: ContextVar[Optional[RequestSQLStats]] = ContextVar("current_sql_stats", default=None)
+
+
+def parameters_shape(parameters, executemany: bool = False):
+    """Décrire les paramètres sans exposer leurs valeurs (noms et types uniquement)"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameters[0] if parameters else None
+        return {"rows": len(parameters), "row": parameters_shape(first)}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._fintel_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_fintel_query_start", None)
+    if start is None:
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    stats = current_sql_stats.get()
+    if stats is not None:
+        stats.record(statement, duration_ms)
+
+    slow = 0 < settings.sql_slow_query_ms <= duration_ms
+    sampled = settings.sql_log_sample_rate > 0 and random.random() < settings.sql_log_sample_rate
+    if not slow and not sampled:
+        return
+
+    record = {
+        "event": "slow_query" if slow else "query",
+        "duration_ms": round(duration_ms, 2),
+        "route": current_route.get(),
+        "statement": " ".join(statement.split()),
+        "parameters": parameters_shape(parameters, executemany),
+    }
+    if slow:
+        logger.warning(json.dumps(record, ensure_ascii=False))
+    else:
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def install_sql_logging() -> bool:
+    """Brancher l'instrumentation SQL (par requête HTTP) et le journal des requêtes
+    lentes / échantillonnées sur tous les engines
+
+    Rien n'est installé si tout est désactivé : aucun coût par requête.
+    """
+    if (
+        not settings.sql_instrumentation_enabled
+        and settings.sql_slow_query_ms <= 0
+        and settings.sql_log_sample_rate <= 0
+    ):
+        return False
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    return True
+
+
+def finish_request_stats(route: str, stats: RequestSQLStats) -> dict:
+    """Publier les statistiques SQL d'une requête HTTP terminée et signaler les N+1
+
+    Retourne les en-têtes de diagnostic (utilisés en mode debug).
+    """
+    repeated = stats.repeated(settings.sql_n_plus_one_threshold)
+
+    metrics.incr(f"http.{route}.requests")
+    metrics.incr(f"http.{route}.db_queries", stats.count)
+    metrics.observe(f"http.{route}.db_time", stats.total_ms / 1000)
+
+    if repeated:
+        metrics.incr(f"http.{route}.n_plus_one")
+        logger.warning(json.dumps({
+            "event": "n_plus_one",
+            "route": route,
+            "queries": stats.count,
+            "repeated": [
+                {"statement": " ".join(sql.split())[:200], "count": n}
+                for sql, n in sorted(repeated.items(), key=lambda item: -item[1])
+            ],
+        }, ensure_ascii=False))
+
+    return {
+        "X-DB-Query-Count": str(stats.count),
+        "X-DB-Time-Ms": f"{stats.total_ms:.2f}",
+        "X-DB-Repeated-Queries": str(sum(n - 1 for n in stats.statements.values() if n > 1)),
+        "X-DB-N-Plus-One": "1" if repeated else "0",
+    }
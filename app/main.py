@@ -1,38 +1,78 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1 import auth, transactions, user
-from app.core.database import engine, Base
+from app.api.v1 import auth, transactions, user, media, monitoring
+from app.core.database import pool_liveness_loop, replica_lag_loop
+from app.services.partition_service import partition_maintenance_loop
+from app.services.ledger_service import ledger_snapshot_loop
+from app.services.maintenance_service import maintenance_loop
+from app.core.idempotency import IdempotencyMiddleware, create_idempotency_store
+from app.core.responses import FastJSONResponse
+from app.core.rate_limit import RateLimit, RateLimitMiddleware, create_token_buckets
+from app.core.sql_logging import current_route, current_sql_stats, RequestSQLStats, finish_request_stats
 from config import settings
+import asyncio
 import logging
 
 # Configurer le logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Importer tous les modèles pour qu'ils soient enregistrés dans Base.metadata
-from app.models.user import User, OTP
-from app.models.transaction import Transaction, Wallet
-
-# Créer les tables de base de données
-try:
-    logger.info("🔄 Création des tables dans la base de données...")
-    logger.info(f"📊 Connexion à: {settings.database_url}")
-    Base.metadata.create_all(bind=engine)
-    logger.info("✅ Toutes les tables ont été créées avec succès!")
-except Exception as e:
-    logger.error(f"❌ Erreur lors de la création des tables: {e}")
-    import traceback
-    logger.error(traceback.format_exc())
-    # Ne pas faire crash l'application - les tables existent peut-être déjà
-    logger.warning("⚠️ Continuation du démarrage malgré l'erreur de création des tables")
+# Le schéma est géré par les migrations versionnées (python migrate.py) :
+# aucun DDL ni connexion à la base au chargement de l'application
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Démarrer et arrêter les tâches de fond"""
+    background_tasks = [
+        asyncio.create_task(pool_liveness_loop()),
+        asyncio.create_task(replica_lag_loop()),
+        asyncio.create_task(partition_maintenance_loop()),
+        asyncio.create_task(ledger_snapshot_loop()),
+        asyncio.create_task(maintenance_loop()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
 
 # Créer l'application FastAPI
 app = FastAPI(
     title=settings.project_name,
     version="1.0.0",
-    description="API pour l'application Fintel - Gestion de portefeuille mobile"
+    description="API pour l'application Fintel - Gestion de portefeuille mobile",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
+)
+
+# Idempotency-Key : une nouvelle tentative d'un mobile rejoue la réponse en cache
+# au lieu de déplacer l'argent une seconde fois
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths=[
+        f"{settings.api_v1_str}/transactions/{endpoint}"
+        for endpoint in ("deposit", "withdrawal", "transfer", "fintel-transfer", "batch-transfer")
+    ],
+    store=create_idempotency_store(),
+    wait_seconds=settings.idempotency_wait_seconds,
 )
 
+# Limitation de débit : un client abusif reçoit 429 avant de coûter une requête SQL ou un calcul bcrypt
+if settings.rate_limit_enabled:
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules={
+            f"{settings.api_v1_str}/auth/request-otp": [
+                RateLimit("otp", "ip", settings.rate_limit_otp_ip),
+                RateLimit("otp", "phone", settings.rate_limit_otp_phone),
+            ],
+            f"{settings.api_v1_str}/auth/login": [
+                RateLimit("login", "ip", settings.rate_limit_login_ip),
+                RateLimit("login", "phone", settings.rate_limit_login_phone),
+            ],
+        },
+        buckets=create_token_buckets(),
+    )
+
 # Configuration CORS - Autoriser toutes les origines pour le développement mobile
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +82,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def route_template(request: Request) -> str:
+    """Clé de métrique de la requête : méthode et modèle de la route, `unmatched` hors routes"""
+    route = request.scope.get("route")
+    if route is None or request.method not in getattr(route, "methods", ()):
+        return "unmatched"
+    return f"{request.method} {route.path}"
+
+@app.middleware("http")
+async def sql_instrumentation(request: Request, call_next):
+    """Associer les requêtes SQL à la route HTTP qui les a déclenchées et les comptabiliser
+    (nombre, temps total, répétitions / N+1)
+
+    Les journaux gardent le chemin reçu ; les métriques sont indexées par le modèle de la route
+    (/media/{name}) pour que leur nombre reste borné.
+    """
+    route_token = current_route.set(f"{request.method} {request.url.path}")
+    stats = RequestSQLStats() if settings.sql_instrumentation_enabled else None
+    stats_token = current_sql_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        current_route.reset(route_token)
+        current_sql_stats.reset(stats_token)
+    if stats is not None:
+        headers = finish_request_stats(route_template(request), stats)
+        if settings.debug:
+            response.headers.update(headers)
+    return response
+
 # Inclure les routers
 app.include_router(
     auth.router,
@@ -61,6 +130,18 @@ app.include_router(
     tags=["User"]
 )
 
+app.include_router(
+    media.router,
+    prefix=f"{settings.api_v1_str}/media",
+    tags=["Media"]
+)
+
+app.include_router(
+    monitoring.router,
+    prefix=f"{settings.api_v1_str}/monitoring",
+    tags=["Monitoring"]
+)
+
 @app.get("/")
 async def root():
     """Point d'entrée de l'API"""
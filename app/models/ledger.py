@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Numeric, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class LedgerEntry(Base):
+    """Écriture du grand livre (append-only : jamais modifiée ni supprimée)
+
+    Chaque opération (dépôt, retrait, transfert) produit au moins deux écritures de même
+    operation_id dont les débits et crédits s'équilibrent. Les écritures d'un portefeuille
+    portent wallet_id, le solde après écriture et la version du portefeuille.
+    """
+    __tablename__ = "ledger_entries"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    operation_id = Column(String(36), nullable=False, index=True)
+    account = Column(String(50), nullable=False)  # 'wallet:<id>', 'external:<réseau>', 'system:opening'
+    wallet_id = Column(Integer, ForeignKey("wallets.id"), nullable=True)
+    direction = Column(String(6), nullable=False)  # 'debit' ou 'credit'
+    amount = Column(Numeric(15, 2), nullable=False)  # toujours positif
+    balance_after = Column(Numeric(15, 2), nullable=True)  # écritures de portefeuille uniquement
+    wallet_version = Column(Integer, nullable=True)
+    transaction_reference = Column(String(100), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_ledger_entries_wallet_id_id", "wallet_id", "id"),
+        # Instantanés et solde à une date : écritures d'un portefeuille postérieures à une version
+        Index("ix_ledger_entries_wallet_version", "wallet_id", "wallet_version"),
+    )
+
+class WalletBalanceSnapshot(Base):
+    """Instantané périodique du solde d'un portefeuille (calculé depuis le grand livre)
+
+    Couvre les écritures du portefeuille jusqu'à wallet_version incluse.
+    """
+    __tablename__ = "wallet_balance_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    wallet_id = Column(Integer, ForeignKey("wallets.id"), nullable=False)
+    balance = Column(Numeric(15, 2), nullable=False)
+    wallet_version = Column(Integer, nullable=False)
+    last_entry_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
+    taken_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_wallet_balance_snapshots_wallet_taken", "wallet_id", "taken_at"),
+    )
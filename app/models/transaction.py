@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -22,12 +22,23 @@ class Transaction(Base):
     # Relation avec l'utilisateur
     user = relationship("User", back_populates="transactions")
 
+    __table_args__ = (
+        # Historique paginé par curseur : WHERE user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+        Index("ix_transactions_user_created_id", "user_id", created_at.desc(), id.desc()),
+        # Expiration des transactions restées en attente (maintenance) : seules les lignes 'pending' sont indexées
+        Index(
+            "ix_transactions_pending_created", created_at,
+            postgresql_where=status == "pending", sqlite_where=status == "pending",
+        ),
+    )
+
 class Wallet(Base):
     __tablename__ = "wallets"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
-    balance = Column(Numeric(15, 2), default=5000.00)  # Solde par défaut de 5000 XOF pour les tests
+    balance = Column(Numeric(15, 2), default=5000.00)  # Cache du grand livre (ledger_entries), maintenu à chaque écriture
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # Incrémentée à chaque écriture du grand livre
     currency = Column(String(3), default="XOF")
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
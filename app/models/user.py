@@ -1,41 +1,115 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Date
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Date, ForeignKey
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from app.core.database import Base
+from app.core.phone import normalize_phone
 
-class User(Base):
-    __tablename__ = "users"
+class UserProfile(Base):
+    """Profil (contact, adresse, préférences) : lu seulement par l'endpoint de profil"""
+    __tablename__ = "user_profiles"
 
-    id = Column(Integer, primary_key=True, index=True)
-    phone_number = Column(String(20), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
     whatsapp_number = Column(String(20), nullable=True)
     email = Column(String(255), unique=True, index=True, nullable=True)
-    first_name = Column(String(100), nullable=True)
-    last_name = Column(String(100), nullable=True)
     date_of_birth = Column(Date, nullable=True)
     country = Column(String(100), nullable=True)
     city = Column(String(100), nullable=True)
     address = Column(Text, nullable=True)
+    profile_picture_url = Column(Text, nullable=True)  # URL /api/v1/media/... (anciennes images base64 : extract_media.py)
+    otp_delivery_preference = Column(String(10), default='sms')  # 'sms' ou 'email'
+    terms_accepted = Column(Boolean, default=False)
+    privacy_policy_accepted = Column(Boolean, default=False)
+
+    user = relationship("User", back_populates="profile")
+
+class UserKYC(Base):
+    """Pièce d'identité et photos KYC"""
+    __tablename__ = "user_kyc"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
     id_type = Column(String(50), nullable=True)
     id_number = Column(String(100), nullable=True)
     id_issue_date = Column(Date, nullable=True)
     id_expiry_date = Column(Date, nullable=True)
-    profile_picture_url = Column(Text, nullable=True)  # TEXT pour supporter les images base64
     front_id_photo_url = Column(String(500), nullable=True)
     back_id_photo_url = Column(String(500), nullable=True)
     selfie_photo_url = Column(String(500), nullable=True)
-    otp_delivery_preference = Column(String(10), default='sms')  # 'sms' ou 'email'
-    terms_accepted = Column(Boolean, default=False)
-    privacy_policy_accepted = Column(Boolean, default=False)
+
+    user = relationship("User", back_populates="kyc")
+
+# Champs de User stockés dans user_profiles et user_kyc
+PROFILE_FIELDS = (
+    "whatsapp_number", "email", "date_of_birth", "country", "city", "address", "profile_picture_url",
+    "otp_delivery_preference", "terms_accepted", "privacy_policy_accepted",
+)
+KYC_FIELDS = (
+    "id_type", "id_number", "id_issue_date", "id_expiry_date",
+    "front_id_photo_url", "back_id_photo_url", "selfie_photo_url",
+)
+
+def profile_field(name: str):
+    """Attribut de User lu et écrit dans user_profiles (ligne créée à la première écriture)"""
+    return association_proxy("profile", name, creator=lambda value: UserProfile(**{name: value}))
+
+def kyc_field(name: str):
+    """Attribut de User lu et écrit dans user_kyc (ligne créée à la première écriture)"""
+    return association_proxy("kyc", name, creator=lambda value: UserKYC(**{name: value}))
+
+def detail_model(field: str):
+    """Table (UserProfile ou UserKYC) d'un champ de profil ou KYC de User"""
+    return UserProfile if field in PROFILE_FIELDS else UserKYC
+
+class User(Base):
+    """Compte : identité et authentification seulement, pour que les recherches fréquentes lisent une ligne étroite
+
+    Le profil et le KYC sont dans user_profiles et user_kyc (jointure seulement quand ils sont lus) ;
+    leurs champs restent accessibles comme attributs de User.
+    """
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    phone_number = Column(String(20), unique=True, index=True, nullable=False)
+    phone_e164 = Column(String(16), unique=True, index=True, nullable=True)  # Clé de recherche, dérivée de phone_number
+    first_name = Column(String(100), nullable=True)  # Noms : affichés par les transferts et paiements groupés
+    last_name = Column(String(100), nullable=True)
     hashed_password = Column(String(255), nullable=True)
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())  # Aussi à chaque modification du profil ou du KYC (ETag)
 
     # Relations
     transactions = relationship("Transaction", back_populates="user")
     wallet = relationship("Wallet", back_populates="user", uselist=False)
+    profile = relationship(UserProfile, back_populates="user", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    kyc = relationship(UserKYC, back_populates="user", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+
+    # Profil (user_profiles)
+    whatsapp_number = profile_field("whatsapp_number")
+    email = profile_field("email")
+    date_of_birth = profile_field("date_of_birth")
+    country = profile_field("country")
+    city = profile_field("city")
+    address = profile_field("address")
+    profile_picture_url = profile_field("profile_picture_url")
+    otp_delivery_preference = profile_field("otp_delivery_preference")
+    terms_accepted = profile_field("terms_accepted")
+    privacy_policy_accepted = profile_field("privacy_policy_accepted")
+
+    # KYC (user_kyc)
+    id_type = kyc_field("id_type")
+    id_number = kyc_field("id_number")
+    id_issue_date = kyc_field("id_issue_date")
+    id_expiry_date = kyc_field("id_expiry_date")
+    front_id_photo_url = kyc_field("front_id_photo_url")
+    back_id_photo_url = kyc_field("back_id_photo_url")
+    selfie_photo_url = kyc_field("selfie_photo_url")
+
+    @validates("phone_number")
+    def _sync_phone_e164(self, key, phone_number):
+        self.phone_e164 = normalize_phone(phone_number)
+        return phone_number
 
 class OTP(Base):
     __tablename__ = "otps"
@@ -45,4 +119,4 @@ class OTP(Base):
     otp_code = Column(String(10), nullable=False)
     is_used = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # Purge du journal (maintenance)
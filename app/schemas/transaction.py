@@ -1,5 +1,5 @@
 from pydantic import BaseModel, field_serializer
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
 
@@ -50,6 +50,7 @@ class WalletInDB(WalletBase):
     id: int
     user_id: int
     is_active: bool
+    version: int = 0
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -59,5 +60,48 @@ class WalletInDB(WalletBase):
 class Wallet(WalletInDB):
     pass
 
+class WalletBalanceAt(BaseModel):
+    """Solde d'un portefeuille à une date donnée (reconstitué depuis le grand livre)"""
+    wallet_id: int
+    at: datetime
+    balance: Decimal
+    currency: str = "XOF"
+
+    @field_serializer('balance')
+    def serialize_balance(self, value: Decimal) -> float:
+        return float(value)
+
+class BatchTransferLine(BaseModel):
+    recipient_phone: str
+    amount: Decimal
+    description: Optional[str] = None
+
+class BatchTransferRequest(BaseModel):
+    """Paiement groupé (salaires, cashback) : un débit unique, un crédit par ligne"""
+    lines: List[BatchTransferLine]
+    description: str = "Paiement groupé"
+
+class BatchTransferLineResult(BaseModel):
+    line: int  # Position de la ligne dans la requête (à partir de 0)
+    recipient_phone: str
+    amount: Decimal
+    status: str  # 'completed' ou 'rejected'
+    reason: Optional[str] = None
+    reference: Optional[str] = None
+
+    @field_serializer('amount')
+    def serialize_amount(self, value: Decimal) -> float:
+        return float(value)
+
+class BatchTransferResult(BaseModel):
+    reference: Optional[str] = None  # Référence de la transaction de débit de l'expéditeur
+    completed: int
+    rejected: int
+    total_amount: Decimal
+    sender_balance: Optional[Decimal] = None
+    lines: List[BatchTransferLineResult]
 
+    @field_serializer('total_amount', 'sender_balance')
+    def serialize_decimal(self, value: Optional[Decimal]) -> Optional[float]:
+        return float(value) if value is not None else None
 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_serializer
 from typing import Optional
 from datetime import datetime, date
 
@@ -47,6 +47,42 @@ class UserInDB(UserBase):
 class User(UserInDB):
     pass
 
+class UserProfile(BaseModel):
+    """Profil complet (GET/PUT /user/profile), lu directement sur le modèle User"""
+    id: int
+    phone_number: str
+    whatsapp_number: Optional[str] = None
+    email: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    date_of_birth: Optional[date] = None
+    country: Optional[str] = None
+    city: Optional[str] = None
+    address: Optional[str] = None
+    id_type: Optional[str] = None
+    id_number: Optional[str] = None
+    id_issue_date: Optional[date] = None
+    id_expiry_date: Optional[date] = None
+    profile_picture_url: Optional[str] = None
+    front_id_photo_url: Optional[str] = None
+    back_id_photo_url: Optional[str] = None
+    selfie_photo_url: Optional[str] = None
+    otp_delivery_preference: Optional[str] = None
+    terms_accepted: Optional[bool] = None
+    privacy_policy_accepted: Optional[bool] = None
+    is_active: Optional[bool] = None
+    is_verified: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    @field_serializer('created_at', 'updated_at')
+    def serialize_datetime(self, value: Optional[datetime]) -> Optional[str]:
+        # Format historique du profil (isoformat : "+00:00" et non "Z")
+        return value.isoformat() if value else None
+
+    class Config:
+        from_attributes = True
+
 class UserLogin(BaseModel):
     phone_number: str
     password: str
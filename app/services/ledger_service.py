@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List, Optional
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core.metrics import metrics
+from app.models.ledger import LedgerEntry, WalletBalanceSnapshot
+from app.models.transaction import Wallet
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Comptes de contrepartie (hors portefeuilles)
+OPENING_ACCOUNT = "system:opening"  # Solde initial de 5000 XOF crédité à l'ouverture
+EXTERNAL_ACCOUNT = "external"  # Argent entrant / sortant (opérateurs mobile money)
+INITIAL_BALANCE = Decimal("5000.00")
+
+DEBIT = "debit"
+CREDIT = "credit"
+
+# Montant signé du point de vue du portefeuille : un crédit augmente le solde
+SIGNED_AMOUNT = case((LedgerEntry.direction == CREDIT, LedgerEntry.amount), else_=-LedgerEntry.amount)
+
+
+def wallet_account(wallet_id: int) -> str:
+    return f"wallet:{wallet_id}"
+
+
+def external_account(network: Optional[str] = None) -> str:
+    return f"{EXTERNAL_ACCOUNT}:{network}" if network else EXTERNAL_ACCOUNT
+
+
+class Posting:
+    """Une jambe d'une opération : compte, sens et montant (positif)"""
+
+    def __init__(self, account: str, direction: str, amount: Decimal, wallet: Optional[Wallet] = None):
+        self.account = account
+        self.direction = direction
+        self.amount = amount
+        self.wallet = wallet
+
+    @classmethod
+    def for_wallet(cls, wallet: Wallet, direction: str, amount: Decimal) -> "Posting":
+        return cls(wallet_account(wallet.id), direction, amount, wallet)
+
+
+def opening_postings(wallet: Wallet) -> List[Posting]:
+    """Écritures d'ouverture d'un portefeuille (solde initial de test)"""
+    return [
+        Posting.for_wallet(wallet, CREDIT, INITIAL_BALANCE),
+        Posting(OPENING_ACCOUNT, DEBIT, INITIAL_BALANCE),
+    ]
+
+
+def balance_update_statement(user_id: int, delta: Decimal):
+    """Variation atomique du solde en cache : une seule instruction, sans lecture préalable
+
+        UPDATE wallets SET balance = balance + :delta, version = version + 1, updated_at = now()
+        WHERE user_id = :user_id [AND balance >= :montant_débité] RETURNING wallets.*
+
+    Aucune ligne n'est renvoyée si le solde est insuffisant (ou si le portefeuille n'existe pas).
+    Exécutée par la session ORM, l'instance Wallet déjà chargée est mise à jour avec les valeurs renvoyées.
+    """
+    conditions = [Wallet.user_id == user_id]
+    if delta < 0:
+        conditions.append(Wallet.balance >= -delta)
+    return (
+        update(Wallet)
+        .where(*conditions)
+        .values(balance=Wallet.balance + delta, version=Wallet.version + 1, updated_at=func.now())
+        .returning(Wallet)
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def build_entries(postings: List[Posting], transaction_reference: Optional[str] = None) -> List[LedgerEntry]:
+    """Construire les écritures d'une opération équilibrée
+
+    Les portefeuilles des postings portent déjà le nouveau solde et la nouvelle version
+    (renvoyés par balance_update_statement) : l'appelant ajoute les écritures à la même
+    session, le cache et le grand livre sont validés dans le même commit.
+    """
+    debits = sum((p.amount for p in postings if p.direction == DEBIT), Decimal("0"))
+    credits = sum((p.amount for p in postings if p.direction == CREDIT), Decimal("0"))
+    if any(p.direction not in (DEBIT, CREDIT) or p.amount <= 0 for p in postings):
+        raise ValueError("Écriture invalide : sens 'debit' / 'credit' et montant positif requis")
+    if debits != credits:
+        raise ValueError(f"Opération déséquilibrée : débits {debits} != crédits {credits}")
+
+    operation_id = str(uuid.uuid4())
+    entries = []
+    for posting in postings:
+        entry = LedgerEntry(
+            operation_id=operation_id,
+            account=posting.account,
+            direction=posting.direction,
+            amount=posting.amount,
+            transaction_reference=transaction_reference,
+        )
+        if posting.wallet is not None:
+            entry.wallet_id = posting.wallet.id
+            entry.balance_after = posting.wallet.balance
+            entry.wallet_version = posting.wallet.version
+        entries.append(entry)
+    return entries
+
+
+class LedgerService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def post(self, postings: List[Posting], transaction_reference: Optional[str] = None) -> List[LedgerEntry]:
+        """Enregistrer une opération (sans commit : validée avec le reste de la transaction)"""
+        entries = build_entries(postings, transaction_reference)
+        self.db.add_all(entries)
+        return entries
+
+    def open_wallet(self, user_id: int) -> Wallet:
+        """Créer un portefeuille et son écriture d'ouverture (sans commit)"""
+        wallet = Wallet(user_id=user_id, balance=INITIAL_BALANCE, version=1)
+        self.db.add(wallet)
+        self.db.flush()
+        self.post(opening_postings(wallet))
+        return wallet
+
+    def balance_at(self, wallet_id: int, at: datetime) -> Decimal:
+        """Solde d'un portefeuille à une date : dernier instantané + écritures suivantes"""
+        snapshot = self.db.execute(
+            select(WalletBalanceSnapshot)
+            .where(WalletBalanceSnapshot.wallet_id == wallet_id, WalletBalanceSnapshot.taken_at <= at)
+            .order_by(WalletBalanceSnapshot.taken_at.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+        balance = snapshot.balance if snapshot else Decimal("0.00")
+        after_version = snapshot.wallet_version if snapshot else 0
+
+        delta = self.db.execute(
+            select(func.coalesce(func.sum(SIGNED_AMOUNT), 0))
+            .where(
+                LedgerEntry.wallet_id == wallet_id,
+                LedgerEntry.wallet_version > after_version,
+                LedgerEntry.created_at <= at,
+            )
+        ).scalar()
+        return Decimal(balance) + Decimal(delta)
+
+    def take_snapshots(self, batch_size: int = 1000) -> int:
+        """Instantané des portefeuilles modifiés depuis leur dernier instantané
+
+        La borne est la version validée du portefeuille, et non l'id des écritures : les id sont
+        attribués avant le commit, une écriture d'id plus petit peut donc devenir visible après
+        l'instantané. Une version n'est lue qu'une fois validée avec ses écritures, qui sont donc
+        toutes visibles (sans verrou). Le solde est recalculé depuis le grand livre (instantané
+        précédent + écritures) puis comparé au solde après la dernière écriture : un écart est
+        journalisé (ledger.drift).
+        """
+        last_version = (
+            select(func.max(WalletBalanceSnapshot.wallet_version))
+            .where(WalletBalanceSnapshot.wallet_id == Wallet.id)
+            .scalar_subquery()
+        )
+        wallets = self.db.execute(
+            select(Wallet.id, Wallet.version)
+            .where(Wallet.version > func.coalesce(last_version, 0))
+            .order_by(Wallet.id)
+            .limit(batch_size)
+        ).all()
+
+        for wallet_id, version in wallets:
+            previous = self.db.execute(
+                select(WalletBalanceSnapshot)
+                .where(WalletBalanceSnapshot.wallet_id == wallet_id)
+                .order_by(WalletBalanceSnapshot.wallet_version.desc())
+                .limit(1)
+            ).scalar_one_or_none()
+            after_version = previous.wallet_version if previous else 0
+            delta = self.db.execute(
+                select(func.coalesce(func.sum(SIGNED_AMOUNT), 0))
+                .where(
+                    LedgerEntry.wallet_id == wallet_id,
+                    LedgerEntry.wallet_version > after_version,
+                    LedgerEntry.wallet_version <= version,
+                )
+            ).scalar()
+            last_entry = self.db.execute(
+                select(LedgerEntry)
+                .where(LedgerEntry.wallet_id == wallet_id, LedgerEntry.wallet_version <= version)
+                .order_by(LedgerEntry.wallet_version.desc())
+                .limit(1)
+            ).scalar_one_or_none()
+            if last_entry is None:
+                continue
+            balance = (previous.balance if previous else Decimal("0.00")) + Decimal(delta)
+            if balance != last_entry.balance_after:
+                metrics.incr("ledger.drift")
+                logger.error(
+                    f"❌ Grand livre incohérent: wallet.id={wallet_id}, somme des écritures={balance}, "
+                    f"solde après écriture {last_entry.id}={last_entry.balance_after}"
+                )
+            self.db.add(WalletBalanceSnapshot(
+                wallet_id=wallet_id,
+                balance=balance,
+                wallet_version=version,
+                last_entry_id=last_entry.id,
+                taken_at=datetime.now(timezone.utc),
+            ))
+        self.db.commit()
+        metrics.incr("ledger.snapshots", len(wallets))
+        return len(wallets)
+
+    def verify(self) -> dict:
+        """Vérifier le grand livre : opérations équilibrées et soldes en cache égaux à la somme des écritures"""
+        # Arrondi à l'échelle de la colonne : SQLite somme des flottants
+        net = func.round(func.sum(SIGNED_AMOUNT), 2)
+        unbalanced = self.db.execute(
+            select(LedgerEntry.operation_id, net)
+            .group_by(LedgerEntry.operation_id)
+            .having(net != 0)
+        ).all()
+
+        totals = (
+            select(LedgerEntry.wallet_id, func.sum(SIGNED_AMOUNT).label("total"))
+            .where(LedgerEntry.wallet_id.isnot(None))
+            .group_by(LedgerEntry.wallet_id)
+            .subquery()
+        )
+        drifted = self.db.execute(
+            select(Wallet.id, Wallet.balance, func.coalesce(totals.c.total, 0))
+            .outerjoin(totals, totals.c.wallet_id == Wallet.id)
+            .where(Wallet.balance != func.coalesce(totals.c.total, 0))
+        ).all()
+
+        return {
+            "unbalanced_operations": [{"operation_id": op, "net": float(net)} for op, net in unbalanced],
+            "wallet_drift": [
+                {"wallet_id": wallet_id, "cached_balance": float(cached), "ledger_balance": float(total)}
+                for wallet_id, cached, total in drifted
+            ],
+        }
+
+
+def run_ledger_snapshots() -> int:
+    """Instantanés de tous les portefeuilles modifiés, par lots"""
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            count = LedgerService(db).take_snapshots(settings.ledger_snapshot_batch_size)
+            total += count
+            if count < settings.ledger_snapshot_batch_size:
+                return total
+    finally:
+        db.close()
+
+
+async def ledger_snapshot_loop(interval: int = None):
+    """Boucle de fond : instantanés périodiques des soldes (soldes à date rapides)"""
+    interval = interval if interval is not None else settings.ledger_snapshot_interval
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            count = await asyncio.to_thread(run_ledger_snapshots)
+            if count:
+                logger.info(f"📸 Instantanés du grand livre: {count} portefeuille(s)")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors des instantanés du grand livre: {e}")
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core.metrics import metrics
+from app.models.transaction import Transaction
+from app.models.user import OTP
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statut d'une transaction restée 'pending' au-delà de PENDING_TRANSACTION_TIMEOUT_MINUTES
+TIMED_OUT_STATUS = "failed"
+
+
+class MaintenanceService:
+    """Purge des tables qui ne font que grossir, par lots bornés (un commit par lot, verrous courts)
+
+    Chaque lot sélectionne au plus `batch_size` identifiants via les index partiels / sur expires_at
+    (migration 0005) puis les traite ; sur PostgreSQL, les lignes verrouillées par une requête
+    en cours sont ignorées (SKIP LOCKED) et reprises au passage suivant.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _lock_batch(self, query):
+        if self.db.get_bind().dialect.name == "postgresql":
+            return query.with_for_update(skip_locked=True)
+        return query
+
+    def purge_otps(self, cutoff: datetime, batch_size: int) -> int:
+        """Supprimer un lot de lignes otps expirées avant `cutoff` (utilisées ou non)"""
+        ids = (
+            select(OTP.id)
+            .where(OTP.expires_at < cutoff)
+            .order_by(OTP.expires_at)
+            .limit(batch_size)
+        )
+        result = self.db.execute(
+            delete(OTP).where(OTP.id.in_(self._lock_batch(ids).scalar_subquery())),
+            execution_options={"synchronize_session": False},
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def expire_pending_transactions(self, cutoff: datetime, batch_size: int) -> int:
+        """Passer en TIMED_OUT_STATUS un lot de transactions 'pending' créées avant `cutoff`
+
+        Une transaction restée 'pending' n'a jamais déplacé d'argent : son statut et ses écritures
+        du grand livre sont validés dans le même commit.
+        """
+        ids = (
+            select(Transaction.id)
+            .where(Transaction.status == "pending", Transaction.created_at < cutoff)
+            .order_by(Transaction.created_at)
+            .limit(batch_size)
+        )
+        result = self.db.execute(
+            update(Transaction)
+            .where(
+                Transaction.id.in_(self._lock_batch(ids).scalar_subquery()),
+                Transaction.status == "pending",
+                Transaction.created_at < cutoff,
+            )
+            .values(status=TIMED_OUT_STATUS, updated_at=func.now()),
+            execution_options={"synchronize_session": False},
+        )
+        self.db.commit()
+        return result.rowcount
+
+
+def run_in_batches(step, cutoff: datetime) -> int:
+    """Répéter `step` jusqu'à un lot incomplet, au plus MAINTENANCE_MAX_BATCHES lots"""
+    total = 0
+    for _ in range(settings.maintenance_max_batches):
+        count = step(cutoff, settings.maintenance_batch_size)
+        total += count
+        if count < settings.maintenance_batch_size:
+            break
+    return total
+
+
+def run_maintenance() -> Dict[str, int]:
+    """Un passage de maintenance : lignes traitées par tâche"""
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        service = MaintenanceService(db)
+        processed = {
+            "otps_purged": run_in_batches(
+                service.purge_otps, now - timedelta(hours=settings.otp_retention_hours)
+            ),
+            "transactions_timed_out": run_in_batches(
+                service.expire_pending_transactions,
+                now - timedelta(minutes=settings.pending_transaction_timeout_minutes),
+            ),
+        }
+    finally:
+        db.close()
+    for name, count in processed.items():
+        metrics.incr(f"maintenance.{name}", count)
+        metrics.set_gauge(f"maintenance.last_run.{name}", count)
+    metrics.observe("maintenance.duration", time.perf_counter() - started)
+    return processed
+
+
+async def maintenance_loop(interval: int = None):
+    """Boucle de fond : purge périodique des OTP expirés et des transactions en attente"""
+    interval = interval if interval is not None else settings.maintenance_interval
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            processed = await asyncio.to_thread(run_maintenance)
+            logger.info(
+                f"🧹 Maintenance: {processed['otps_purged']} OTP purgé(s), "
+                f"{processed['transactions_timed_out']} transaction(s) en attente expirée(s)"
+            )
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la maintenance: {e}")
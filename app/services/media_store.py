@@ -0,0 +1,219 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+from typing import BinaryIO, Iterator, Optional, Tuple
+from app.core.metrics import metrics
+from config import settings
+
+# Blocs lus et écrits à la fois : un fichier n'est jamais chargé entier en mémoire
+CHUNK_SIZE = 64 * 1024
+# Octets nécessaires pour reconnaître le format (en-tête RIFF....WEBP)
+HEAD_SIZE = 12
+# Nom d'un média : empreinte SHA-256 du contenu et extension de son type
+MEDIA_NAME = re.compile(r"([0-9a-f]{64})\.(jpg|png|webp)")
+# Photos de profil et pièces KYC acceptées, reconnues à leurs premiers octets (pas au Content-Type du client)
+MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+# Images encore envoyées en ligne dans le profil (data:image/...;base64,...)
+DATA_URI = re.compile(r"data:image/[\w.+-]+;base64,", re.IGNORECASE)
+
+
+class MediaError(ValueError):
+    """Média refusé : message destiné au client"""
+
+
+class MediaTooLarge(MediaError):
+    pass
+
+
+def detect_extension(head: bytes) -> Optional[str]:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class StoredMedia:
+    """Média enregistré : nom adressé par contenu et URL à conserver dans la ligne users"""
+
+    def __init__(self, digest: str, extension: str, size: int, created: bool):
+        self.digest = digest
+        self.extension = extension
+        self.size = size
+        self.created = created  # False si le même contenu était déjà stocké (dédoublonné)
+
+    @property
+    def name(self) -> str:
+        return f"{self.digest}.{self.extension}"
+
+    @property
+    def url(self) -> str:
+        return f"{settings.api_v1_str}/media/{self.name}"
+
+    @property
+    def content_type(self) -> str:
+        return MEDIA_TYPES[self.extension]
+
+
+class MediaWriter:
+    """Média écrit par morceaux dans un fichier temporaire : type, taille et empreinte contrôlés au fil de l'eau
+
+    Bloquant (disque) : à appeler hors de la boucle. Le fichier temporaire est supprimé à la sortie
+    du bloc `with` s'il n'a pas été publié par finish().
+    """
+
+    def __init__(self, store: "MediaStore"):
+        self.store = store
+        self.size = 0
+        self.extension = None
+        self._head = b""  # premiers octets, retenus jusqu'à pouvoir reconnaître le format
+        self._digest = hashlib.sha256()
+        os.makedirs(store.directory, exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(prefix=".upload-", dir=store.directory)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.store.max_bytes:
+            raise MediaTooLarge(f"Fichier trop volumineux (maximum {self.store.max_bytes} octets)")
+        if self.extension is None:
+            self._head += chunk
+            if len(self._head) < HEAD_SIZE:
+                return
+            chunk, self._head = self._head, b""
+            self._detect(chunk)
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def _detect(self, head: bytes) -> None:
+        self.extension = detect_extension(head)
+        if self.extension is None:
+            raise MediaError("Format d'image non supporté (JPEG, PNG ou WebP)")
+
+    def finish(self) -> StoredMedia:
+        """Publier le média sous son nom définitif (dédoublonné si le contenu existe déjà)"""
+        if self.extension is None:
+            if not self._head:
+                raise MediaError("Fichier vide")
+            head, self._head = self._head, b""
+            self._detect(head)
+            self._digest.update(head)
+            self._file.write(head)
+        self._file.close()
+        stored = StoredMedia(self._digest.hexdigest(), self.extension, self.size, created=False)
+        path = self.store.path(stored.name)
+        if os.path.exists(path):
+            metrics.incr("media.deduplicated")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._temp_path, path)
+            stored.created = True
+            metrics.incr("media.stored")
+            metrics.incr("media.stored_bytes", self.size)
+        return stored
+
+    def close(self) -> None:
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self) -> "MediaWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class MediaStore:
+    """Fichiers adressés par leur contenu (SHA-256) : MEDIA_DIR/ab/<sha256>.<ext>
+
+    Un contenu identique n'est stocké qu'une fois et un fichier n'est jamais modifié :
+    son nom sert d'ETag et il peut être mis en cache sans limite par les clients.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, name: str) -> Optional[str]:
+        """Chemin d'un média d'après son nom, None si le nom n'est pas celui d'un média"""
+        if not MEDIA_NAME.fullmatch(name):
+            return None
+        return os.path.join(self.directory, name[:2], name)
+
+    def writer(self) -> "MediaWriter":
+        """Écriture d'un média reçu par morceaux (corps de requête lu en flux)"""
+        return MediaWriter(self)
+
+    def save(self, source: BinaryIO) -> StoredMedia:
+        """Copier un flux par blocs en calculant son empreinte (bloquant : à appeler hors de la boucle)"""
+        with self.writer() as writer:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            return writer.finish()
+
+    def save_data_uri(self, value: str) -> StoredMedia:
+        """Image base64 en ligne (data:image/...;base64,...) -> média stocké"""
+        prefix = DATA_URI.match(value)
+        if not prefix:
+            raise MediaError("Image en ligne invalide")
+        encoded = value[prefix.end():]
+        # Taille décodée bornée avant décodage : 4 caractères base64 pour 3 octets
+        if len(encoded) // 4 * 3 > self.max_bytes + 2:
+            raise MediaTooLarge(f"Fichier trop volumineux (maximum {self.max_bytes} octets)")
+        try:
+            data = base64.b64decode(encoded, validate=False)
+        except (binascii.Error, ValueError):
+            raise MediaError("Image en ligne invalide")
+        return self.save(BytesIO(data))
+
+    def read(self, path: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Octets [start, end] d'un média, par blocs (générateur itéré dans le pool de threads)"""
+        with open(path, "rb") as media:
+            media.seek(start)
+            remaining = (end if end is not None else os.path.getsize(path) - 1) - start + 1
+            while remaining > 0:
+                chunk = media.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """En-tête Range "bytes=a-b" (une seule plage) -> (début, fin) inclus ; None = fichier entier
+
+    Lève MediaError si la plage ne peut pas être satisfaite (réponse 416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffixe "bytes=-N" : les N derniers octets
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise MediaError("Plage non satisfaisable")
+    return start, min(end, size - 1)
+
+
+def is_data_uri(value: Optional[str]) -> bool:
+    return bool(value) and DATA_URI.match(value) is not None
+
+
+media_store = MediaStore(settings.media_dir, settings.media_max_bytes)
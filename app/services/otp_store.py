@@ -0,0 +1,143 @@
+import hmac
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+from app.core.metrics import metrics
+from app.core.phone import normalize_phone
+from config import settings
+
+# Résultats d'une vérification
+VERIFIED = "verified"
+INVALID = "invalid"
+MISSING = "missing"  # Aucun code en cours (jamais émis, expiré ou déjà utilisé)
+LOCKED = "locked"  # Trop d'essais : le code est détruit
+
+# Vérification atomique côté Redis : comparaison, comptage des essais et destruction du code
+VERIFY_SCRIPT = """
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return 'missing'
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 'verified'
+end
+local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+    return 'locked'
+end
+return 'invalid'
+"""
+
+
+class IssuedOTP:
+    """Code émis pour un numéro (renvoyé à l'endpoint et, si activé, journalisé dans la table otps)"""
+
+    def __init__(self, phone_number: str, otp_code: str, expires_at: datetime):
+        self.phone_number = phone_number
+        self.otp_code = otp_code
+        self.expires_at = expires_at
+
+
+class MemoryOTPStore:
+    """Codes OTP en mémoire (par processus) : un code par numéro, expiration et essais comptés
+
+    Émettre un code remplace le précédent ; un code vérifié ou épuisé (OTP_MAX_ATTEMPTS) est détruit.
+    Les codes expirés sont purgés au plus une fois par minute lors d'une émission.
+    """
+
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, max_attempts: int):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._codes: Dict[str, List] = {}  # numéro -> [code, expiration (monotonic), essais]
+        self._last_sweep = time.monotonic()
+
+    def issue(self, phone_number: str, otp_code: str, ttl: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= self.SWEEP_INTERVAL:
+                expired = [phone for phone, entry in self._codes.items() if entry[1] <= now]
+                for phone in expired:
+                    del self._codes[phone]
+                self._last_sweep = now
+            self._codes[phone_number] = [otp_code, now + ttl, 0]
+            metrics.set_gauge("otp.pending", len(self._codes))
+
+    def verify(self, phone_number: str, otp_code: str) -> str:
+        with self._lock:
+            entry = self._codes.get(phone_number)
+            if entry is None or entry[1] <= time.monotonic():
+                self._codes.pop(phone_number, None)
+                return MISSING
+            if hmac.compare_digest(entry[0], otp_code):
+                del self._codes[phone_number]
+                return VERIFIED
+            entry[2] += 1
+            if entry[2] >= self.max_attempts:
+                del self._codes[phone_number]
+                return LOCKED
+            return INVALID
+
+
+class RedisOTPStore:
+    """Codes OTP partagés entre workers (Redis, dépendance optionnelle `redis`), même interface
+
+    Client synchrone : les endpoints l'appellent hors de la boucle d'événements (asyncio.to_thread).
+    """
+
+    def __init__(self, max_attempts: int, url: str):
+        import redis
+
+        self.max_attempts = max_attempts
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._verify = self.client.register_script(VERIFY_SCRIPT)
+
+    @staticmethod
+    def _key(phone_number: str) -> str:
+        return f"fintel:otp:{phone_number}"
+
+    def issue(self, phone_number: str, otp_code: str, ttl: float) -> None:
+        key = self._key(phone_number)
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.delete(key)
+        pipeline.hset(key, mapping={"code": otp_code, "attempts": 0})
+        pipeline.pexpire(key, int(ttl * 1000))
+        pipeline.execute()
+
+    def verify(self, phone_number: str, otp_code: str) -> str:
+        return self._verify(keys=[self._key(phone_number)], args=[otp_code, self.max_attempts])
+
+
+class OTPService:
+    """Émission et vérification des OTP sur le store configuré (OTP_STORE), avec métriques
+
+    Les codes sont rangés par numéro canonique : un code demandé pour "+225 05..." se vérifie avec "05...".
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def issue(self, phone_number: str, otp_code: str) -> IssuedOTP:
+        ttl = settings.otp_expire_minutes * 60
+        self.store.issue(normalize_phone(phone_number) or phone_number, otp_code, ttl)
+        metrics.incr("otp.issued")
+        return IssuedOTP(phone_number, otp_code, datetime.utcnow() + timedelta(seconds=ttl))
+
+    def verify(self, phone_number: str, otp_code: str) -> bool:
+        result = self.store.verify(normalize_phone(phone_number) or phone_number, otp_code)
+        metrics.incr(f"otp.{result}")
+        return result == VERIFIED
+
+
+def create_otp_store():
+    """Store partagé si OTP_STORE=redis (CACHE_REDIS_URL), sinon en mémoire"""
+    if settings.otp_store == "redis":
+        return RedisOTPStore(settings.otp_max_attempts, settings.cache_redis_url)
+    return MemoryOTPStore(settings.otp_max_attempts)
+
+
+otp_service = OTPService(create_otp_store())
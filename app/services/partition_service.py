@@ -0,0 +1,225 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import struct
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from app.core.database import engine
+from app.core.metrics import metrics
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Partitions mensuelles de transactions : transactions_pAAAAMM
+PARTITION_NAME = re.compile(r"^transactions_p(\d{4})(\d{2})$")
+
+# Mois archivé : transactions_pAAAAMM.jsonl.gz (un membre gzip par utilisateur) et son index
+# transactions_pAAAAMM.index, une entrée (user_id, position, taille) par utilisateur, triée par user_id
+ARCHIVE_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".index"
+INDEX_RECORD = struct.Struct("<qqq")
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"transactions_p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioned(conn: Connection) -> bool:
+    """La table transactions est-elle partitionnée (PostgreSQL, migration 0003) ?"""
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'transactions' AND c.relnamespace = 'public'::regnamespace"
+    )).first() is not None
+
+
+def list_transaction_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """Partitions mensuelles attachées, de la plus ancienne à la plus récente"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'transactions'"
+    )).scalars().all()
+    partitions = [(name, partition_month(name)) for name in rows]
+    return sorted([(name, month) for name, month in partitions if month], key=lambda item: item[1])
+
+
+def ensure_transaction_partitions(conn: Connection, months_ahead: int, today: Optional[date] = None) -> List[str]:
+    """Créer les partitions du mois courant et des `months_ahead` mois suivants si absentes
+
+    Retourne les noms des partitions créées (aucune si la table n'est pas partitionnée).
+    """
+    if not is_partitioned(conn):
+        return []
+    current = month_start(today or date.today())
+    existing = {name for name, _ in list_transaction_partitions(conn)}
+    created = []
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        name = partition_name(start)
+        if name in existing:
+            continue
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transactions "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+        ))
+        created.append(name)
+    conn.commit()
+    if created:
+        logger.info(f"📅 Partitions de transactions créées: {', '.join(created)}")
+        metrics.incr("db.partitions.created", len(created))
+    return created
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+def archive_index_path(archive_path: str) -> str:
+    return archive_path[:-len(ARCHIVE_SUFFIX)] + INDEX_SUFFIX
+
+
+def write_indexed_archive(lines: Iterable[Tuple[int, str]], final_path: str) -> int:
+    """Écrire un mois archivé : un membre gzip par utilisateur et l'index de ces membres
+
+    Le fichier reste un .jsonl.gz ordinaire (membres concaténés, lisible par zcat) ; l'index permet
+    à l'historique de lire les lignes d'un seul utilisateur sans décompresser le mois entier.
+    `lines` : (user_id, ligne JSON) triées par user_id. L'archive est renommée avant l'index :
+    une archive sans index reste lisible (lecture complète), jamais l'inverse.
+    Retourne le nombre de lignes écrites.
+    """
+    temp_path = final_path + ".tmp"
+    index_path = archive_index_path(final_path)
+    count = 0
+    try:
+        with open(temp_path, "wb") as archive, open(index_path + ".tmp", "wb") as index:
+            def write_member(user_id: int, chunk: List[str]) -> None:
+                data = gzip.compress("".join(chunk).encode("utf-8"))
+                index.write(INDEX_RECORD.pack(user_id, archive.tell(), len(data)))
+                archive.write(data)
+
+            current, chunk = None, []
+            for user_id, line in lines:
+                if user_id != current:
+                    if current is not None and user_id < current:
+                        raise ValueError("Lignes d'archive non triées par user_id")
+                    if chunk:
+                        write_member(current, chunk)
+                    current, chunk = user_id, []
+                chunk.append(line + "\n")
+                count += 1
+            if chunk:
+                write_member(current, chunk)
+    except BaseException:
+        for path in (temp_path, index_path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    os.replace(temp_path, final_path)
+    os.replace(index_path + ".tmp", index_path)
+    return count
+
+
+def read_archive_lines(path: str) -> Iterator[Tuple[int, str]]:
+    """(user_id, ligne JSON) d'un mois archivé, dans l'ordre du fichier (trié par user_id)"""
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            line = line.rstrip("\n")
+            if line:
+                yield json.loads(line)["user_id"], line
+
+
+def reindex_archive(path: str) -> int:
+    """Réécrire un mois archivé sans index (ancien format) au format indexé"""
+    return write_indexed_archive(read_archive_lines(path), path)
+
+
+def archive_transaction_partition(conn: Connection, name: str, archive_dir: str) -> int:
+    """Exporter une partition dans un fichier JSON Lines compressé et indexé par utilisateur,
+    puis la détacher et la supprimer
+
+    Le fichier et son index sont écrits (et renommés atomiquement) avant toute suppression :
+    en cas d'échec, la partition reste en place. Retourne le nombre de lignes archivées.
+    """
+    if partition_month(name) is None:
+        raise ValueError(f"Nom de partition invalide: {name}")
+    os.makedirs(archive_dir, exist_ok=True)
+    final_path = os.path.join(archive_dir, f"{name}{ARCHIVE_SUFFIX}")
+
+    result = conn.execute(
+        text(f"SELECT * FROM {name} ORDER BY user_id, created_at DESC, id DESC")
+        .execution_options(stream_results=True)
+    )
+    count = write_indexed_archive(
+        ((row["user_id"], json.dumps(dict(row), default=_json_default, ensure_ascii=False)) for row in result.mappings()),
+        final_path,
+    )
+
+    conn.execute(text(f"ALTER TABLE transactions DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.commit()
+
+    logger.info(f"🗄️ Partition {name} archivée: {count} transactions -> {final_path}")
+    metrics.incr("db.partitions.archived")
+    metrics.incr("db.partitions.archived_rows", count)
+    return count
+
+
+def archive_old_partitions(conn: Connection, hot_months: int, archive_dir: str, today: Optional[date] = None) -> dict:
+    """Archiver les partitions antérieures aux `hot_months` derniers mois"""
+    if not is_partitioned(conn):
+        return {}
+    cutoff = add_months(month_start(today or date.today()), -hot_months)
+    archived = {}
+    for name, month in list_transaction_partitions(conn):
+        if month < cutoff:
+            archived[name] = archive_transaction_partition(conn, name, archive_dir)
+    return archived
+
+
+def run_partition_maintenance() -> List[str]:
+    """Créer les partitions à venir (appelé périodiquement et par archive_transactions.py)"""
+    with engine.connect() as conn:
+        return ensure_transaction_partitions(conn, settings.transactions_partition_months_ahead)
+
+
+async def partition_maintenance_loop(interval: int = None):
+    """Boucle de fond : les partitions des prochains mois existent toujours avant d'être nécessaires"""
+    interval = interval if interval is not None else settings.partition_maintenance_interval
+    if interval <= 0:
+        return
+    while True:
+        try:
+            await asyncio.to_thread(run_partition_maintenance)
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la création des partitions: {e}")
+        await asyncio.sleep(interval)
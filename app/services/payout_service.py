@@ -0,0 +1,270 @@
+import time
+import uuid
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Row, case, func, insert, select, text, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import Session
+from app.core.metrics import metrics
+from app.models.ledger import LedgerEntry
+from app.models.transaction import Transaction, Wallet
+from app.services.ledger_service import (
+    CREDIT, DEBIT, INITIAL_BALANCE, OPENING_ACCOUNT, wallet_account,
+)
+from app.services.transaction_service import TransactionService, retry_delay, retryable_error_kind
+from app.services.user_service import UserService
+from app.services.wallet_cache import stage_wallet
+from config import settings
+
+COMPLETED = "completed"
+REJECTED = "rejected"
+
+# PostgreSQL : tous les crédits en une instruction, les lignes passées en 3 tableaux
+CREDIT_WALLETS_UNNEST_SQL = text("""
+    UPDATE wallets AS w
+    SET balance = w.balance + c.amount, version = w.version + c.entries, updated_at = now()
+    FROM unnest(CAST(:wallet_ids AS integer[]), CAST(:amounts AS numeric[]), CAST(:entries AS integer[]))
+        AS c(wallet_id, amount, entries)
+    WHERE w.id = c.wallet_id
+    RETURNING w.id, w.user_id, w.balance, w.currency, w.is_active, w.version, w.created_at, w.updated_at
+""")
+
+
+def new_reference() -> str:
+    return f"TXN_{uuid.uuid4().hex[:12].upper()}"
+
+
+class PayoutService:
+    """Paiements groupés : un débit de l'expéditeur, des crédits ensemblistes, des insertions en masse
+
+    Le coût ne dépend plus du nombre de lignes en allers-retours SQL : une requête pour résoudre
+    les destinataires, un UPDATE ensembliste pour les crédits et des INSERT multi-lignes pour
+    les transactions et le grand livre.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def batch_transfer(self, sender, lines: List[Tuple[str, Decimal, Optional[str]]],
+                       description: str = "Paiement groupé") -> Optional[dict]:
+        """Exécuter un paiement groupé en un seul commit (rejoué en cas d'interblocage)
+
+        L'attente entre tentatives est bloquante : depuis un endpoint async, appeler via asyncio.to_thread.
+
+        Args:
+            sender: Utilisateur débité
+            lines: (numéro nettoyé, montant, description) par ligne
+
+        Returns:
+            Le rapport ligne par ligne, ou None si le solde de l'expéditeur ne couvre pas le total
+        """
+        started = time.perf_counter()
+        results = [
+            {"line": index, "recipient_phone": phone, "amount": amount, "status": REJECTED, "reason": None, "reference": None}
+            for index, (phone, amount, _) in enumerate(lines)
+        ]
+
+        # Résolution de tous les destinataires en une requête
+        recipients = UserService(self.db).get_users_by_phones([phone for phone, _, _ in lines])
+        accepted = []
+        for result, (phone, amount, line_description) in zip(results, lines):
+            recipient = recipients.get(phone)
+            if amount <= 0:
+                result["reason"] = "Le montant doit être supérieur à 0"
+            elif recipient is None:
+                result["reason"] = "Le destinataire n'est pas un utilisateur Fintel"
+            elif not recipient.is_active:
+                result["reason"] = "Compte du destinataire inactif"
+            elif recipient.id == sender.id:
+                result["reason"] = "Vous ne pouvez pas vous transférer de l'argent à vous-même"
+            else:
+                accepted.append((result, recipient, line_description))
+
+        total = sum((result["amount"] for result, _, _ in accepted), Decimal("0"))
+        report = {"reference": None, "total_amount": total, "sender_balance": None, "lines": results}
+
+        if accepted:
+            for attempt in range(1, settings.transfer_max_attempts + 1):
+                try:
+                    sender_balance = self._apply(sender, accepted, total, description, report)
+                    if sender_balance is None:
+                        self.db.rollback()
+                        metrics.incr("payouts.insufficient_funds")
+                        return None
+                    report["sender_balance"] = sender_balance
+                    self.db.commit()
+                    break
+                except DBAPIError as e:
+                    self.db.rollback()
+                    kind = retryable_error_kind(e)
+                    if kind is None or attempt >= settings.transfer_max_attempts:
+                        raise
+                    metrics.incr(f"payouts.{kind}")
+                    metrics.incr("payouts.retries")
+                    time.sleep(retry_delay(attempt))
+
+        report["completed"] = sum(1 for result in results if result["status"] == COMPLETED)
+        report["rejected"] = len(results) - report["completed"]
+        metrics.incr("payouts.batches")
+        metrics.incr("payouts.lines", report["completed"])
+        metrics.incr("payouts.rejected_lines", report["rejected"])
+        metrics.observe("payouts.duration", time.perf_counter() - started)
+        return report
+
+    def _apply(self, sender, accepted, total: Decimal, description: str, report: dict) -> Optional[Decimal]:
+        """Une tentative : débit unique, crédits par lots, transactions et écritures en masse (sans commit)"""
+        transaction_service = TransactionService(self.db)
+
+        # 1. Portefeuilles de l'expéditeur et des destinataires (créés en masse s'ils n'existent pas),
+        # tous verrouillés dans l'ordre de leurs id avant toute écriture (voir _lock_wallets)
+        recipient_ids = {recipient.id for _, recipient, _ in accepted}
+        wallet_ids = self._ensure_wallets(recipient_ids | {sender.id})
+        self._lock_wallets(wallet_ids.values())
+
+        # 2. Débit unique de l'expéditeur (UPDATE conditionnel, voir balance_update_statement)
+        sender_wallet = transaction_service.apply_balance_delta(sender.id, -total)
+        if sender_wallet is None:
+            return None
+        sender_balance, sender_version, sender_wallet_id = sender_wallet.balance, sender_wallet.version, sender_wallet.id
+
+        # 3. Crédits ensemblistes (lignes déjà verrouillées)
+        credits: Dict[int, List[Decimal]] = {}
+        for result, recipient, _ in accepted:
+            credits.setdefault(wallet_ids[recipient.id], []).append(result["amount"])
+        credited = self._credit_wallets(credits)
+        # Soldes modifiés hors ORM : portefeuilles renvoyés par l'UPDATE publiés dans le cache au commit
+        # (une invalidation laisserait une lecture concurrente y remettre l'ancienne version)
+        for wallet in credited.values():
+            stage_wallet(self.db, wallet)
+
+        # 4. Transactions en masse : le débit de l'expéditeur puis une transaction reçue par ligne
+        # (mêmes clés pour toutes les lignes : l'INSERT multi-lignes prend les colonnes de la première)
+        batch_reference = new_reference()
+        sender_phone = sender.phone_number
+        transaction_rows = [{
+            "user_id": sender.id, "transaction_type": "transfer", "amount": total, "currency": "XOF",
+            "status": COMPLETED, "reference": batch_reference, "recipient_phone": None,
+            "description": f"{description} ({len(accepted)} bénéficiaire(s))",
+        }]
+        for result, recipient, line_description in accepted:
+            result["reference"] = new_reference()
+            transaction_rows.append({
+                "user_id": recipient.id, "transaction_type": "transfer", "amount": result["amount"], "currency": "XOF",
+                "status": COMPLETED, "reference": result["reference"], "recipient_phone": sender_phone,
+                "description": line_description or description,
+            })
+        self.db.execute(insert(Transaction.__table__), transaction_rows)
+
+        # 5. Grand livre : une opération équilibrée (débit du total, un crédit par ligne)
+        operation_id = str(uuid.uuid4())
+        entries = [{
+            "operation_id": operation_id, "account": wallet_account(sender_wallet_id), "wallet_id": sender_wallet_id,
+            "direction": DEBIT, "amount": total, "balance_after": sender_balance, "wallet_version": sender_version,
+            "transaction_reference": batch_reference,
+        }]
+        # Solde et version après chaque ligne : reconstitués depuis le résultat final de l'UPDATE
+        remaining = {wallet_id: list(amounts) for wallet_id, amounts in credits.items()}
+        for result, recipient, _ in accepted:
+            wallet_id = wallet_ids[recipient.id]
+            final_balance, final_version = credited[wallet_id].balance, credited[wallet_id].version
+            remaining[wallet_id].pop(0)
+            entries.append({
+                "operation_id": operation_id, "account": wallet_account(wallet_id), "wallet_id": wallet_id,
+                "direction": CREDIT, "amount": result["amount"],
+                "balance_after": final_balance - sum(remaining[wallet_id], Decimal("0")),
+                "wallet_version": final_version - len(remaining[wallet_id]),
+                "transaction_reference": result["reference"],
+            })
+        self.db.execute(insert(LedgerEntry.__table__), entries)
+
+        for result, _, _ in accepted:
+            result["status"] = COMPLETED
+        report["reference"] = batch_reference
+        return sender_balance
+
+    def _ensure_wallets(self, user_ids: set) -> Dict[int, int]:
+        """id de portefeuille par utilisateur ; les portefeuilles manquants sont créés en un INSERT"""
+        wallet_ids = dict(self.db.execute(
+            select(Wallet.user_id, Wallet.id).where(Wallet.user_id.in_(user_ids))
+        ).all())
+        missing = sorted(user_ids - set(wallet_ids))
+        if not missing:
+            return wallet_ids
+        try:
+            with self.db.begin_nested():
+                created = self.db.execute(
+                    insert(Wallet).returning(Wallet.user_id, Wallet.id),
+                    [{"user_id": user_id, "balance": INITIAL_BALANCE, "version": 1, "currency": "XOF", "is_active": True}
+                     for user_id in missing],
+                ).all()
+                opening = []
+                for user_id, wallet_id in created:
+                    operation_id = str(uuid.uuid4())
+                    opening.append({
+                        "operation_id": operation_id, "account": wallet_account(wallet_id), "wallet_id": wallet_id,
+                        "direction": CREDIT, "amount": INITIAL_BALANCE, "balance_after": INITIAL_BALANCE, "wallet_version": 1,
+                    })
+                    opening.append({
+                        "operation_id": operation_id, "account": OPENING_ACCOUNT, "direction": DEBIT, "amount": INITIAL_BALANCE,
+                    })
+                self.db.execute(insert(LedgerEntry), opening)
+            wallet_ids.update(dict(created))
+        except IntegrityError:
+            # Un portefeuille a été créé en parallèle : création unitaire (tolérante aux conflits)
+            transaction_service = TransactionService(self.db)
+            for user_id in missing:
+                wallet_ids[user_id] = transaction_service.ensure_wallet(user_id).id
+        return wallet_ids
+
+    def _lock_wallets(self, wallet_ids) -> None:
+        """Verrouiller les portefeuilles du paiement dans l'ordre de leurs id (SELECT ... FOR UPDATE)
+
+        Ni l'UPDATE du débit ni l'UPDATE ... FROM unnest des crédits ne verrouillent dans un ordre
+        garanti : les verrous sont donc tous pris ici, dans le même ordre que les transferts
+        (voir TransactionService.wallet_lock_order). Sans effet sur SQLite (écritures sérialisées).
+        """
+        self.db.execute(
+            select(Wallet.id).where(Wallet.id.in_(sorted(wallet_ids))).order_by(Wallet.id).with_for_update()
+        ).all()
+
+    def _credit_wallets(self, credits: Dict[int, List[Decimal]]) -> Dict[int, Row]:
+        """Créditer les portefeuilles de façon ensembliste
+
+        PostgreSQL : un seul UPDATE ... FROM unnest(...). Autres bases : un UPDATE par lot de
+        `batch_transfer_chunk_size` portefeuilles (balance = balance + CASE id ... END).
+
+        Returns:
+            Le portefeuille à jour (ligne RETURNING : solde, version, colonnes du cache) par id
+        """
+        wallet_ids = sorted(credits)
+        amounts = {wallet_id: sum(credits[wallet_id], Decimal("0")) for wallet_id in wallet_ids}
+        counts = {wallet_id: len(credits[wallet_id]) for wallet_id in wallet_ids}
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            rows = self.db.execute(CREDIT_WALLETS_UNNEST_SQL, {
+                "wallet_ids": wallet_ids,
+                "amounts": [amounts[wallet_id] for wallet_id in wallet_ids],
+                "entries": [counts[wallet_id] for wallet_id in wallet_ids],
+            }).all()
+            return {row.id: row for row in rows}
+
+        credited = {}
+        chunk_size = settings.batch_transfer_chunk_size
+        for start in range(0, len(wallet_ids), chunk_size):
+            chunk = wallet_ids[start:start + chunk_size]
+            rows = self.db.execute(
+                update(Wallet)
+                .where(Wallet.id.in_(chunk))
+                .values(
+                    balance=Wallet.balance + case({wallet_id: amounts[wallet_id] for wallet_id in chunk}, value=Wallet.id),
+                    version=Wallet.version + case({wallet_id: counts[wallet_id] for wallet_id in chunk}, value=Wallet.id),
+                    updated_at=func.now(),
+                )
+                .returning(
+                    Wallet.id, Wallet.user_id, Wallet.balance, Wallet.currency, Wallet.is_active,
+                    Wallet.version, Wallet.created_at, Wallet.updated_at,
+                )
+                .execution_options(synchronize_session=False)
+            ).all()
+            credited.update({row.id: row for row in rows})
+        return credited
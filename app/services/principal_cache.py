@@ -0,0 +1,70 @@
+import logging
+from typing import Optional
+from app.core.cache import create_cache
+from app.core.metrics import metrics
+from app.core.phone import normalize_phone
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Principal:
+    """Utilisateur authentifié : id, numéro et statut, sans la ligne users complète (photos base64, KYC)"""
+
+    __slots__ = ("id", "phone_number", "is_active")
+
+    def __init__(self, id: int, phone_number: str, is_active: bool):
+        self.id = id
+        self.phone_number = phone_number
+        self.is_active = is_active
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "phone_number": self.phone_number, "is_active": self.is_active}
+
+
+class PrincipalCache:
+    """Principaux résolus par numéro de téléphone (forme E.164), avec une durée de vie courte
+
+    Invalidé explicitement par UserService à chaque modification du profil ou du statut ;
+    la durée de vie borne le retard des modifications faites hors de l'API (scripts SQL).
+    Les erreurs du cache ne font jamais échouer l'authentification : lecture en base.
+    """
+
+    def __init__(self):
+        self.backend = create_cache("principals", settings.principal_cache_ttl_seconds, settings.principal_cache_max_entries)
+
+    def get(self, phone_e164: str) -> Optional[Principal]:
+        if not settings.principal_cache_enabled:
+            return None
+        try:
+            cached = self.backend.get(phone_e164)
+        except Exception as e:
+            metrics.incr("cache.principals.errors")
+            logger.warning(f"⚠️ Cache des principaux indisponible: {e}")
+            return None
+        metrics.incr("cache.principals.hits" if cached is not None else "cache.principals.misses")
+        return Principal(**cached) if cached is not None else None
+
+    def put(self, principal: Principal) -> None:
+        if not settings.principal_cache_enabled:
+            return
+        try:
+            self.backend.set(normalize_phone(principal.phone_number), principal.as_dict())
+        except Exception as e:
+            metrics.incr("cache.principals.errors")
+            logger.warning(f"⚠️ Cache des principaux non mis à jour: {e}")
+
+    def invalidate(self, *subjects: Optional[str]) -> None:
+        subjects = [normalize_phone(subject) for subject in subjects]
+        subjects = [subject for subject in subjects if subject]
+        if not subjects:
+            return
+        try:
+            self.backend.delete(*subjects)
+            metrics.incr("cache.principals.invalidations", len(subjects))
+        except Exception as e:
+            metrics.incr("cache.principals.errors")
+            logger.warning(f"⚠️ Principal non invalidé: {e}")
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,114 @@
+import gzip
+import json
+import mmap
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Optional, Tuple
+from app.core.metrics import metrics
+from app.models.transaction import Transaction
+from app.services.partition_service import (
+    ARCHIVE_SUFFIX, INDEX_RECORD, archive_index_path, partition_month, read_archive_lines,
+)
+from config import settings
+
+
+def parse_archived_row(line: str) -> dict:
+    row = json.loads(line)
+    row["created_at"] = datetime.fromisoformat(row["created_at"])
+    if row.get("updated_at"):
+        row["updated_at"] = datetime.fromisoformat(row["updated_at"])
+    row["amount"] = Decimal(row["amount"])
+    return row
+
+
+def find_member(index_path: str, user_id: int) -> Optional[Tuple[int, int]]:
+    """(position, taille) du membre gzip d'un utilisateur : recherche dichotomique dans l'index trié
+
+    L'index est projeté en mémoire (mmap) et jamais chargé : seules les pages parcourues sont lues.
+    """
+    if os.path.getsize(index_path) == 0:
+        return None
+    with open(index_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+        low, high = 0, len(index) // INDEX_RECORD.size
+        while low < high:
+            middle = (low + high) // 2
+            found, offset, size = INDEX_RECORD.unpack_from(index, middle * INDEX_RECORD.size)
+            if found < user_id:
+                low = middle + 1
+            elif found > user_id:
+                high = middle
+            else:
+                return offset, size
+    return None
+
+
+class TransactionArchive:
+    """Lecture des partitions de transactions archivées (fichiers transactions_pAAAAMM.jsonl.gz)
+
+    Les mois archivés sont plus anciens que toutes les partitions encore en base :
+    l'historique les lit une fois les transactions en base épuisées. Grâce à l'index de chaque mois,
+    seul le membre gzip de l'utilisateur est lu et décompressé (rien si l'utilisateur n'y figure pas).
+    Lectures bloquantes : à appeler hors de la boucle d'événements.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def archived_months(self) -> List[Tuple[date, str]]:
+        """Mois archivés, du plus récent au plus ancien"""
+        if not os.path.isdir(self.directory):
+            return []
+        months = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(ARCHIVE_SUFFIX):
+                continue
+            month = partition_month(filename[:-len(ARCHIVE_SUFFIX)])
+            if month:
+                months.append((month, os.path.join(self.directory, filename)))
+        return sorted(months, reverse=True)
+
+    def user_rows(self, path: str, user_id: int) -> List[dict]:
+        """Lignes d'un utilisateur dans un mois archivé (created_at DESC, id DESC)"""
+        index_path = archive_index_path(path)
+        if os.path.exists(index_path):
+            member = find_member(index_path, user_id)
+            if member is None:
+                return []
+            offset, size = member
+            with open(path, "rb") as archive:
+                archive.seek(offset)
+                data = gzip.decompress(archive.read(size)).decode("utf-8")
+            metrics.incr("transactions.archive.reads")
+            return [parse_archived_row(line) for line in data.splitlines() if line]
+
+        # Ancien format sans index (voir archive_transactions.py --reindex) : lecture en flux,
+        # arrêtée après les lignes de l'utilisateur (fichier trié par user_id)
+        metrics.incr("transactions.archive.unindexed_reads")
+        rows = []
+        for line_user_id, line in read_archive_lines(path):
+            if line_user_id > user_id:
+                break
+            if line_user_id == user_id:
+                rows.append(parse_archived_row(line))
+        return rows
+
+    def get_user_transactions(self, user_id: int, limit: int, before: Optional[Tuple[datetime, int]] = None) -> List[Transaction]:
+        """Transactions archivées d'un utilisateur, antérieures à `before` = (created_at, id)
+
+        Les mois postérieurs à `before` ne sont pas ouverts.
+        """
+        found: List[Transaction] = []
+        for month, path in self.archived_months():
+            if before and month > before[0].date():
+                continue
+            for row in self.user_rows(path, user_id):
+                if before and (row["created_at"], row["id"]) >= before:
+                    continue
+                found.append(Transaction(**row))
+                if len(found) >= limit:
+                    return found
+        return found
+
+
+transaction_archive = TransactionArchive(settings.transactions_archive_dir)
@@ -1,11 +1,124 @@
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, literal, select, tuple_
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from app.models.transaction import Transaction, Wallet
 from app.schemas.transaction import TransactionCreate, TransactionUpdate
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.metrics import metrics
+from app.core.replicas import session_position
+from app.services.transaction_archive import transaction_archive
+from app.services.wallet_cache import stage_wallet, wallet_cache
+from app.services.ledger_service import (
+    LedgerService, Posting, balance_update_statement, CREDIT, DEBIT, EXTERNAL_ACCOUNT,
+)
+from config import settings
 from decimal import Decimal
-from typing import Optional, List
+from collections import namedtuple
+from typing import Dict, Optional, List, Tuple
+import asyncio
+import random
+import time
 import uuid
 
+# SQLSTATE PostgreSQL des erreurs transitoires : la transaction peut être rejouée telle quelle
+RETRYABLE_SQLSTATES = {"40001": "serialization_failure", "40P01": "deadlock"}
+
+
+def retryable_error_kind(error: DBAPIError) -> Optional[str]:
+    """Type d'erreur transitoire (interblocage, sérialisation, base SQLite verrouillée) ou None"""
+    orig = getattr(error, "orig", None)
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    if code in RETRYABLE_SQLSTATES:
+        return RETRYABLE_SQLSTATES[code]
+    if "database is locked" in str(orig):
+        return "locked"
+    return None
+
+
+def retry_delay(attempt: int) -> float:
+    """Attente avant la tentative suivante (secondes) : backoff exponentiel borné, gigue complète"""
+    ceiling = min(settings.transfer_retry_max_ms, settings.transfer_retry_base_ms * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling) / 1000
+
+
+class TransferResult:
+    """Transfert validé : soldes renvoyés par les UPDATE ... RETURNING et transactions créées"""
+
+    def __init__(self, sender_balance: Decimal, recipient_balance: Decimal, transactions: List[Transaction], attempts: int):
+        self.sender_balance = sender_balance
+        self.recipient_balance = recipient_balance
+        self.transactions = transactions
+        self.references = [transaction.reference for transaction in transactions]
+        self.attempts = attempts
+
+
+# Historique : toutes les colonnes de transactions, lues sans entité ORM
+HISTORY_COLUMNS = tuple(Transaction.__table__.columns)
+# Ligne d'historique hors base (archives), mêmes champs et même ordre qu'une ligne HISTORY_COLUMNS
+HistoryRow = namedtuple("HistoryRow", [column.name for column in HISTORY_COLUMNS])
+
+
+def history_rows(transactions) -> List[HistoryRow]:
+    return [HistoryRow(*(getattr(t, name) for name in HistoryRow._fields)) for t in transactions]
+
+
+# SQLite : created_at est du texte, 'AAAA-MM-JJ HH:MM:SS' (CURRENT_TIMESTAMP) ou avec microsecondes
+SQLITE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%f"
+
+
+def history_timestamp(value, dialect: str):
+    """created_at tel que trié et comparé au curseur par la requête d'historique
+
+    Sur SQLite, la colonne et le curseur (lié avec microsecondes) sont deux textes de formats différents :
+    comparés tels quels, les lignes de la même seconde repasseraient le curseur. Les deux côtés sont
+    donc normalisés par strftime. PostgreSQL compare des timestamps : colonne inchangée (index utilisé).
+    """
+    if dialect == "sqlite":
+        return func.strftime(SQLITE_TIMESTAMP_FORMAT, value)
+    return value
+
+
+def user_transactions_page_query(user_id: int, limit: int, cursor: Optional[str], dialect: str):
+    """Requête d'une page d'historique : suit l'index ix_transactions_user_created_id
+
+    Une ligne de plus que `limit` est lue pour savoir s'il existe une page suivante.
+    Les colonnes sont lues en lignes simples (pas d'entités ORM) : sérialisées telles quelles en JSON.
+    """
+    created_at = history_timestamp(Transaction.created_at, dialect)
+    query = select(*HISTORY_COLUMNS).where(Transaction.user_id == user_id)
+    if cursor:
+        cursor_created_at, last_id = decode_cursor(cursor)
+        bound = history_timestamp(literal(cursor_created_at, Transaction.created_at.type), dialect)
+        query = query.where(tuple_(created_at, Transaction.id) < tuple_(bound, last_id))
+    return query.order_by(created_at.desc(), Transaction.id.desc()).limit(limit + 1)
+
+
+def archived_rows_needed(rows, limit: int, cursor: Optional[str]):
+    """Si la base ne suffit pas à remplir la page, position à partir de laquelle lire les archives
+
+    Returns:
+        (nombre de lignes à lire, borne (created_at, id) exclue) ou None si la page est pleine
+    """
+    rows = list(rows)
+    if len(rows) > limit:
+        return None
+    if rows:
+        before = (rows[-1].created_at, rows[-1].id)
+    else:
+        before = decode_cursor(cursor) if cursor else None
+    return limit + 1 - len(rows), before
+
+
+def page_with_next_cursor(rows, limit: int) -> Tuple[List[Row], Optional[str]]:
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
 class TransactionService:
     def __init__(self, db: Session):
         self.db = db
@@ -46,11 +159,30 @@ class TransactionService:
         """Récupérer une transaction par ID"""
         return self.db.query(Transaction).filter(Transaction.id == transaction_id).first()
 
-    def get_user_transactions(self, user_id: int, limit: int = 50, offset: int = 0) -> List[Transaction]:
-        """Récupérer les transactions d'un utilisateur"""
-        return self.db.query(Transaction).filter(
-            Transaction.user_id == user_id
-        ).order_by(Transaction.created_at.desc()).offset(offset).limit(limit).all()
+    def get_user_transactions(self, user_id: int, limit: int = 50, offset: int = 0) -> List[Row]:
+        """Récupérer les transactions d'un utilisateur (pagination par offset, conservée pour compatibilité)"""
+        return self.db.execute(
+            select(*HISTORY_COLUMNS)
+            .where(Transaction.user_id == user_id)
+            .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+            .offset(offset)
+            .limit(limit)
+        ).all()
+
+    def get_user_transactions_page(self, user_id: int, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Row], Optional[str]]:
+        """Récupérer une page de l'historique par curseur (coût constant quelle que soit la profondeur)
+
+        Returns:
+            (transactions, curseur de la page suivante ou None s'il n'y en a plus)
+        """
+        dialect = self.db.get_bind().dialect.name
+        rows = self.db.execute(user_transactions_page_query(user_id, limit, cursor, dialect)).all()
+        # Au-delà des partitions en base, l'historique continue dans les mois archivés
+        # (lecture sur disque bloquante : appelée depuis un thread par l'endpoint)
+        needed = archived_rows_needed(rows, limit, cursor)
+        if needed:
+            rows = list(rows) + history_rows(transaction_archive.get_user_transactions(user_id, *needed))
+        return page_with_next_cursor(rows, limit)
 
     def update_transaction_status(self, transaction_id: int, status: str, reference: str = None, auto_commit: bool = True) -> Optional[Transaction]:
         """Mettre à jour le statut d'une transaction
@@ -76,98 +208,234 @@ class TransactionService:
         
         return db_transaction
 
+    def get_wallet(self, user_id: int) -> Optional[Wallet]:
+        """Récupérer le portefeuille sans le créer (utilisable sur un réplica en lecture)"""
+        return self.db.query(Wallet).filter(Wallet.user_id == user_id).first()
+
     def get_or_create_wallet(self, user_id: int) -> Wallet:
         """Récupérer ou créer un portefeuille pour un utilisateur"""
         # Utiliser une requête simple sans expire_all pour éviter d'annuler les changements en cours
         wallet = self.db.query(Wallet).filter(Wallet.user_id == user_id).first()
         if not wallet:
-            # Créer un wallet avec un solde initial de 5000 XOF pour les tests
-            wallet = Wallet(user_id=user_id, balance=Decimal('5000.00'))
-            self.db.add(wallet)
+            # Créer un wallet avec un solde initial de 5000 XOF pour les tests (écriture d'ouverture du grand livre)
+            wallet = self.ensure_wallet(user_id)
             self.db.commit()
             self.db.refresh(wallet)
-            print(f"📦 Nouveau wallet créé pour user_id={user_id} avec solde initial de 5000 XOF")
         else:
             # Wallet existant trouvé, ne pas faire de refresh car cela peut annuler les changements en cours
             print(f"📦 Wallet existant trouvé pour user_id={user_id}, solde actuel: {wallet.balance} XOF, wallet.id={wallet.id}")
         return wallet
 
-    def update_wallet_balance(self, user_id: int, amount: Decimal, operation: str = "add", auto_commit: bool = False) -> Optional[Wallet]:
-        """Mettre à jour le solde du portefeuille
+    def apply_balance_delta(self, user_id: int, delta: Decimal) -> Optional[Wallet]:
+        """Appliquer une variation de solde en une seule instruction (UPDATE ... RETURNING)
+
+        Le verrou de ligne est pris par l'UPDATE lui-même : ni SELECT ... FOR UPDATE préalable,
+        ni calcul en Python, ni flush supplémentaire. Le portefeuille est créé s'il n'existe pas.
+
+        Returns:
+            Le portefeuille à jour, ou None si le solde est insuffisant
+        """
+        wallet = self.db.execute(balance_update_statement(user_id, delta)).scalar_one_or_none()
+        if wallet is None and self.get_wallet(user_id) is None:
+            self.ensure_wallet(user_id)
+            wallet = self.db.execute(balance_update_statement(user_id, delta)).scalar_one_or_none()
+        if wallet is not None:
+            # Publié dans le cache des soldes au commit de cette session
+            stage_wallet(self.db, wallet)
+        return wallet
+
+    def ensure_wallet(self, user_id: int) -> Wallet:
+        """Créer le portefeuille (sans commit), y compris si une requête concurrente le crée au même moment
+
+        La création se fait dans un SAVEPOINT : en cas de conflit sur wallets.user_id,
+        seul le SAVEPOINT est annulé et le portefeuille créé par l'autre requête est utilisé.
+        """
+        # Les objets en attente sont écrits hors du SAVEPOINT pour ne pas être annulés avec lui
+        self.db.flush()
+        try:
+            with self.db.begin_nested():
+                wallet = LedgerService(self.db).open_wallet(user_id)
+            print(f"📦 Nouveau wallet créé pour user_id={user_id} avec solde initial de 5000 XOF")
+            return wallet
+        except IntegrityError:
+            return self.get_wallet(user_id)
+
+    def update_wallet_balance(self, user_id: int, amount: Decimal, operation: str = "add", auto_commit: bool = False,
+                              counter_account: str = EXTERNAL_ACCOUNT, transaction_reference: Optional[str] = None) -> Optional[Wallet]:
+        """Mettre à jour le solde du portefeuille via une opération du grand livre
         
         Args:
             user_id: ID de l'utilisateur
             amount: Montant à ajouter ou soustraire
             operation: "add" pour ajouter, "subtract" pour soustraire
             auto_commit: Si True, commit automatiquement. Si False, laisse le commit à l'appelant (pour transactions atomiques)
+            counter_account: Compte de contrepartie de l'écriture (ex. external:orange pour un dépôt)
+            transaction_reference: Référence de la transaction à l'origine de l'opération
         """
-        # Utiliser with_for_update pour verrouiller le wallet pendant la transaction
-        # Cela garantit qu'aucune autre transaction ne peut le modifier en même temps
-        from sqlalchemy import select
-        wallet_query = select(Wallet).filter(Wallet.user_id == user_id).with_for_update()
-        wallet = self.db.execute(wallet_query).scalar_one_or_none()
-        
-        # Si le wallet n'existe pas, le créer
-        if not wallet:
-            wallet = Wallet(user_id=user_id, balance=Decimal('5000.00'))
-            self.db.add(wallet)
-            # Flush pour obtenir l'ID du wallet créé
-            self.db.flush()
-            print(f"📦 Nouveau wallet créé pour user_id={user_id} avec solde initial de 5000 XOF")
-        
-        # Vérifier que le wallet appartient bien au bon utilisateur
-        if wallet.user_id != user_id:
-            print(f"❌ ERREUR CRITIQUE: Le wallet.id={wallet.id} appartient à user_id={wallet.user_id} mais on essaie de modifier pour user_id={user_id}")
-            raise ValueError(f"Wallet mismatch: wallet.user_id={wallet.user_id} != user_id={user_id}")
-        
-        old_balance = wallet.balance
-        print(f"📦 Wallet trouvé: wallet.id={wallet.id}, user_id={wallet.user_id}, solde actuel: {wallet.balance} XOF")
-        print(f"🔍 update_wallet_balance: user_id={user_id}, wallet.id={wallet.id}, wallet.user_id={wallet.user_id}, operation={operation}, amount={amount}, old_balance={old_balance}")
-        
         # Valider que l'opération est correcte
         if operation not in ["add", "subtract"]:
             raise ValueError(f"Opération invalide: {operation}. Utilisez 'add' ou 'subtract'")
         
-        # Effectuer l'opération
-        if operation == "add":
-            new_balance = old_balance + amount
-            wallet.balance = new_balance
-            # Forcer la mise à jour de updated_at manuellement
-            from datetime import datetime, timezone
-            wallet.updated_at = datetime.now(timezone.utc)
-            print(f"✅ Ajout: User {user_id} (wallet.id={wallet.id}) - Ancien solde: {old_balance} XOF + {amount} XOF = Nouveau solde: {new_balance} XOF")
-        elif operation == "subtract":
-            # Le solde peut descendre à 0, mais pas en dessous
-            if wallet.balance >= amount:
-                new_balance = old_balance - amount
-                wallet.balance = new_balance
-                # Forcer la mise à jour de updated_at manuellement
-                from datetime import datetime, timezone
-                wallet.updated_at = datetime.now(timezone.utc)
-                print(f"✅ Débit: User {user_id} (wallet.id={wallet.id}) - Ancien solde: {old_balance} XOF - {amount} XOF = Nouveau solde: {new_balance} XOF")
-            else:
-                print(f"❌ Solde insuffisant: User {user_id} - Solde actuel: {wallet.balance} XOF < Montant demandé: {amount} XOF")
-                return None  # Solde insuffisant
+        # Le solde peut descendre à 0, mais pas en dessous (condition portée par l'UPDATE)
+        wallet = self.apply_balance_delta(user_id, amount if operation == "add" else -amount)
+        if wallet is None:
+            print(f"❌ Solde insuffisant: User {user_id} - Montant demandé: {amount} XOF")
+            return None
         
-        # Le wallet est déjà dans la session (récupéré via query ou créé)
-        # Les modifications de balance et updated_at seront automatiquement détectées par SQLAlchemy
+        # Écriture en partie double : le portefeuille et la contrepartie
+        if operation == "add":
+            postings = [Posting.for_wallet(wallet, CREDIT, amount), Posting(counter_account, DEBIT, amount)]
+        else:
+            postings = [Posting.for_wallet(wallet, DEBIT, amount), Posting(counter_account, CREDIT, amount)]
+        LedgerService(self.db).post(postings, transaction_reference)
+        print(f"✅ User {user_id} (wallet.id={wallet.id}) - {operation} {amount} XOF, nouveau solde: {wallet.balance} XOF (version {wallet.version})")
         
         # Commit seulement si auto_commit est True
         if auto_commit:
             self.db.commit()
             self.db.refresh(wallet)
         
-        print(f"💾 Solde mis à jour en mémoire: wallet.id={wallet.id}, user_id={wallet.user_id}, balance={wallet.balance} XOF, updated_at={wallet.updated_at} (commit: {'oui' if auto_commit else 'non'})")
         return wallet
 
+    def transfer_funds(self, sender_id: int, recipient_id: int, amount: Decimal,
+                       transaction_reference: Optional[str] = None) -> Optional[Tuple[Wallet, Wallet]]:
+        """Débiter l'expéditeur et créditer le destinataire en une seule opération du grand livre (sans commit)
+
+        Les deux UPDATE sont exécutés dans l'ordre des id de portefeuille : deux transferts croisés
+        (A -> B et B -> A) verrouillent les lignes dans le même ordre et ne peuvent pas s'interbloquer.
+        Si le solde est insuffisant, None est renvoyé et l'appelant doit annuler la transaction
+        (le crédit a pu être appliqué avant le débit).
+
+        Returns:
+            (portefeuille expéditeur, portefeuille destinataire) ou None si le solde est insuffisant
+
+        Raises:
+            ValueError: si l'expéditeur est aussi le destinataire
+        """
+        if sender_id == recipient_id:
+            raise ValueError("Transfert vers son propre portefeuille")
+        # Variation nette par portefeuille (sommée : une clé par portefeuille)
+        deltas: Dict[int, Decimal] = {}
+        for user_id, delta in ((sender_id, -amount), (recipient_id, amount)):
+            deltas[user_id] = deltas.get(user_id, Decimal("0")) + delta
+        wallets = {}
+        for user_id in self.wallet_lock_order(list(deltas)):
+            wallets[user_id] = self.apply_balance_delta(user_id, deltas[user_id])
+            if wallets[user_id] is None:
+                print(f"❌ Solde insuffisant: User {sender_id} - Montant demandé: {amount} XOF")
+                return None
+        LedgerService(self.db).post([
+            Posting.for_wallet(wallets[sender_id], DEBIT, amount),
+            Posting.for_wallet(wallets[recipient_id], CREDIT, amount),
+        ], transaction_reference)
+        return wallets[sender_id], wallets[recipient_id]
+
+    def wallet_lock_order(self, user_ids: List[int]) -> List[int]:
+        """Utilisateurs triés par id de portefeuille (portefeuilles manquants créés au préalable)"""
+        wallet_ids = dict(self.db.execute(
+            select(Wallet.user_id, Wallet.id).where(Wallet.user_id.in_(user_ids))
+        ).all())
+        for user_id in sorted(user_ids):
+            if user_id not in wallet_ids:
+                wallet_ids[user_id] = self.ensure_wallet(user_id).id
+        return sorted(user_ids, key=lambda user_id: wallet_ids[user_id])
+
+    def transfer(self, sender_id: int, recipient_id: int, amount: Decimal,
+                 transactions: List[Tuple[int, TransactionCreate]]) -> Optional[TransferResult]:
+        """Moteur de transfert : transactions, soldes et grand livre validés en un seul commit
+
+        Sur interblocage ou échec de sérialisation, la transaction est annulée puis rejouée
+        (au plus TRANSFER_MAX_ATTEMPTS tentatives, attente exponentielle avec gigue).
+        L'attente est bloquante : depuis un endpoint async, appeler via asyncio.to_thread.
+
+        Args:
+            transactions: (user_id, données) des transactions à créer ; la première donne la référence du grand livre
+
+        Returns:
+            Le résultat du transfert, ou None si le solde de l'expéditeur est insuffisant
+        """
+        for attempt in range(1, settings.transfer_max_attempts + 1):
+            try:
+                created = [self.create_transaction(user_id, data, auto_commit=False) for user_id, data in transactions]
+                wallets = self.transfer_funds(
+                    sender_id, recipient_id, amount,
+                    transaction_reference=created[0].reference if created else None
+                )
+                if wallets is None:
+                    self.db.rollback()
+                    metrics.incr("transfers.insufficient_funds")
+                    return None
+                for transaction in created:
+                    transaction.status = "completed"
+                # Soldes lus avant le commit (les instances sont expirées ensuite)
+                result = TransferResult(wallets[0].balance, wallets[1].balance, created, attempt)
+                self.db.commit()
+            except DBAPIError as e:
+                self.db.rollback()
+                kind = retryable_error_kind(e)
+                if kind is None:
+                    raise
+                metrics.incr(f"transfers.{kind}")
+                if attempt >= settings.transfer_max_attempts:
+                    metrics.incr("transfers.retries_exhausted")
+                    raise
+                metrics.incr("transfers.retries")
+                time.sleep(retry_delay(attempt))
+                continue
+            metrics.incr("transfers.completed")
+            metrics.observe("transfers.attempts", attempt)
+            return result
+
     def get_wallet_balance(self, user_id: int) -> Decimal:
-        """Récupérer le solde du portefeuille"""
-        # Expirer le cache pour s'assurer d'avoir la valeur la plus récente
-        self.db.expire_all()
-        wallet = self.get_or_create_wallet(user_id)
-        # Rafraîchir depuis la base de données
-        self.db.refresh(wallet)
+        """Récupérer le solde du portefeuille : cache des soldes, sinon une seule lecture en base"""
+        cached = wallet_cache.get(user_id)
+        if cached is not None:
+            return Decimal(cached["balance"])
+        position = session_position(self.db)
+        # populate_existing : l'instance éventuellement présente dans la session est rafraîchie par la même requête
+        wallet = self.db.execute(
+            select(Wallet).where(Wallet.user_id == user_id).execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+        if wallet is None:
+            wallet = self.get_or_create_wallet(user_id)
+        wallet_cache.put(wallet, position)
         return wallet.balance
 
 
 
+
+
+class AsyncTransactionService:
+    """Lectures de TransactionService sur une AsyncSession (endpoints de lecture en mode asynchrone)
+
+    Les écritures (soldes, transferts, grand livre) passent toutes par TransactionService.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_user_transactions(self, user_id: int, limit: int = 50, offset: int = 0) -> List[Row]:
+        """Récupérer les transactions d'un utilisateur"""
+        result = await self.db.execute(
+            select(*HISTORY_COLUMNS)
+            .where(Transaction.user_id == user_id)
+            .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        return list(result.all())
+
+    async def get_user_transactions_page(self, user_id: int, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Row], Optional[str]]:
+        """Récupérer une page de l'historique par curseur (voir TransactionService.get_user_transactions_page)"""
+        dialect = self.db.get_bind().dialect.name
+        result = await self.db.execute(user_transactions_page_query(user_id, limit, cursor, dialect))
+        rows = result.all()
+        needed = archived_rows_needed(rows, limit, cursor)
+        if needed:
+            rows = list(rows) + history_rows(await asyncio.to_thread(transaction_archive.get_user_transactions, user_id, *needed))
+        return page_with_next_cursor(rows, limit)
+
+    async def get_wallet(self, user_id: int) -> Optional[Wallet]:
+        """Récupérer le portefeuille sans le créer (utilisable sur un réplica en lecture)"""
+        result = await self.db.execute(select(Wallet).where(Wallet.user_id == user_id).limit(1))
+        return result.scalars().first()
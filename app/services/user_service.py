@@ -1,38 +1,141 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from app.models.user import User, OTP
+from sqlalchemy.orm import Session, joinedload, load_only
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.engine import Row
+from app.models.user import User, OTP, detail_model
 from app.schemas.user import UserCreate, UserUpdate
+from app.core.phone import normalize_phone
 from app.core.security import get_password_hash, verify_password, generate_otp
-from datetime import datetime, timedelta
+from app.services.otp_store import IssuedOTP, otp_service
+from app.services.principal_cache import Principal, principal_cache
+from datetime import datetime
 from config import settings
-from typing import Optional
+from typing import Dict, List, Optional
+
+# Journal d'audit (OTP_AUDIT_ENABLED) : code marqué utilisé après une vérification réussie
+AUDIT_OTP_USED = update(OTP).where(OTP.is_used == False).values(is_used=True)
+
+# Profils de chargement (get_user_by_phone) : colonnes de users lues, les autres sont différées
+# et ne sont lues qu'à l'accès, par une requête de plus ; seul le profil complet joint
+# user_profiles et user_kyc
+LOAD_AUTH = "auth"  # connexion, OTP : mot de passe et statut
+LOAD_LOOKUP = "lookup"  # portefeuille, historique, transferts : identité et prénom
+LOAD_FULL = "full"  # profil complet (GET/PUT /user/profile)
+LOAD_VERSION = "version"  # ETag du profil : le profil complet n'est chargé que s'il a changé
+LOAD_PROFILES = {
+    LOAD_AUTH: (User.phone_number, User.hashed_password, User.is_active, User.is_verified),
+    LOAD_LOOKUP: (User.phone_number, User.first_name, User.is_active),
+    LOAD_VERSION: (User.created_at, User.updated_at),
+    LOAD_FULL: None,
+}
+
+
+def load_options(load: str) -> tuple:
+    columns = LOAD_PROFILES[load]
+    if columns is None:
+        return (joinedload(User.profile), joinedload(User.kyc))
+    return (load_only(*columns),)
+
+
+def phone_filter(phone_number: Optional[str]):
+    """Condition de recherche d'un compte par numéro (None si le numéro est vide)
+
+    Toute écriture du numéro via phone_e164 ; un numéro sans forme E.164 n'est trouvé que tel
+    qu'enregistré (comptes existants laissés sans phone_e164 par la migration 0006).
+    """
+    phone_e164 = normalize_phone(phone_number)
+    if phone_e164 is not None:
+        return User.phone_e164 == phone_e164
+    if not phone_number or not phone_number.strip():
+        return None
+    return and_(User.phone_e164.is_(None), User.phone_number == phone_number.strip())
+
+
+def profile_attributes(load: str) -> List[str]:
+    """Attributs d'un profil, à recharger après un commit (qui expire aussi les colonnes différées)"""
+    return ["id"] + [column.key for column in LOAD_PROFILES[load]]
+
 
 class UserService:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_user_by_phone(self, phone_number: str) -> Optional[User]:
-        """Récupérer un utilisateur par numéro de téléphone"""
-        if not phone_number or not phone_number.strip():
+    def get_user_by_phone(self, phone_number: str, load: str = LOAD_FULL) -> Optional[User]:
+        """Récupérer un utilisateur par numéro de téléphone (toute écriture du numéro, via phone_filter)
+
+        `load` : profil de chargement (LOAD_AUTH, LOAD_LOOKUP, LOAD_FULL), voir LOAD_PROFILES
+        """
+        condition = phone_filter(phone_number)
+        if condition is None:
             return None
-        return self.db.query(User).filter(User.phone_number == phone_number.strip()).first()
+        return self.db.query(User).options(*load_options(load)).filter(condition).first()
 
     def get_user_by_id(self, user_id: int) -> Optional[User]:
-        """Récupérer un utilisateur par ID"""
-        return self.db.query(User).filter(User.id == user_id).first()
+        """Récupérer un utilisateur par ID (profil complet)"""
+        return self.db.query(User).options(*load_options(LOAD_FULL)).filter(User.id == user_id).first()
 
-    def create_user(self, user_data: UserCreate) -> User:
-        """Créer un nouvel utilisateur"""
+    def get_principal(self, phone_number: str) -> Optional[Principal]:
+        """Résoudre le sujet d'un token : cache des principaux, sinon id, phone_number et is_active seulement"""
+        condition = phone_filter(phone_number)
+        if condition is None:
+            return None
+        # Cache indexé par phone_e164 : les numéros sans forme E.164 sont toujours lus en base
+        phone_e164 = normalize_phone(phone_number)
+        if phone_e164 is not None:
+            principal = principal_cache.get(phone_e164)
+            if principal is not None:
+                return principal
+        row = self.db.execute(select(User.id, User.phone_number, User.is_active).where(condition)).first()
+        if row is None:
+            return None
+        principal = Principal(row.id, row.phone_number, row.is_active)
+        if phone_e164 is not None:
+            principal_cache.put(principal)
+        return principal
+
+    def get_users_by_phones(self, phone_numbers: List[str]) -> Dict[str, Row]:
+        """Résoudre plusieurs numéros en une seule requête (id, phone_number, first_name, is_active uniquement)
+
+        Returns:
+            Numéro tel que fourni -> utilisateur, pour les numéros trouvés
+        """
+        normalized = {phone: normalize_phone(phone) for phone in phone_numbers}
+        wanted = {phone_e164 for phone_e164 in normalized.values() if phone_e164}
+        # Numéros sans forme E.164 : cherchés tels qu'enregistrés (voir phone_filter)
+        exact = {phone.strip() for phone, phone_e164 in normalized.items() if phone_e164 is None and phone and phone.strip()}
+        if not wanted and not exact:
+            return {}
+        rows = self.db.execute(
+            select(User.id, User.phone_number, User.phone_e164, User.first_name, User.is_active)
+            .where(or_(User.phone_e164.in_(wanted), and_(User.phone_e164.is_(None), User.phone_number.in_(exact))))
+        ).all()
+        by_e164 = {row.phone_e164: row for row in rows if row.phone_e164}
+        by_number = {row.phone_number: row for row in rows if not row.phone_e164}
+        found = {}
+        for phone, phone_e164 in normalized.items():
+            row = by_e164.get(phone_e164) if phone_e164 else by_number.get((phone or "").strip())
+            if row is not None:
+                found[phone] = row
+        return found
+
+    def create_user(self, user_data: UserCreate, hashed_password: Optional[str] = None) -> User:
+        """Créer un nouvel utilisateur
+
+        Args:
+            hashed_password: Hash déjà calculé (hash_password_async depuis un endpoint async) ;
+                à défaut, le mot de passe de user_data est haché ici
+        """
         try:
             # Valider que le phone_number est fourni
             if not user_data.phone_number or not user_data.phone_number.strip():
                 raise ValueError("Le numéro de téléphone est obligatoire")
+            if normalize_phone(user_data.phone_number) is None:
+                raise ValueError("Numéro de téléphone invalide")
             
             # Nettoyer et valider les données
             phone_number = user_data.phone_number.strip()
             
-            hashed_password = None
-            if user_data.password:
+            if hashed_password is None and user_data.password:
                 hashed_password = get_password_hash(user_data.password)
             
             db_user = User(
@@ -46,14 +149,14 @@ class UserService:
             
             self.db.add(db_user)
             self.db.commit()
-            self.db.refresh(db_user)
+            self.db.refresh(db_user, profile_attributes(LOAD_AUTH))
             return db_user
         except Exception as e:
             self.db.rollback()
             raise
 
-    def update_user(self, user_id: int, user_data: UserUpdate) -> Optional[User]:
-        """Mettre à jour un utilisateur"""
+    def update_user(self, user_id: int, user_data: UserUpdate, hashed_password: Optional[str] = None) -> Optional[User]:
+        """Mettre à jour un utilisateur (`hashed_password` : voir create_user)"""
         db_user = self.get_user_by_id(user_id)
         if not db_user:
             return None
@@ -65,77 +168,108 @@ class UserService:
             update_data = user_data.dict(exclude_unset=True)
         
         if "password" in update_data and update_data["password"]:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+            password = update_data.pop("password")
+            update_data["hashed_password"] = hashed_password or get_password_hash(password)
         
         # Mettre à jour updated_at
         from datetime import datetime
         from sqlalchemy.sql import func
         update_data["updated_at"] = datetime.utcnow()
         
+        previous_phone = db_user.phone_number
         for field, value in update_data.items():
             if hasattr(db_user, field):
                 setattr(db_user, field, value)
         
         self.db.commit()
+        principal_cache.invalidate(previous_phone, db_user.phone_number)
         self.db.refresh(db_user)
         return db_user
 
+    def set_user_active(self, user_id: int, is_active: bool) -> Optional[User]:
+        """Activer ou désactiver un compte (effet immédiat sur les tokens déjà émis)"""
+        db_user = self.get_user_by_id(user_id)
+        if not db_user:
+            return None
+        db_user.is_active = is_active
+        self.db.commit()
+        principal_cache.invalidate(db_user.phone_number)
+        return db_user
+
+    def set_media_url(self, user_id: int, field: str, url: str) -> bool:
+        """Enregistrer l'URL d'un média (photo, pièce KYC) dans user_profiles ou user_kyc, sans charger users"""
+        result = self.db.execute(update(User).where(User.id == user_id).values(updated_at=datetime.utcnow()))
+        if result.rowcount == 0:
+            self.db.rollback()
+            return False
+        model = detail_model(field)
+        details = self.db.get(model, user_id)
+        if details is None:
+            details = model(user_id=user_id)
+            self.db.add(details)
+        setattr(details, field, url)
+        self.db.commit()
+        return True
+
     def verify_password(self, user: User, password: str) -> bool:
         """Vérifier le mot de passe d'un utilisateur"""
         if not user.hashed_password:
             return False
         return verify_password(password, user.hashed_password)
 
-    def create_otp(self, phone_number: str) -> OTP:
-        """Créer un code OTP pour un numéro de téléphone"""
-        # Supprimer les anciens OTP non utilisés pour ce numéro
-        self.db.query(OTP).filter(
-            and_(
-                OTP.phone_number == phone_number,
-                OTP.is_used == False
-            )
-        ).delete()
-        
-        # Générer un nouveau OTP
-        otp_code = generate_otp()
-        expires_at = datetime.utcnow() + timedelta(minutes=settings.otp_expire_minutes)
-        
-        db_otp = OTP(
-            phone_number=phone_number,
-            otp_code=otp_code,
-            expires_at=expires_at
-        )
-        
-        self.db.add(db_otp)
+    def set_password_hash(self, user: User, hashed_password: str) -> None:
+        """Remplacer le hash du mot de passe (recalcul au nouveau coût bcrypt lors d'une connexion)"""
+        user.hashed_password = hashed_password
         self.db.commit()
-        self.db.refresh(db_otp)
-        return db_otp
+
+    def create_otp(self, phone_number: str) -> IssuedOTP:
+        """Créer un code OTP pour un numéro de téléphone (remplace le code en cours)"""
+        issued = otp_service.issue(phone_number, generate_otp())
+        if settings.otp_audit_enabled:
+            self.db.add(OTP(phone_number=phone_number, otp_code=issued.otp_code, expires_at=issued.expires_at))
+            self.db.commit()
+        return issued
 
     def verify_otp(self, phone_number: str, otp_code: str) -> bool:
-        """Vérifier un code OTP"""
-        db_otp = self.db.query(OTP).filter(
-            and_(
-                OTP.phone_number == phone_number,
-                OTP.otp_code == otp_code,
-                OTP.is_used == False,
-                OTP.expires_at > datetime.utcnow()
-            )
-        ).first()
-        
-        if db_otp:
-            db_otp.is_used = True
+        """Vérifier un code OTP (usage unique, essais limités)"""
+        if not otp_service.verify(phone_number, otp_code):
+            return False
+        if settings.otp_audit_enabled:
+            self.db.execute(AUDIT_OTP_USED.where(OTP.phone_number == phone_number, OTP.otp_code == otp_code))
             self.db.commit()
-            return True
-        return False
+        return True
 
     def mark_user_verified(self, phone_number: str) -> Optional[User]:
         """Marquer un utilisateur comme vérifié"""
-        user = self.get_user_by_phone(phone_number)
+        user = self.get_user_by_phone(phone_number, LOAD_AUTH)
         if user:
             user.is_verified = True
             self.db.commit()
-            self.db.refresh(user)
+            self.db.refresh(user, profile_attributes(LOAD_AUTH))
+            principal_cache.invalidate(user.phone_number)
         return user
 
 
 
+
+
+class AsyncUserService:
+    """Lectures de UserService sur une AsyncSession (endpoints de lecture en mode asynchrone)
+
+    Les écritures passent toutes par UserService : un seul chemin d'écriture à maintenir.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_user_by_phone(self, phone_number: str, load: str = LOAD_FULL) -> Optional[User]:
+        """Récupérer un utilisateur par numéro de téléphone (voir UserService.get_user_by_phone)
+
+        Un attribut différé ne peut pas être chargé implicitement sur une AsyncSession :
+        le profil doit couvrir toutes les colonnes lues par l'appelant.
+        """
+        condition = phone_filter(phone_number)
+        if condition is None:
+            return None
+        result = await self.db.execute(select(User).options(*load_options(load)).where(condition).limit(1))
+        return result.scalars().first()
@@ -0,0 +1,130 @@
+import logging
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.cache import create_cache, running_loop
+from app.core.metrics import metrics
+from app.core.replicas import Position, current_position, parse_read_token
+from app.models.transaction import Wallet
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Modifications de portefeuilles en attente de commit, par session : user_id -> instantané
+PENDING_KEY = "wallet_cache_pending"
+
+
+def wallet_snapshot(wallet: Wallet, position: Position) -> dict:
+    """Portefeuille sérialisable (schéma Wallet) et position du primaire (LSN) qu'il reflète
+
+    `wallet` : instance Wallet ou ligne RETURNING portant les mêmes colonnes.
+    """
+    return {
+        "id": wallet.id,
+        "user_id": wallet.user_id,
+        "balance": str(wallet.balance),
+        "currency": wallet.currency or "XOF",
+        "is_active": wallet.is_active,
+        "version": wallet.version,
+        "created_at": wallet.created_at.isoformat() if wallet.created_at else None,
+        "updated_at": wallet.updated_at.isoformat() if wallet.updated_at else None,
+        "position": position,
+    }
+
+
+class WalletCache:
+    """Cache des portefeuilles par user_id, alimenté à l'écriture (après commit) et à la lecture
+
+    - écriture : le portefeuille renvoyé par l'UPDATE ... RETURNING est publié après le commit
+      de la session qui l'a modifié (annulé avec elle en cas de rollback)
+    - version : une valeur plus ancienne que celle en cache n'écrase jamais la plus récente
+    - read-your-writes : une entrée dont la position précède celle du jeton X-Read-Token est ignorée
+
+    Les erreurs du cache (Redis indisponible) ne font jamais échouer la requête : lecture en base.
+    """
+
+    def __init__(self):
+        self.backend = create_cache("wallets", settings.wallet_cache_ttl_seconds, settings.wallet_cache_max_entries)
+
+    def get(self, user_id: int, read_token: Optional[str] = None) -> Optional[dict]:
+        if not settings.wallet_cache_enabled:
+            return None
+        try:
+            snapshot = self.backend.get(str(user_id))
+        except Exception as e:
+            metrics.incr("cache.wallets.errors")
+            logger.warning(f"⚠️ Cache des portefeuilles indisponible: {e}")
+            return None
+        written = parse_read_token(read_token)
+        if snapshot is None or (written is not None and snapshot.get("position", 0) < written):
+            metrics.incr("cache.wallets.misses")
+            return None
+        metrics.incr("cache.wallets.hits")
+        return snapshot
+
+    def put(self, wallet: Wallet, position: Position = 0) -> None:
+        """Mettre en cache un portefeuille lu en base (`position` : position du primaire prise avant la lecture,
+        0 si inconnue : l'entrée ne sert alors que les lectures sans jeton)"""
+        self.publish([(wallet.user_id, wallet_snapshot(wallet, position))])
+
+    def publish(self, changes) -> None:
+        """Publier des instantanés (user_id, instantané) ; une version plus ancienne que celle en cache est ignorée"""
+        if not settings.wallet_cache_enabled:
+            return
+        try:
+            for user_id, snapshot in changes:
+                if not self.backend.set(str(user_id), snapshot):
+                    metrics.incr("cache.wallets.stale_writes")
+        except Exception as e:
+            metrics.incr("cache.wallets.errors")
+            logger.warning(f"⚠️ Cache des portefeuilles non mis à jour: {e}")
+
+
+wallet_cache = WalletCache()
+
+
+def stage_wallet(db, wallet: Wallet) -> None:
+    """Publier ce portefeuille dans le cache au commit de la session (`db` : Session ou AsyncSession)
+
+    `wallet` : instance Wallet ou ligne RETURNING (id, user_id, balance, currency, is_active, version, dates).
+    """
+    pending = db.info.setdefault(PENDING_KEY, {})
+    current = pending.get(wallet.user_id)
+    # La version la plus récente l'emporte
+    if current is not None and current["version"] > wallet.version:
+        return
+    pending[wallet.user_id] = wallet_snapshot(wallet, 0)
+
+
+def publish_committed(bind, pending: dict) -> None:
+    """Publier les portefeuilles d'une transaction validée, à la position du primaire après le commit"""
+    position = current_position(bind)
+    for snapshot in pending.values():
+        snapshot["position"] = position
+    wallet_cache.publish(pending.items())
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_wallets(session: Session) -> None:
+    # Libération d'un SAVEPOINT : la transaction principale n'est pas encore validée
+    if session.in_nested_transaction():
+        return
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    # La session ne peut plus exécuter de requête ici : position lue sur une autre connexion du pool
+    bind = session.get_bind()
+    # Commit depuis un endpoint async : publication Redis dans un thread, sans l'attendre (une publication
+    # tardive est sans risque : garde de version, et le jeton read-your-writes ignore l'entrée précédente)
+    loop = running_loop()
+    if loop is not None and wallet_cache.backend.blocking:
+        loop.run_in_executor(None, publish_committed, bind, pending)
+        return
+    publish_committed(bind, pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_wallets(session: Session, previous_transaction) -> None:
+    # Seul le rollback de la transaction principale annule les publications (pas celui d'un SAVEPOINT)
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
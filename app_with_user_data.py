@@ -6,6 +6,7 @@ from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import hashlib
 import secrets
+from app.core.phone import normalize_phone
 
 # Configuration de la base de données
 DB_FILE = 'fintel.db'
@@ -163,17 +164,8 @@ class FintelAPIHandler(BaseHTTPRequestHandler):
 
     # --- Helpers état ---
     def normalize_phone(self, phone: str | None) -> str | None:
-        if not phone:
-            return None
-        digits = ''.join(ch for ch in phone if ch.isdigit())
-        if len(digits) >= 10:
-            local = digits[-10:]
-        else:
-            local = digits
-        # retourne format +225XXXXXXXXXX
-        if digits.startswith('225') and len(digits) > 10:
-            return '+' + digits
-        return '+225' + local if not phone.startswith('+') else '+' + digits
+        # Même forme canonique (E.164, +225XXXXXXXXXX) que l'API
+        return normalize_phone(phone)
     def set_last_phone(self, phone: str):
         conn = sqlite3.connect(DB_FILE)
         cursor = conn.cursor()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Archiver les anciennes partitions mensuelles de la table transactions (PostgreSQL)
+
+Chaque partition plus ancienne que TRANSACTIONS_HOT_MONTHS est exportée dans
+TRANSACTIONS_ARCHIVE_DIR/transactions_pAAAAMM.jsonl.gz puis détachée et supprimée.
+Les mois archivés restent consultables via GET /api/v1/transactions/history.
+
+    python archive_transactions.py                 # archiver selon la configuration
+    python archive_transactions.py --hot-months 6  # conserver seulement 6 mois en base
+    python archive_transactions.py --dry-run       # lister les partitions sans rien archiver
+    python archive_transactions.py --reindex       # indexer par utilisateur les archives de l'ancien format
+"""
+
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import engine
+from app.services.partition_service import (
+    add_months, archive_index_path, archive_old_partitions, ensure_transaction_partitions,
+    is_partitioned, list_transaction_partitions, month_start, reindex_archive,
+)
+from app.services.transaction_archive import TransactionArchive
+from config import settings
+
+
+def reindex(archive_dir: str) -> int:
+    """Réécrire au format indexé les mois archivés qui n'ont pas encore d'index"""
+    count = 0
+    for _, path in TransactionArchive(archive_dir).archived_months():
+        if os.path.exists(archive_index_path(path)):
+            continue
+        rows = reindex_archive(path)
+        count += 1
+        print(f"🗂️ {os.path.basename(path)}: {rows} transactions indexées")
+    print(f"✅ {count} archive(s) indexée(s)")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Archivage des partitions de transactions")
+    parser.add_argument("--hot-months", type=int, default=settings.transactions_hot_months)
+    parser.add_argument("--archive-dir", default=settings.transactions_archive_dir)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--reindex", action="store_true", help="Indexer les archives existantes sans toucher à la base")
+    args = parser.parse_args()
+
+    if args.reindex:
+        return reindex(args.archive_dir)
+
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            print("❌ La table transactions n'est pas partitionnée (PostgreSQL + python migrate.py requis)")
+            return 1
+
+        created = ensure_transaction_partitions(conn, settings.transactions_partition_months_ahead)
+        if created:
+            print(f"📅 Partitions créées: {', '.join(created)}")
+
+        if args.dry_run:
+            cutoff = add_months(month_start(date.today()), -args.hot_months)
+            for name, month in list_transaction_partitions(conn):
+                print(f"   {name}: {'à archiver' if month < cutoff else 'conservée'}")
+            return 0
+
+        archived = archive_old_partitions(conn, args.hot_months, args.archive_dir)
+        for name, count in archived.items():
+            print(f"🗄️ {name}: {count} transactions archivées")
+        print(f"✅ {len(archived)} partition(s) archivée(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
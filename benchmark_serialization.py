@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Mesurer le coût de l'historique (GET /api/v1/transactions/history) par 1 000 lignes
+
+Les transactions sont lues dans une base SQLite en mémoire puis sérialisées selon trois chemins :
+- schéma : entités ORM, response_model List[Transaction] (validation Pydantic par ligne) puis
+           json.dumps, le chemin de l'API avant la réponse orjson
+- orjson : entités ORM, même validation Pydantic, encodage orjson (réponse par défaut FastJSONResponse)
+- direct : lignes de colonnes (HISTORY_COLUMNS) -> JSON sans modèle Pydantic (transactions_json),
+           le chemin actuel de l'historique
+
+Les trois sorties sont vérifiées identiques avant la mesure. Le coût est donné pour la
+sérialisation seule et pour la lecture (hydratation des lignes) + sérialisation.
+
+    python benchmark_serialization.py                # 1 000 lignes, 100 répétitions
+    python benchmark_serialization.py --rows 5000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from app.core.responses import dumps, transactions_json
+from app.models.user import User  # noqa: F401 (relation Transaction.user)
+from app.models.transaction import Transaction as TransactionModel
+from app.schemas.transaction import Transaction
+from app.services.transaction_service import HISTORY_COLUMNS
+
+
+def sample_database(count: int) -> Session:
+    engine = create_engine("sqlite://")
+    TransactionModel.__table__.create(engine)
+    start = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(TransactionModel.__table__), [
+            {
+                "id": index + 1,
+                "user_id": 1,
+                "transaction_type": ("deposit", "withdrawal", "transfer")[index % 3],
+                "amount": Decimal(index % 50000) + Decimal("0.50"),
+                "currency": "XOF",
+                "status": "completed",
+                "description": f"Opération {index}",
+                "reference": f"TXN_{index:012X}",
+                "network": "orange" if index % 2 else None,
+                "recipient_phone": "+2250505979884" if index % 3 == 2 else None,
+                "created_at": start + timedelta(seconds=index),
+                "updated_at": start + timedelta(seconds=index, microseconds=250),
+            }
+            for index in range(count)
+        ])
+    return Session(engine)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Coût de sérialisation de l'historique")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    db = sample_database(args.rows)
+    history = TypeAdapter(List[Transaction])
+
+    def read_entities():
+        db.expunge_all()
+        return db.execute(select(TransactionModel)).scalars().all()
+
+    def read_rows():
+        return db.execute(select(*HISTORY_COLUMNS)).all()
+
+    def schema(rows) -> bytes:
+        content = history.dump_python(history.validate_python(rows, from_attributes=True), mode="json")
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def schema_orjson(rows) -> bytes:
+        return dumps(history.dump_python(history.validate_python(rows, from_attributes=True), mode="json"))
+
+    paths = {
+        "schéma": (read_entities, schema),
+        "orjson": (read_entities, schema_orjson),
+        "direct": (read_rows, transactions_json),
+    }
+    reference = json.loads(schema(read_entities()))
+    for name, (read, serialize) in paths.items():
+        if json.loads(serialize(read())) != reference:
+            print(f"❌ {name}: sortie différente du schéma Transaction")
+            return 1
+
+    def per_thousand(seconds: float) -> float:
+        return seconds / args.repeat / args.rows * 1000 * 1e6
+
+    print(f"📊 {args.rows} lignes, {args.repeat} répétitions (µs pour 1 000 lignes)")
+    print(f"   {'':<8} {'sérialisation':>14} {'lecture + sérialisation':>24}")
+    for name, (read, serialize) in paths.items():
+        rows = read()
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            serialize(rows)
+        serialized = per_thousand(time.perf_counter() - started)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            serialize(read())
+        total = per_thousand(time.perf_counter() - started)
+        print(f"   {name:<8} {serialized:>14.0f} {total:>24.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
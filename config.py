@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -16,14 +16,117 @@ class Settings(BaseSettings):
     db_user: str = os.getenv("DB_USER", "postgres")
     db_password: str = os.getenv("DB_PASSWORD", "0000")
     
+    # Pool de connexions (ignoré pour SQLite)
+    # Le pre-ping à chaque checkout coûte un aller-retour : on préfère une vérification périodique
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle: int = 1800  # secondes avant de recycler une connexion
+    db_pool_timeout: int = 10  # secondes d'attente max pour obtenir une connexion
+    db_pool_pre_ping: bool = False
+    db_liveness_check_interval: int = 30  # secondes entre deux vérifications (0 = désactivé)
+    
+    # Réplicas en lecture (liste JSON d'URLs, ex. READ_REPLICA_URLS='["postgresql://..."]')
+    # Les endpoints de lecture y sont routés en round-robin, avec repli sur le primaire
+    read_replica_urls: List[str] = []
+    replica_max_lag_seconds: float = 5.0
+    replica_lag_check_interval: int = 5  # secondes entre deux mesures du retard
+    
+    # Journalisation SQL (désactivée par défaut)
+    sql_echo: bool = False  # Journaliser toutes les requêtes (équivalent de echo=True, déconseillé en production)
+    sql_slow_query_ms: float = 0  # Seuil des requêtes lentes en millisecondes (0 = désactivé)
+    sql_log_sample_rate: float = 0.0  # Proportion de requêtes journalisées intégralement (0.0 à 1.0)
+    
+    # Instrumentation SQL par requête HTTP (métriques, détection N+1)
+    sql_instrumentation_enabled: bool = True
+    sql_n_plus_one_threshold: int = 5  # Nombre de répétitions d'une même requête pour signaler un N+1
+    debug: bool = False  # En mode debug, les statistiques SQL sont renvoyées en en-têtes X-DB-*
+    
+    # /monitoring/* (pool, métriques) : en-tête X-Monitoring-Token requis ; sans jeton, accessible en mode debug uniquement
+    monitoring_token: Optional[str] = None
+    
+    # Partitionnement mensuel de la table transactions (PostgreSQL, migration 0003)
+    transactions_partition_months_ahead: int = 3  # Partitions futures créées à l'avance
+    transactions_hot_months: int = 12  # Mois conservés en base, les plus anciens sont archivés
+    transactions_archive_dir: str = "archives/transactions"  # Fichiers .jsonl.gz des mois archivés
+    partition_maintenance_interval: int = 86400  # Secondes entre deux créations de partitions (0 = désactivé)
+    
+    # Grand livre (ledger_entries) : instantanés périodiques des soldes pour les soldes à date
+    ledger_snapshot_interval: int = 3600  # Secondes entre deux instantanés (0 = désactivé)
+    ledger_snapshot_batch_size: int = 1000  # Portefeuilles traités par lot
+    
+    # Maintenance de fond : purge des OTP expirés et expiration des transactions restées en attente
+    maintenance_interval: int = 900  # Secondes entre deux passages (0 = désactivé)
+    maintenance_batch_size: int = 1000  # Lignes par lot (un commit par lot : verrous courts)
+    maintenance_max_batches: int = 100  # Lots au plus par tâche et par passage
+    otp_retention_hours: int = 24  # Durée de conservation du journal otps après expiration du code
+    pending_transaction_timeout_minutes: int = 30  # Transactions 'pending' plus anciennes passées en 'failed'
+    
+    # Transferts : nouvelle tentative sur interblocage / échec de sérialisation
+    transfer_max_attempts: int = 5
+    transfer_retry_base_ms: int = 10  # Attente de base, doublée à chaque tentative (avec gigue)
+    transfer_retry_max_ms: int = 200
+    
+    # Paiements groupés (POST /transactions/batch-transfer)
+    batch_transfer_max_lines: int = 10000
+    batch_transfer_chunk_size: int = 1000  # Portefeuilles crédités par UPDATE (hors PostgreSQL)
+    
+    # Idempotency-Key sur /deposit, /withdrawal, /transfer, /fintel-transfer et /batch-transfer
+    # (en mémoire par processus, ou Redis partagé entre workers si CACHE_REDIS_URL est défini)
+    idempotency_ttl_seconds: int = 86400  # Durée de conservation d'une clé et de sa réponse
+    idempotency_max_entries: int = 100000
+    idempotency_wait_seconds: float = 5.0  # Attente max d'un doublon concurrent avant 409
+    
+    # Limitation de débit (seaux à jetons "jetons/secondes") sur /auth/request-otp et /auth/login : 429 avant toute requête SQL ou bcrypt
+    rate_limit_enabled: bool = True
+    rate_limit_store: str = "memory"  # memory (par processus) ou redis (CACHE_REDIS_URL, partagé entre workers)
+    rate_limit_max_entries: int = 100000  # Seaux gardés en mémoire (store memory uniquement)
+    rate_limit_otp_phone: str = "3/300"
+    rate_limit_otp_ip: str = "20/60"
+    rate_limit_login_phone: str = "5/60"
+    rate_limit_login_ip: str = "30/60"
+    
+    # Caches applicatifs : LRU en mémoire par processus, ou Redis partagé entre workers si CACHE_REDIS_URL est défini
+    cache_redis_url: Optional[str] = None
+    
+    # Cache des soldes (GET /transactions/wallet) : mis à jour au commit de chaque écriture
+    wallet_cache_enabled: bool = True
+    wallet_cache_ttl_seconds: float = 300
+    wallet_cache_max_entries: int = 100000
+    
+    # Cache des principaux (get_current_user) : invalidé à chaque modification du compte
+    principal_cache_enabled: bool = True
+    principal_cache_ttl_seconds: float = 60
+    principal_cache_max_entries: int = 100000
+    
+    # Accès asynchrone (AsyncEngine/AsyncSession)
+    # Si activé, les endpoints de lecture utilisent asyncpg (PostgreSQL) ou aiosqlite (SQLite)
+    # ASYNC_DATABASE_URL permet de forcer une URL différente de DATABASE_URL
+    async_db_enabled: bool = False
+    async_database_url: Optional[str] = None
+    
     # JWT Configuration
     secret_key: str = "your-secret-key-here-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    # Mots de passe (bcrypt) : calculés dans un pool de threads borné, hors de la boucle d'événements
+    bcrypt_rounds: int = 12  # Coût ; un hash d'un autre coût est recalculé à la connexion suivante
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 64  # Calculs en cours ou en attente au-delà desquels l'API répond 503
+    
+    # Numéros de téléphone : forme canonique E.164 (users.phone_e164) pour toutes les recherches
+    phone_default_country_code: str = "225"  # Indicatif ajouté aux numéros nationaux
+    
+    # Médias (photo de profil, pièces KYC) : fichiers adressés par contenu, hors de la table users
+    media_dir: str = "media"
+    media_max_bytes: int = 5 * 1024 * 1024  # Taille maximale d'une image envoyée
+    
     # OTP Configuration
     otp_expire_minutes: int = 5
     otp_length: int = 4
+    otp_store: str = "memory"  # memory (par processus) ou redis (CACHE_REDIS_URL, partagé entre workers)
+    otp_max_attempts: int = 5  # Codes erronés au-delà desquels le code en cours est détruit
+    otp_audit_enabled: bool = False  # Journaliser les codes émis et utilisés dans la table otps
     
     # API Configuration
     api_v1_str: str = "/api/v1"
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Sortir de la base les images encore stockées en base64 (data:image/...;base64,...)
+
+Chaque image est écrite dans MEDIA_DIR (stockage adressé par contenu, voir app/services/media_store.py)
+et la colonne (user_profiles.profile_picture_url, photos de user_kyc) reçoit l'URL
+/api/v1/media/<sha256>.<ext>. Les lignes sont traitées par lots d'user_id, un commit par lot :
+le script peut être interrompu et relancé.
+
+    python extract_media.py                 # déplacer toutes les images en ligne
+    python extract_media.py --batch-size 100
+    python extract_media.py --dry-run       # compter les images sans rien modifier
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import or_, select, update
+from app.core.database import SessionLocal
+from app.models.user import UserKYC, UserProfile
+from app.models.transaction import Transaction  # noqa: F401 (relations User <-> Wallet / Transaction)
+from app.services.media_store import MediaError, media_store
+
+MEDIA_COLUMNS = {
+    UserProfile: (UserProfile.profile_picture_url,),
+    UserKYC: (UserKYC.front_id_photo_url, UserKYC.back_id_photo_url, UserKYC.selfie_photo_url),
+}
+
+
+def extract_table(db, model, columns, batch_size: int, dry_run: bool):
+    """Images en ligne d'une table -> médias ; renvoie (déplacées, ignorées)"""
+    inline = or_(*(column.like("data:%") for column in columns))
+    moved = failed = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(model.user_id, *columns)
+            .where(model.user_id > last_id, inline)
+            .order_by(model.user_id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for user_id, *values in rows:
+            changes = {}
+            for column, value in zip(columns, values):
+                if not value or not value.startswith("data:"):
+                    continue
+                if dry_run:
+                    moved += 1
+                    continue
+                try:
+                    changes[column.key] = media_store.save_data_uri(value).url
+                except MediaError as e:
+                    failed += 1
+                    print(f"⚠️ {model.__tablename__}.user_id={user_id} {column.key}: {e}")
+            if changes:
+                db.execute(update(model).where(model.user_id == user_id).values(changes))
+                moved += len(changes)
+        db.commit()
+        last_id = rows[-1][0]
+    return moved, failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Extraction des images base64 des profils et du KYC")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    moved = failed = 0
+    db = SessionLocal()
+    try:
+        for model, columns in MEDIA_COLUMNS.items():
+            table_moved, table_failed = extract_table(db, model, columns, args.batch_size, args.dry_run)
+            moved += table_moved
+            failed += table_failed
+    finally:
+        db.close()
+
+    verb = "à déplacer" if args.dry_run else "déplacée(s)"
+    print(f"✅ {moved} image(s) {verb} vers {media_store.directory}, {failed} ignorée(s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
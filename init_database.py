@@ -10,19 +10,15 @@ import os
 # Ajouter le répertoire parent au path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.core.database import Base, engine
-# Importer les modèles pour qu'ils soient enregistrés dans Base.metadata
-from app.models.user import User, OTP
-from app.models.transaction import Transaction, Wallet
+from migrate import run_migrations
 
 def init_database():
-    """Créer toutes les tables dans la base de données"""
+    """Créer toutes les tables dans la base de données (via les migrations versionnées)"""
     try:
         print("🔄 Création des tables dans la base de données...")
-        print(f"📊 Connexion à: {engine.url}")
         
-        # Créer toutes les tables
-        Base.metadata.create_all(bind=engine)
+        # Appliquer toutes les migrations (idempotent)
+        run_migrations()
         
         print("✅ Toutes les tables ont été créées avec succès!")
         print("\n📊 Tables créées:")
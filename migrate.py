@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Appliquer les migrations de schéma (Alembic) - à lancer une fois avant de démarrer l'API
+
+    python migrate.py              # mettre à jour jusqu'à la version de cette release (RELEASE_REVISION)
+    python migrate.py 0001         # mettre à jour jusqu'à une version donnée
+    python migrate.py head         # appliquer aussi les migrations contract de la release suivante
+    python migrate.py --sql        # afficher le SQL sans l'exécuter
+    python migrate.py --current    # afficher la version actuelle de la base
+
+L'API elle-même n'exécute aucun DDL au démarrage.
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from alembic import command
+from alembic.config import Config
+
+# Version du schéma livrée avec ce code. Les migrations suivantes (contract : suppression de colonnes
+# encore lues par la release précédente) ne s'appliquent qu'à la release suivante, qui avance cette
+# valeur une fois le déploiement progressif terminé.
+RELEASE_REVISION = "0008"
+
+
+def alembic_config() -> Config:
+    return Config(os.path.join(ROOT, "alembic.ini"))
+
+
+def run_migrations(revision: str = RELEASE_REVISION, sql: bool = False) -> None:
+    """Mettre à jour le schéma jusqu'à `revision`"""
+    command.upgrade(alembic_config(), revision, sql=sql)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Migrations du schéma Fintel")
+    parser.add_argument("revision", nargs="?", default=RELEASE_REVISION, help=f"Version cible (défaut: {RELEASE_REVISION})")
+    parser.add_argument("--sql", action="store_true", help="Afficher le SQL sans l'exécuter")
+    parser.add_argument("--current", action="store_true", help="Afficher la version actuelle")
+    args = parser.parse_args()
+
+    try:
+        if args.current:
+            command.current(alembic_config(), verbose=True)
+        else:
+            print(f"🔄 Migration du schéma vers {args.revision}...")
+            run_migrations(args.revision, sql=args.sql)
+            print("✅ Schéma à jour")
+        return 0
+    except Exception as e:
+        print(f"❌ Erreur lors de la migration: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
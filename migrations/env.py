@@ -0,0 +1,60 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+from config import settings
+from app.core.database import Base
+# Importer tous les modèles pour qu'ils soient enregistrés dans Base.metadata (autogenerate)
+from app.models.user import User, UserProfile, UserKYC, OTP
+from app.models.transaction import Transaction, Wallet
+from app.models.ledger import LedgerEntry, WalletBalanceSnapshot
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Verrou consultatif : deux conteneurs qui démarrent en même temps n'appliquent pas les migrations en parallèle
+MIGRATION_LOCK_ID = 72710001
+
+
+def run_migrations_offline() -> None:
+    """Générer le SQL sans se connecter (python migrate.py --sql)"""
+    context.configure(
+        url=settings.database_url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Appliquer les migrations sur la base configurée"""
+    connectable = create_engine(settings.database_url, poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        is_postgresql = connection.dialect.name == "postgresql"
+        if is_postgresql:
+            connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            connection.commit()
+        try:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                compare_type=True,
+                # SQLite ne sait pas modifier une table en place
+                render_as_batch=connection.dialect.name == "sqlite",
+            )
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if is_postgresql:
+                connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+                connection.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,115 @@
+"""Opérations de migration sûres en production (sans verrou long sur les tables)
+
+- create_index_concurrently / drop_index_concurrently : CREATE/DROP INDEX CONCURRENTLY
+  sur PostgreSQL (hors transaction), index classique sur les autres bases
+- create_partitioned_index_concurrently : même chose sur une table partitionnée
+  (index créé partition par partition puis rattaché à l'index parent)
+- table_exists / column_names : rendre les migrations idempotentes sur les bases
+  initialisées avec les anciens scripts SQL de ce dossier
+- copy_in_batches : copie de données par tranches d'id (transactions courtes)
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+def is_offline() -> bool:
+    """Mode --sql : pas de connexion, on génère le SQL d'une base vide"""
+    return op.get_context().as_sql
+
+
+def is_postgresql() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def table_exists(table_name: str) -> bool:
+    if is_offline():
+        return False
+    return sa.inspect(op.get_bind()).has_table(table_name)
+
+
+def column_names(table_name: str) -> set:
+    if is_offline():
+        return set()
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table_name)}
+
+
+def index_names(table_name: str) -> set:
+    if is_offline():
+        return set()
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table_name)}
+
+
+def copy_in_batches(statement: str, table_name: str = "users", batch_size: int = 5000) -> None:
+    """Exécuter `statement` (bornes :low et :high sur l'id de `table_name`) par tranches de `batch_size` ids"""
+    if is_offline():
+        op.execute(sa.text(statement).bindparams(low=0, high=2 ** 31 - 1))
+        return
+    bind = op.get_bind()
+    max_id = bind.execute(sa.text(f"SELECT MAX(id) FROM {table_name}")).scalar() or 0
+    for low in range(0, max_id, batch_size):
+        bind.execute(sa.text(statement), {"low": low, "high": low + batch_size})
+
+
+def create_index_concurrently(index_name: str, table_name: str, columns, unique: bool = False, **kw) -> None:
+    """Créer un index sans bloquer les écritures (CONCURRENTLY sur PostgreSQL)
+
+    `columns` accepte des noms de colonnes ou des expressions (ex. sa.text("created_at DESC")).
+    """
+    if index_name in index_names(table_name):
+        return
+    if is_postgresql():
+        # CREATE INDEX CONCURRENTLY est interdit dans une transaction
+        with op.get_context().autocommit_block():
+            op.create_index(
+                index_name, table_name, columns, unique=unique,
+                postgresql_concurrently=True, **kw
+            )
+    else:
+        op.create_index(index_name, table_name, columns, unique=unique, **kw)
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    """Supprimer un index sans bloquer les écritures (CONCURRENTLY sur PostgreSQL)"""
+    if index_name not in index_names(table_name):
+        return
+    if is_postgresql():
+        with op.get_context().autocommit_block():
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+    else:
+        op.drop_index(index_name, table_name=table_name)
+
+
+def is_partitioned(table_name: str) -> bool:
+    """Table partitionnée (PostgreSQL) ; en mode --sql, la migration 0003 partitionne transactions"""
+    if not is_postgresql():
+        return False
+    if is_offline():
+        return table_name == "transactions"
+    return op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+        {"table": table_name},
+    ).first() is not None
+
+
+def create_partitioned_index_concurrently(index_name: str, table_name: str, columns: str, where: str = None) -> None:
+    """Index sur une table partitionnée sans bloquer les écritures (PostgreSQL)
+
+    CREATE INDEX CONCURRENTLY est impossible sur la table parente : l'index parent est créé
+    ON ONLY (invalide, sans verrou long), chaque partition est indexée CONCURRENTLY puis rattachée ;
+    l'index parent devient valide une fois toutes les partitions rattachées et les partitions
+    créées ensuite reçoivent l'index automatiquement.
+    """
+    predicate = f" WHERE {where}" if where else ""
+    if is_offline():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns}){predicate}")
+        return
+    op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON ONLY {table_name} ({columns}){predicate}")
+    partitions = op.get_bind().execute(
+        sa.text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(:table)"),
+        {"table": table_name},
+    ).scalars().all()
+    for partition in partitions:
+        partition_index = f"{partition}_{index_name}"[:63]
+        with op.get_context().autocommit_block():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} ({columns}){predicate}")
+        op.execute(f"ALTER INDEX {index_name} ATTACH PARTITION {partition_index}")
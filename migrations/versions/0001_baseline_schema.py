@@ -0,0 +1,121 @@
+"""Schéma initial : users, otps, wallets, transactions
+
+Reprend migrations/init_database_complete.sql, add_user_fields.sql et
+fix_profile_picture_url_type.sql. Idempotent : sur une base déjà initialisée
+avec ces scripts, seules les colonnes manquantes sont ajoutées.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import table_exists, column_names, is_postgresql
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def user_profile_columns():
+    """Colonnes ajoutées à users après la première version (migrations/add_user_fields.sql)"""
+    return [
+        sa.Column('whatsapp_number', sa.String(20), nullable=True),
+        sa.Column('date_of_birth', sa.Date(), nullable=True),
+        sa.Column('country', sa.String(100), nullable=True),
+        sa.Column('city', sa.String(100), nullable=True),
+        sa.Column('address', sa.Text(), nullable=True),
+        sa.Column('id_type', sa.String(50), nullable=True),
+        sa.Column('id_number', sa.String(100), nullable=True),
+        sa.Column('id_issue_date', sa.Date(), nullable=True),
+        sa.Column('id_expiry_date', sa.Date(), nullable=True),
+        sa.Column('profile_picture_url', sa.Text(), nullable=True),
+        sa.Column('front_id_photo_url', sa.String(500), nullable=True),
+        sa.Column('back_id_photo_url', sa.String(500), nullable=True),
+        sa.Column('selfie_photo_url', sa.String(500), nullable=True),
+        sa.Column('otp_delivery_preference', sa.String(10), nullable=True, server_default='sms'),
+        sa.Column('terms_accepted', sa.Boolean(), nullable=True, server_default=sa.false()),
+        sa.Column('privacy_policy_accepted', sa.Boolean(), nullable=True, server_default=sa.false()),
+    ]
+
+
+def upgrade() -> None:
+    if not table_exists('users'):
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('phone_number', sa.String(20), nullable=False),
+            sa.Column('email', sa.String(255), nullable=True),
+            sa.Column('first_name', sa.String(100), nullable=True),
+            sa.Column('last_name', sa.String(100), nullable=True),
+            *user_profile_columns(),
+            sa.Column('hashed_password', sa.String(255), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('is_verified', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index('ix_users_id', 'users', ['id'])
+        op.create_index('ix_users_phone_number', 'users', ['phone_number'], unique=True)
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    else:
+        existing = column_names('users')
+        for column in user_profile_columns():
+            if column.name not in existing:
+                op.add_column('users', column)
+        if is_postgresql():
+            # migrations/fix_profile_picture_url_type.sql : les images base64 dépassent VARCHAR(500)
+            op.alter_column('users', 'profile_picture_url', type_=sa.Text(), existing_nullable=True)
+
+    if not table_exists('otps'):
+        op.create_table(
+            'otps',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('phone_number', sa.String(20), nullable=False),
+            sa.Column('otp_code', sa.String(10), nullable=False),
+            sa.Column('is_used', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        )
+        op.create_index('ix_otps_id', 'otps', ['id'])
+        op.create_index('ix_otps_phone_number', 'otps', ['phone_number'])
+
+    if not table_exists('wallets'):
+        op.create_table(
+            'wallets',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False, unique=True),
+            sa.Column('balance', sa.Numeric(15, 2), nullable=True),
+            sa.Column('currency', sa.String(3), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index('ix_wallets_id', 'wallets', ['id'])
+
+    if not table_exists('transactions'):
+        op.create_table(
+            'transactions',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('transaction_type', sa.String(50), nullable=False),
+            sa.Column('amount', sa.Numeric(15, 2), nullable=False),
+            sa.Column('currency', sa.String(3), nullable=True),
+            sa.Column('status', sa.String(20), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('reference', sa.String(100), nullable=True),
+            sa.Column('network', sa.String(50), nullable=True),
+            sa.Column('recipient_phone', sa.String(20), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index('ix_transactions_id', 'transactions', ['id'])
+        op.create_index('ix_transactions_reference', 'transactions', ['reference'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table('transactions')
+    op.drop_table('wallets')
+    op.drop_table('otps')
+    op.drop_table('users')
@@ -0,0 +1,25 @@
+"""Index composite (user_id, created_at DESC, id DESC) pour la pagination par curseur de l'historique
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from migrations.helpers import create_index_concurrently, drop_index_concurrently
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    create_index_concurrently(
+        'ix_transactions_user_created_id',
+        'transactions',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_transactions_user_created_id', 'transactions')
@@ -0,0 +1,146 @@
+"""Partitionnement mensuel de transactions sur created_at (PostgreSQL uniquement)
+
+La table existante est renommée en transactions_legacy, une table partitionnée
+(RANGE created_at) la remplace avec une partition par mois présent dans les
+données plus les mois à venir, puis les lignes sont copiées par lots d'id.
+
+Toute la migration s'exécute dans une seule transaction : les lots bornent la taille de
+chaque INSERT, pas la durée des verrous ni le volume de WAL. transactions reste verrouillée
+jusqu'au commit final, à lancer dans une fenêtre de maintenance sur une grosse table.
+
+Contraintes de PostgreSQL sur les tables partitionnées :
+- la clé primaire devient (id, created_at) ; id reste alimenté par la même séquence
+- reference n'a plus d'index unique global (index simple) : l'unicité est assurée
+  par la génération TXN_<uuid> côté application
+
+Les autres bases (SQLite en développement) ne sont pas modifiées.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import is_postgresql, is_offline
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+COPY_BATCH_SIZE = 10000
+MONTHS_AHEAD = 3
+COLUMNS = (
+    "id, user_id, transaction_type, amount, currency, status, description, "
+    "reference, network, recipient_phone, created_at, updated_at"
+)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_month_partition(start: date) -> None:
+    name = f"transactions_p{start.year:04d}{start.month:02d}"
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transactions "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    if not is_postgresql():
+        return
+
+    op.execute("ALTER TABLE transactions RENAME TO transactions_legacy")
+    op.execute("ALTER TABLE transactions_legacy RENAME CONSTRAINT transactions_pkey TO transactions_legacy_pkey")
+    # La séquence survit à la suppression de l'ancienne table
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY NONE")
+    op.execute("UPDATE transactions_legacy SET created_at = now() WHERE created_at IS NULL")
+
+    op.execute("""
+        CREATE TABLE transactions (
+            id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            transaction_type VARCHAR(50) NOT NULL,
+            amount NUMERIC(15, 2) NOT NULL,
+            currency VARCHAR(3),
+            status VARCHAR(20),
+            description TEXT,
+            reference VARCHAR(100),
+            network VARCHAR(50),
+            recipient_phone VARCHAR(20),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    # Filet de sécurité : une ligne hors des partitions mensuelles n'échoue jamais
+    op.execute("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT")
+
+    current = date.today().replace(day=1)
+    first = current
+    if not is_offline():
+        oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM transactions_legacy")).scalar()
+        if oldest is not None:
+            first = min(first, oldest.date().replace(day=1))
+    month = first
+    while month <= add_months(current, MONTHS_AHEAD):
+        create_month_partition(month)
+        month = add_months(month, 1)
+
+    # Copie par lots d'id pour borner la taille de chaque INSERT (même transaction : verrous jusqu'au commit)
+    if is_offline():
+        op.execute(f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_legacy")
+    else:
+        bind = op.get_bind()
+        max_id = bind.execute(sa.text("SELECT max(id) FROM transactions_legacy")).scalar() or 0
+        for start in range(0, max_id, COPY_BATCH_SIZE):
+            bind.execute(
+                sa.text(
+                    f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_legacy "
+                    "WHERE id > :start AND id <= :end"
+                ),
+                {"start": start, "end": start + COPY_BATCH_SIZE},
+            )
+
+    op.execute("DROP TABLE transactions_legacy")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+
+    # Index partitionnés (créés sur chaque partition, y compris les futures)
+    op.execute("CREATE INDEX ix_transactions_user_created_id ON transactions (user_id, created_at DESC, id DESC)")
+    op.execute("CREATE INDEX ix_transactions_reference ON transactions (reference)")
+    op.execute("CREATE INDEX ix_transactions_id ON transactions (id)")
+
+
+def downgrade() -> None:
+    if not is_postgresql():
+        return
+
+    op.execute("ALTER TABLE transactions RENAME TO transactions_partitioned")
+    op.execute("ALTER TABLE transactions_partitioned RENAME CONSTRAINT transactions_pkey TO transactions_partitioned_pkey")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY NONE")
+    op.execute("""
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY DEFAULT nextval('transactions_id_seq'),
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            transaction_type VARCHAR(50) NOT NULL,
+            amount NUMERIC(15, 2) NOT NULL,
+            currency VARCHAR(3),
+            status VARCHAR(20),
+            description TEXT,
+            reference VARCHAR(100),
+            network VARCHAR(50),
+            recipient_phone VARCHAR(20),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute(f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_partitioned")
+    op.execute("DROP TABLE transactions_partitioned CASCADE")
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+    op.execute("CREATE INDEX ix_transactions_id ON transactions (id)")
+    op.execute("CREATE UNIQUE INDEX ix_transactions_reference ON transactions (reference)")
+    op.execute("CREATE INDEX ix_transactions_user_created_id ON transactions (user_id, created_at DESC, id DESC)")
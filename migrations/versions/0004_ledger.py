@@ -0,0 +1,76 @@
+"""Grand livre en partie double (ledger_entries), instantanés de soldes et version des portefeuilles
+
+Les soldes existants sont repris par une opération d'ouverture par portefeuille
+(crédit du portefeuille, débit de system:opening) : le grand livre et le cache
+wallets.balance sont cohérents dès la migration.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import table_exists, column_names
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+BIG_ID = sa.BigInteger().with_variant(sa.Integer(), "sqlite")
+
+
+def upgrade() -> None:
+    if 'version' not in column_names('wallets'):
+        op.add_column('wallets', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+    if not table_exists('ledger_entries'):
+        op.create_table(
+            'ledger_entries',
+            sa.Column('id', BIG_ID, primary_key=True),
+            sa.Column('operation_id', sa.String(36), nullable=False),
+            sa.Column('account', sa.String(50), nullable=False),
+            sa.Column('wallet_id', sa.Integer(), sa.ForeignKey('wallets.id'), nullable=True),
+            sa.Column('direction', sa.String(6), nullable=False),
+            sa.Column('amount', sa.Numeric(15, 2), nullable=False),
+            sa.Column('balance_after', sa.Numeric(15, 2), nullable=True),
+            sa.Column('wallet_version', sa.Integer(), nullable=True),
+            sa.Column('transaction_reference', sa.String(100), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index('ix_ledger_entries_operation_id', 'ledger_entries', ['operation_id'])
+        op.create_index('ix_ledger_entries_wallet_id_id', 'ledger_entries', ['wallet_id', 'id'])
+
+        # Reprise des soldes existants : une opération d'ouverture équilibrée par portefeuille
+        op.execute("""
+            INSERT INTO ledger_entries (operation_id, account, wallet_id, direction, amount, balance_after, wallet_version)
+            SELECT 'opening-' || id, 'wallet:' || id, id,
+                   CASE WHEN balance >= 0 THEN 'credit' ELSE 'debit' END, ABS(balance), balance, 1
+            FROM wallets WHERE balance IS NOT NULL AND balance <> 0
+        """)
+        op.execute("""
+            INSERT INTO ledger_entries (operation_id, account, direction, amount)
+            SELECT 'opening-' || id, 'system:opening',
+                   CASE WHEN balance >= 0 THEN 'debit' ELSE 'credit' END, ABS(balance)
+            FROM wallets WHERE balance IS NOT NULL AND balance <> 0
+        """)
+        op.execute("UPDATE wallets SET version = 1 WHERE balance IS NOT NULL AND balance <> 0")
+
+    if not table_exists('wallet_balance_snapshots'):
+        op.create_table(
+            'wallet_balance_snapshots',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('wallet_id', sa.Integer(), sa.ForeignKey('wallets.id'), nullable=False),
+            sa.Column('balance', sa.Numeric(15, 2), nullable=False),
+            sa.Column('wallet_version', sa.Integer(), nullable=False),
+            sa.Column('last_entry_id', BIG_ID, nullable=False),
+            sa.Column('taken_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index('ix_wallet_balance_snapshots_wallet_taken', 'wallet_balance_snapshots', ['wallet_id', 'taken_at'])
+
+
+def downgrade() -> None:
+    op.drop_table('wallet_balance_snapshots')
+    op.drop_table('ledger_entries')
+    with op.batch_alter_table('wallets') as batch_op:
+        batch_op.drop_column('version')
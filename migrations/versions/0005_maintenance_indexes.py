@@ -0,0 +1,46 @@
+"""Index de la maintenance de fond : otps.expires_at et transactions 'pending' par date de création
+
+L'index des transactions est partiel (WHERE status = 'pending') : il ne contient que les
+quelques lignes en attente. Créés sans bloquer les écritures (CONCURRENTLY sur PostgreSQL,
+partition par partition si transactions est partitionnée).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import (
+    create_index_concurrently, create_partitioned_index_concurrently,
+    drop_index_concurrently, is_partitioned,
+)
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+PENDING = sa.text("status = 'pending'")
+
+
+def upgrade() -> None:
+    create_index_concurrently('ix_otps_expires_at', 'otps', ['expires_at'])
+
+    if is_partitioned('transactions'):
+        create_partitioned_index_concurrently(
+            'ix_transactions_pending_created', 'transactions', 'created_at', where="status = 'pending'"
+        )
+    else:
+        create_index_concurrently(
+            'ix_transactions_pending_created', 'transactions', ['created_at'],
+            postgresql_where=PENDING, sqlite_where=PENDING,
+        )
+
+
+def downgrade() -> None:
+    if is_partitioned('transactions'):
+        # Les index des partitions sont supprimés avec l'index parent
+        op.execute("DROP INDEX IF EXISTS ix_transactions_pending_created")
+    else:
+        drop_index_concurrently('ix_transactions_pending_created', 'transactions')
+    drop_index_concurrently('ix_otps_expires_at', 'otps')
@@ -0,0 +1,117 @@
+"""users.phone_e164 : numéro canonique E.164, index unique, pour toutes les recherches par numéro
+
+La colonne est remplie par lots d'id avec la règle de normalisation de cette version, figée
+ici (indicatif 225 pour les numéros nationaux) : la migration ne dépend ni du code applicatif
+ni de PHONE_DEFAULT_COUNTRY_CODE.
+
+Si plusieurs comptes existants ont le même numéro canonique (ex. "0505979884" et
+"+2250505979884"), la migration échoue sans rien modifier et liste les comptes à fusionner :
+un seul pourrait être retrouvé par son numéro. Les numéros sans forme E.164 gardent
+phone_e164 à NULL (listés) : ces comptes restent joignables par leur numéro exact.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+import re
+from typing import Optional
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import column_names, create_index_concurrently, drop_index_concurrently, is_offline
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Règle de normalisation au moment de la migration (copie figée de app.core.phone)
+SEPARATORS = re.compile(r"[\s().\-/]")
+PHONE_PATTERN = re.compile(r"\+?\d{8,15}")
+NATIONAL_NUMBER_LENGTH = 10
+COUNTRY_CODE = "225"
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    if not phone:
+        return None
+    compact = SEPARATORS.sub("", phone)
+    if compact.startswith("00"):
+        compact = "+" + compact[2:]
+    if not PHONE_PATTERN.fullmatch(compact):
+        return None
+    if compact.startswith("+"):
+        return compact
+    if compact.startswith(COUNTRY_CODE) and len(compact) > NATIONAL_NUMBER_LENGTH:
+        return "+" + compact
+    return "+" + COUNTRY_CODE + compact
+
+
+def user_batches(bind):
+    """(id, phone_number) des comptes, par lots d'id"""
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, phone_number FROM users WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE},
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def check_phone_numbers(bind) -> None:
+    """Avant toute écriture : échec si deux comptes ont le même numéro canonique, liste des numéros invalides"""
+    owners = {}
+    duplicates = {}
+    invalid = []
+    for rows in user_batches(bind):
+        for user_id, phone_number in rows:
+            phone_e164 = normalize_phone(phone_number)
+            if phone_e164 is None:
+                invalid.append((user_id, phone_number))
+            elif phone_e164 in owners:
+                duplicates.setdefault(phone_e164, [owners[phone_e164]]).append((user_id, phone_number))
+            else:
+                owners[phone_e164] = (user_id, phone_number)
+    for user_id, phone_number in invalid:
+        print(f"⚠️ users.id={user_id} ({phone_number!r}) : numéro sans forme E.164, recherché par numéro exact")
+    if duplicates:
+        for phone_e164, accounts in duplicates.items():
+            listed = ", ".join(f"users.id={user_id} ({phone_number})" for user_id, phone_number in accounts)
+            print(f"❌ {phone_e164} : {listed}")
+        raise RuntimeError(
+            f"{len(duplicates)} numéro(s) partagé(s) par plusieurs comptes (liste ci-dessus) : fusionner "
+            "ou renuméroter ces comptes, puis relancer la migration"
+        )
+
+
+def backfill_phone_e164() -> None:
+    bind = op.get_bind()
+    for rows in user_batches(bind):
+        updates = []
+        for user_id, phone_number in rows:
+            phone_e164 = normalize_phone(phone_number)
+            if phone_e164 is not None:
+                updates.append({"id": user_id, "phone_e164": phone_e164})
+        if updates:
+            bind.execute(sa.text("UPDATE users SET phone_e164 = :phone_e164 WHERE id = :id"), updates)
+
+
+def upgrade() -> None:
+    # Vérification avant le DDL : un échec laisse la base inchangée (même sans DDL transactionnel)
+    if not is_offline():
+        check_phone_numbers(op.get_bind())
+    if 'phone_e164' not in column_names('users'):
+        op.add_column('users', sa.Column('phone_e164', sa.String(16), nullable=True))
+    if not is_offline():
+        backfill_phone_e164()
+    create_index_concurrently('ix_users_phone_e164', 'users', ['phone_e164'], unique=True)
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_users_phone_e164', 'users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('phone_e164')
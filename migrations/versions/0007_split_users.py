@@ -0,0 +1,151 @@
+"""Découpage de users (expand) : user_profiles et user_kyc, lus et écrits par le nouveau code
+
+Les données existantes sont copiées par lots d'id (INSERT ... SELECT). Les colonnes de users
+restent en place : pendant un déploiement progressif, les workers de la release précédente
+continuent de les lire et de les écrire, et un trigger recopie leurs modifications dans les
+nouvelles tables. Les colonnes et le trigger sont supprimés par la migration 0009 (contract),
+appliquée à la release suivante.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import column_names, copy_in_batches, is_offline, is_postgresql, table_exists
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Recopie dans user_profiles et user_kyc des écritures des anciens workers sur users
+SYNC_TRIGGER = 'users_legacy_profile_sync'
+
+PROFILE_COLUMNS = [
+    'whatsapp_number', 'email', 'date_of_birth', 'country', 'city', 'address', 'profile_picture_url',
+    'otp_delivery_preference', 'terms_accepted', 'privacy_policy_accepted',
+]
+KYC_COLUMNS = [
+    'id_type', 'id_number', 'id_issue_date', 'id_expiry_date',
+    'front_id_photo_url', 'back_id_photo_url', 'selfie_photo_url',
+]
+
+
+def profile_columns():
+    return [
+        sa.Column('whatsapp_number', sa.String(20), nullable=True),
+        sa.Column('email', sa.String(255), nullable=True),
+        sa.Column('date_of_birth', sa.Date(), nullable=True),
+        sa.Column('country', sa.String(100), nullable=True),
+        sa.Column('city', sa.String(100), nullable=True),
+        sa.Column('address', sa.Text(), nullable=True),
+        sa.Column('profile_picture_url', sa.Text(), nullable=True),
+        sa.Column('otp_delivery_preference', sa.String(10), nullable=True, server_default='sms'),
+        sa.Column('terms_accepted', sa.Boolean(), nullable=True, server_default=sa.false()),
+        sa.Column('privacy_policy_accepted', sa.Boolean(), nullable=True, server_default=sa.false()),
+    ]
+
+
+def kyc_columns():
+    return [
+        sa.Column('id_type', sa.String(50), nullable=True),
+        sa.Column('id_number', sa.String(100), nullable=True),
+        sa.Column('id_issue_date', sa.Date(), nullable=True),
+        sa.Column('id_expiry_date', sa.Date(), nullable=True),
+        sa.Column('front_id_photo_url', sa.String(500), nullable=True),
+        sa.Column('back_id_photo_url', sa.String(500), nullable=True),
+        sa.Column('selfie_photo_url', sa.String(500), nullable=True),
+    ]
+
+
+def user_id_column():
+    return sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+
+
+def upsert(table: str, columns, where: str) -> str:
+    """INSERT ... ON CONFLICT de la ligne NEW de users dans `table` (PostgreSQL et SQLite)"""
+    names = ", ".join(columns)
+    values = ", ".join(f"NEW.{column}" for column in columns)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+    return (
+        f"INSERT INTO {table} (user_id, {names}) SELECT NEW.id, {values} WHERE {where} "
+        f"ON CONFLICT (user_id) DO UPDATE SET {updates}"
+    )
+
+
+def create_sync_trigger() -> None:
+    """Trigger sur les colonnes déplacées : seul l'ancien code les modifie, le nouveau ne les connaît pas"""
+    filled = " OR ".join(f"NEW.{column} IS NOT NULL" for column in KYC_COLUMNS)
+    statements = [
+        upsert('user_profiles', PROFILE_COLUMNS, "1 = 1"),
+        upsert('user_kyc', KYC_COLUMNS, f"{filled} OR EXISTS (SELECT 1 FROM user_kyc WHERE user_id = NEW.id)"),
+    ]
+    body = ";\n    ".join(statements)
+    columns = ", ".join(PROFILE_COLUMNS + KYC_COLUMNS)
+    if is_postgresql():
+        op.execute(
+            f"CREATE OR REPLACE FUNCTION {SYNC_TRIGGER}() RETURNS trigger AS $$\n"
+            f"BEGIN\n    {body};\n    RETURN NULL;\nEND\n$$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            f"CREATE TRIGGER {SYNC_TRIGGER} AFTER UPDATE OF {columns} ON users "
+            f"FOR EACH ROW EXECUTE FUNCTION {SYNC_TRIGGER}()"
+        )
+    else:
+        op.execute(f"CREATE TRIGGER {SYNC_TRIGGER} AFTER UPDATE OF {columns} ON users FOR EACH ROW BEGIN\n    {body};\nEND")
+
+
+def drop_sync_trigger() -> None:
+    if is_postgresql():
+        op.execute(f"DROP TRIGGER IF EXISTS {SYNC_TRIGGER} ON users")
+        op.execute(f"DROP FUNCTION IF EXISTS {SYNC_TRIGGER}()")
+    else:
+        op.execute(f"DROP TRIGGER IF EXISTS {SYNC_TRIGGER}")
+
+
+def upgrade() -> None:
+    moved = set(PROFILE_COLUMNS) & column_names('users')
+
+    if not table_exists('user_profiles'):
+        op.create_table('user_profiles', user_id_column(), *profile_columns())
+        op.create_index('ix_user_profiles_email', 'user_profiles', ['email'], unique=True)
+    if not table_exists('user_kyc'):
+        op.create_table('user_kyc', user_id_column(), *kyc_columns())
+
+    if not moved and not is_offline():
+        return
+
+    # Trigger d'abord : une ligne déjà recopiée par le trigger pendant la copie est plus récente, gardée telle quelle
+    create_sync_trigger()
+
+    # Un profil par utilisateur ; une ligne KYC seulement si une information KYC est renseignée
+    columns = ", ".join(PROFILE_COLUMNS)
+    copy_in_batches(
+        f"INSERT INTO user_profiles (user_id, {columns}) SELECT id, {columns} FROM users "
+        "WHERE id > :low AND id <= :high ON CONFLICT (user_id) DO NOTHING"
+    )
+    columns = ", ".join(KYC_COLUMNS)
+    filled = " OR ".join(f"{column} IS NOT NULL" for column in KYC_COLUMNS)
+    copy_in_batches(
+        f"INSERT INTO user_kyc (user_id, {columns}) SELECT id, {columns} FROM users "
+        f"WHERE id > :low AND id <= :high AND ({filled}) ON CONFLICT (user_id) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    drop_sync_trigger()
+
+    # Modifications faites par le nouveau code : recopiées dans les colonnes de users
+    for table, columns in (('user_profiles', PROFILE_COLUMNS), ('user_kyc', KYC_COLUMNS)):
+        assignments = ", ".join(
+            f"{column} = (SELECT {column} FROM {table} WHERE {table}.user_id = users.id)" for column in columns
+        )
+        copy_in_batches(
+            f"UPDATE users SET {assignments} WHERE id > :low AND id <= :high "
+            f"AND EXISTS (SELECT 1 FROM {table} WHERE {table}.user_id = users.id)"
+        )
+
+    op.drop_table('user_kyc')
+    op.drop_index('ix_user_profiles_email', table_name='user_profiles')
+    op.drop_table('user_profiles')
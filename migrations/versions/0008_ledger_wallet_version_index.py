@@ -0,0 +1,23 @@
+"""Index des écritures du grand livre par (wallet_id, wallet_version)
+
+Les instantanés et le solde à une date délimitent les écritures d'un portefeuille par version
+(et non plus par id d'écriture). Créé sans bloquer les écritures (CONCURRENTLY sur PostgreSQL).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from migrations.helpers import create_index_concurrently, drop_index_concurrently
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    create_index_concurrently('ix_ledger_entries_wallet_version', 'ledger_entries', ['wallet_id', 'wallet_version'])
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_ledger_entries_wallet_version', 'ledger_entries')
@@ -0,0 +1,59 @@
+"""Tests de l'API sur une base SQLite temporaire (schéma créé par les migrations)
+
+    python -m pytest -q
+
+L'environnement est fixé avant l'import de l'application : les réglages sont lus à l'import de config.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_DIR = tempfile.mkdtemp(prefix="fintel-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATA_DIR}/fintel.db"
+os.environ["TRANSACTIONS_ARCHIVE_DIR"] = os.path.join(DATA_DIR, "archives")
+os.environ["MEDIA_DIR"] = os.path.join(DATA_DIR, "media")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ.pop("CACHE_REDIS_URL", None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from migrate import run_migrations
+
+run_migrations()
+
+from app.main import app  # noqa: E402
+
+PASSWORD = "secret1"
+_phones = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+
+class User:
+    def __init__(self, phone: str, token: str, user_id: int):
+        self.phone = phone
+        self.token = token
+        self.id = user_id
+
+
+@pytest.fixture
+def make_user(client):
+    """Créer un utilisateur (numéro unique sur la session de tests) et le connecter"""
+
+    def make() -> User:
+        phone = f"07{next(_phones):08d}"
+        response = client.post("/api/v1/auth/register", json={"phone_number": phone, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        token = client.post("/api/v1/auth/login", json={"phone_number": phone, "password": PASSWORD}).json()["access_token"]
+        wallet = client.get("/api/v1/transactions/wallet", params={"phone": phone}).json()
+        return User(phone, token, wallet["user_id"])
+
+    return make
@@ -0,0 +1,37 @@
+import pytest
+
+from app.core.pagination import NEXT_CURSOR_HEADER
+
+
+def walk_history(client, phone: str, limit: int):
+    """Toutes les pages de l'historique, en suivant X-Next-Cursor (bornée : une boucle fait échouer le test)"""
+    pages, cursor = [], None
+    for _ in range(50):
+        params = {"phone": phone, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/v1/transactions/history", params=params)
+        assert response.status_code == 200, response.text
+        pages.append([transaction["id"] for transaction in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+    pytest.fail(f"Pagination sans fin : {pages[:4]}...")
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_history_pages_cover_every_transaction_once(client, make_user, limit):
+    user = make_user()
+    # Transactions créées dans la même seconde : created_at égaux, départagés par id
+    for amount in range(1, 8):
+        response = client.post(
+            "/api/v1/transactions/deposit", params={"token": user.token},
+            json={"transaction_type": "deposit", "amount": str(amount), "network": "orange"},
+        )
+        assert response.status_code == 200, response.text
+
+    pages = walk_history(client, user.phone, limit)
+    ids = [transaction_id for page in pages for transaction_id in page]
+    assert all(len(page) <= limit for page in pages)
+    assert len(ids) == len(set(ids)) == 7
+    assert ids == sorted(ids, reverse=True)
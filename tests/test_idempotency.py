@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.core.idempotency import (
+    IDEMPOTENCY_KEY_HEADER, IDEMPOTENT_REPLAY_HEADER, MISMATCH, NEW, PENDING, REPLAY, MemoryIdempotencyStore,
+)
+
+
+def balance(client, phone: str) -> float:
+    return client.get("/api/v1/transactions/wallet", params={"phone": phone}).json()["balance"]
+
+
+def deposit(client, user, key: str, amount: str = "100"):
+    return client.post(
+        "/api/v1/transactions/deposit", params={"token": user.token}, headers={IDEMPOTENCY_KEY_HEADER: key},
+        json={"transaction_type": "deposit", "amount": amount, "network": "orange"},
+    )
+
+
+def test_retry_replays_the_original_response(client, make_user):
+    user = make_user()
+    start = balance(client, user.phone)
+
+    first = deposit(client, user, "dep-1")
+    retry = deposit(client, user, "dep-1")
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers.get(IDEMPOTENT_REPLAY_HEADER) == "true"
+    assert retry.json() == first.json()
+    assert balance(client, user.phone) == start + 100
+
+
+def test_same_key_different_body_is_rejected(client, make_user):
+    user = make_user()
+    assert deposit(client, user, "dep-2", "100").status_code == 200
+    assert deposit(client, user, "dep-2", "200").status_code == 422
+
+
+def test_keys_are_scoped_per_user(client, make_user):
+    first, second = make_user(), make_user()
+    assert deposit(client, first, "shared").status_code == 200
+    response = deposit(client, second, "shared")
+    assert response.status_code == 200
+    assert IDEMPOTENT_REPLAY_HEADER.lower() not in response.headers
+
+
+def test_fintel_transfer_keys_are_scoped_by_sender_phone(client, make_user):
+    first, second, recipient = make_user(), make_user(), make_user()
+
+    def fintel_transfer(sender):
+        return client.post(
+            "/api/v1/transactions/fintel-transfer", headers={IDEMPOTENCY_KEY_HEADER: "fintel-1"},
+            json={"sender_phone": sender.phone, "recipient_phone": recipient.phone, "amount": "3"},
+        )
+
+    start = balance(client, recipient.phone)
+    assert fintel_transfer(first).status_code == 200
+    # Même clé, autre expéditeur sans token : traité, pas rejoué
+    response = fintel_transfer(second)
+    assert response.status_code == 200
+    assert IDEMPOTENT_REPLAY_HEADER.lower() not in response.headers
+    # Nouvelle tentative du premier expéditeur : rejouée
+    assert fintel_transfer(first).headers.get(IDEMPOTENT_REPLAY_HEADER) == "true"
+    assert balance(client, recipient.phone) == start + 6
+
+
+def test_batch_transfer_is_idempotent(client, make_user):
+    sender, recipient = make_user(), make_user()
+    start = balance(client, recipient.phone)
+    body = {"lines": [{"recipient_phone": recipient.phone, "amount": "10"}]}
+    for _ in range(2):
+        response = client.post(
+            "/api/v1/transactions/batch-transfer", params={"token": sender.token},
+            headers={IDEMPOTENCY_KEY_HEADER: "batch-1"}, json=body,
+        )
+        assert response.status_code == 200, response.text
+    assert response.headers.get(IDEMPOTENT_REPLAY_HEADER) == "true"
+    assert balance(client, recipient.phone) == start + 10
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_waits_for_the_first_request():
+    store = MemoryIdempotencyStore(ttl=60, max_entries=10)
+    state, record = await store.begin("k", "fp")
+    assert state == NEW
+    state, pending = await store.begin("k", "fp")
+    assert state == PENDING
+    assert (await store.begin("k", "other"))[0] == MISMATCH
+
+    waiter = asyncio.create_task(store.wait("k", pending, timeout=1))
+    await store.complete("k", record, 201, [], b"{}")
+    assert (await waiter).status == 201
+    assert (await store.begin("k", "fp"))[0] == REPLAY
+
+
+@pytest.mark.asyncio
+async def test_full_store_evicts_oldest_completed_keys_only():
+    store = MemoryIdempotencyStore(ttl=60, max_entries=3)
+    _, pending = await store.begin("pending", "fp")
+    for key in ("a", "b"):
+        _, record = await store.begin(key, "fp")
+        await store.complete(key, record, 200, [], b"")
+
+    # Plein : la plus ancienne réponse terminée est évincée, jamais une requête en cours
+    assert (await store.begin("c", "fp"))[0] == NEW
+    assert (await store.begin("a", "fp"))[0] == NEW
+    assert (await store.begin("pending", "fp"))[0] == PENDING
+    assert len(store._records) <= 3
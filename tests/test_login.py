@@ -0,0 +1,47 @@
+import bcrypt
+import sqlalchemy as sa
+
+from app.core.database import SessionLocal
+from app.models.user import User
+from config import settings
+
+PASSWORD = "secret1"
+
+
+def insert_user(phone_number: str, is_active: bool) -> str:
+    """Compte dont le hash a été calculé avec un autre coût que BCRYPT_ROUNDS"""
+    hashed_password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=4)).decode()
+    db = SessionLocal()
+    try:
+        db.execute(sa.insert(User).values(
+            phone_number=phone_number, phone_e164=f"+225{phone_number}", hashed_password=hashed_password,
+            is_active=is_active,
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return hashed_password
+
+
+def stored_hash(phone_number: str) -> str:
+    db = SessionLocal()
+    try:
+        return db.execute(sa.select(User.hashed_password).where(User.phone_number == phone_number)).scalar_one()
+    finally:
+        db.close()
+
+
+def login(client, phone_number: str):
+    return client.post("/api/v1/auth/login", json={"phone_number": phone_number, "password": PASSWORD})
+
+
+def test_login_rehashes_with_the_configured_cost(client):
+    insert_user("0790000001", is_active=True)
+    assert login(client, "0790000001").status_code == 200
+    assert stored_hash("0790000001").startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+
+
+def test_inactive_account_is_not_rehashed(client):
+    hashed_password = insert_user("0790000002", is_active=False)
+    assert login(client, "0790000002").status_code == 400
+    assert stored_hash("0790000002") == hashed_password
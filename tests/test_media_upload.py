@@ -0,0 +1,64 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.api.v1.media import receive_media
+from app.services.media_store import media_store
+
+BOUNDARY = "fintel-boundary"
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+
+
+def multipart_parts(data: bytes, field: str = "file"):
+    """Corps multipart en trois morceaux : en-têtes de la partie, contenu, délimiteur final"""
+    yield (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"a.png\"\r\n"
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode()
+    yield data
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def upload(client, user, chunks):
+    return client.post(
+        "/api/v1/media/selfie", params={"token": user.token}, content=chunks,
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+
+
+def test_upload_split_in_small_chunks(client, make_user):
+    user = make_user()
+    body = b"".join(multipart_parts(PNG))
+    response = upload(client, user, (body[i:i + 7] for i in range(0, len(body), 7)))
+    assert response.status_code == 200, response.text
+    assert response.json()["size"] == len(PNG)
+    assert client.get(response.json()["url"]).content == PNG
+
+
+def test_chunked_upload_over_the_limit_is_rejected(client, make_user, monkeypatch):
+    monkeypatch.setattr(media_store, "max_bytes", 1000)
+    user = make_user()
+    # Sans Content-Length (Transfer-Encoding: chunked) : la limite est contrôlée pendant la lecture
+    response = upload(client, user, multipart_parts(PNG * 10))
+    assert response.status_code == 413
+    assert upload(client, user, multipart_parts(b"", field="other")).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_reading_stops_once_the_limit_is_exceeded(monkeypatch):
+    monkeypatch.setattr(media_store, "max_bytes", 1000)
+    sent = []
+    chunks = [next(multipart_parts(b""))] + [b"\x89PNG\r\n\x1a\n" + b"\x00" * 492] * 100
+
+    async def receive():
+        sent.append(chunks[len(sent)])
+        return {"type": "http.request", "body": sent[-1], "more_body": len(sent) < len(chunks)}
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/", "query_string": b"",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }
+    with pytest.raises(HTTPException) as error:
+        await receive_media(Request(scope, receive))
+    assert error.value.status_code == 413
+    assert len(sent) <= 4
@@ -0,0 +1,76 @@
+import pytest
+import sqlalchemy as sa
+
+from app.core.security import get_password_hash
+from app.core.database import SessionLocal
+from app.models.user import User
+from config import settings
+from migrate import run_migrations
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """Base SQLite séparée, à la version 0005 (avant phone_e164)"""
+    monkeypatch.setattr(settings, "database_url", f"sqlite:///{tmp_path}/legacy.db")
+    run_migrations("0005")
+    engine = sa.create_engine(settings.database_url)
+    yield engine
+    engine.dispose()
+
+
+def insert_users(engine, *phone_numbers):
+    with engine.begin() as connection:
+        for phone_number in phone_numbers:
+            connection.execute(sa.text("INSERT INTO users (phone_number) VALUES (:phone)"), {"phone": phone_number})
+
+
+def phone_e164_by_number(engine) -> dict:
+    with engine.connect() as connection:
+        return dict(connection.execute(sa.text("SELECT phone_number, phone_e164 FROM users")).all())
+
+
+def test_backfill_uses_the_frozen_country_code(legacy_db, monkeypatch, capsys):
+    insert_users(legacy_db, "05 05 97 98 84", "+33612345678", "2250707070707", "pas-un-numero")
+    # Le réglage courant n'influe pas sur la migration
+    monkeypatch.setattr(settings, "phone_default_country_code", "33")
+    run_migrations("0006")
+
+    assert phone_e164_by_number(legacy_db) == {
+        "05 05 97 98 84": "+2250505979884",
+        "+33612345678": "+33612345678",
+        "2250707070707": "+2250707070707",
+        "pas-un-numero": None,
+    }
+    assert "pas-un-numero" in capsys.readouterr().out
+
+
+def test_duplicate_numbers_fail_the_migration_with_a_report(legacy_db, capsys):
+    insert_users(legacy_db, "0505979884", "+2250505979884", "0707070707")
+    with pytest.raises(RuntimeError, match="fusionner"):
+        run_migrations("0006")
+
+    report = capsys.readouterr().out
+    assert "+2250505979884" in report and "users.id=1" in report and "users.id=2" in report
+    # Rien n'est modifié : colonne absente, base toujours en 0005
+    assert "phone_e164" not in {column["name"] for column in sa.inspect(legacy_db).get_columns("users")}
+
+
+def test_account_without_e164_number_can_still_log_in(client):
+    db = SessionLocal()
+    try:
+        # Compte existant dont le numéro n'a pas de forme E.164 (phone_e164 laissé à NULL par 0006)
+        db.execute(sa.insert(User).values(
+            phone_number="12-34", phone_e164=None, hashed_password=get_password_hash("secret1"), is_active=True,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.post("/api/v1/auth/login", json={"phone_number": "12-34", "password": "secret1"})
+    assert response.status_code == 200, response.text
+    # Token dont le sujet est le numéro tel qu'enregistré
+    deposit = client.post(
+        "/api/v1/transactions/deposit", params={"token": response.json()["access_token"]},
+        json={"transaction_type": "deposit", "amount": "5", "network": "orange"},
+    )
+    assert deposit.status_code == 200, deposit.text
@@ -0,0 +1,25 @@
+from datetime import date, datetime, timezone
+
+import orjson
+
+from app.core.responses import USER_PROFILE_SERIALIZER, dumps, serialize
+
+
+def test_profile_datetimes_keep_the_isoformat_wire_format():
+    # Colonnes timezone=True sur PostgreSQL : datetimes UTC avec fuseau
+    created_at = datetime(2026, 10, 18, 9, 30, 0, 123456, tzinfo=timezone.utc)
+    user = {"id": 1, "phone_number": "0700000001", "date_of_birth": date(1990, 5, 1), "created_at": created_at}
+
+    profile = orjson.loads(dumps({"user": serialize(USER_PROFILE_SERIALIZER, user)}))["user"]
+
+    assert profile["created_at"] == created_at.isoformat() == "2026-10-18T09:30:00.123456+00:00"
+    assert profile["updated_at"] is None
+    assert profile["date_of_birth"] == "1990-05-01"
+
+
+def test_profile_endpoint_returns_isoformat_dates(client, make_user):
+    user = make_user()
+    response = client.get("/api/v1/user/profile", params={"phone": user.phone})
+    assert response.status_code == 200, response.text
+    created_at = response.json()["user"]["created_at"]
+    assert created_at and not created_at.endswith("Z")
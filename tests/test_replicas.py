@@ -0,0 +1,29 @@
+from app.core.replicas import ReplicaRouter, parse_lsn, parse_read_token
+
+
+def make_router(replayed: int, age: float, head: int) -> ReplicaRouter:
+    router = ReplicaRouter(max_lag=5.0)
+    replica = router.add("replica0", engine=None, session_factory=None)
+    router.refresh_lag(replica, head, lambda: (replayed, age))
+    return router
+
+
+def test_replica_behind_the_primary_is_lagging_even_if_idle():
+    # WAL reçu entièrement rejoué (receive == replay) mais en retard sur le primaire
+    router = make_router(replayed=parse_lsn("0/100"), age=30.0, head=parse_lsn("0/200"))
+    assert router.replicas[0].lag == 30.0
+    assert router.choose(None) is None
+
+
+def test_replica_serves_a_token_only_once_replayed():
+    router = make_router(replayed=parse_lsn("0/200"), age=30.0, head=parse_lsn("0/200"))
+    assert router.replicas[0].lag == 0.0
+    assert router.choose("0/200") is router.replicas[0]
+    assert router.choose("0/201") is None
+    assert router.choose("1/0") is None
+
+
+def test_lsn_token_format():
+    assert parse_lsn("16/B374D848") == (0x16 << 32) | 0xB374D848
+    assert parse_read_token("16/B374D848") == parse_lsn("16/B374D848")
+    assert parse_read_token("pas-un-jeton") is None
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from app.models.transaction import Wallet
+from app.services.wallet_cache import wallet_cache
+
+
+def cached(user_id: int) -> dict:
+    return wallet_cache.backend.get(str(user_id))
+
+
+def test_payout_publishes_recipient_wallets(client, make_user):
+    sender, recipient = make_user(), make_user()
+    before = client.get("/api/v1/transactions/wallet", params={"phone": recipient.phone}).json()
+    assert cached(recipient.id)["version"] == before["version"]
+
+    response = client.post(
+        "/api/v1/transactions/batch-transfer", params={"token": sender.token},
+        json={"lines": [{"recipient_phone": recipient.phone, "amount": "10"}, {"recipient_phone": recipient.phone, "amount": "5"}]},
+    )
+    assert response.status_code == 200, response.text
+
+    # Le portefeuille crédité est republié (pas seulement invalidé) avec sa nouvelle version
+    entry = cached(recipient.id)
+    assert entry is not None
+    assert Decimal(entry["balance"]) == Decimal(str(before["balance"])) + 15
+    assert entry["version"] == before["version"] + 2
+
+
+def test_stale_read_cannot_overwrite_payout(client, make_user):
+    sender, recipient = make_user(), make_user()
+    before = client.get("/api/v1/transactions/wallet", params={"phone": recipient.phone}).json()
+    client.post(
+        "/api/v1/transactions/batch-transfer", params={"token": sender.token},
+        json={"lines": [{"recipient_phone": recipient.phone, "amount": "7"}]},
+    )
+
+    # Lecture concurrente (ou réplica en retard) qui republie l'ancien portefeuille
+    stale = Wallet(
+        id=before["id"], user_id=recipient.id, balance=Decimal(str(before["balance"])),
+        currency="XOF", is_active=True, version=before["version"],
+    )
+    wallet_cache.put(stale)
+
+    wallet = client.get("/api/v1/transactions/wallet", params={"phone": recipient.phone}).json()
+    assert Decimal(str(wallet["balance"])) == Decimal(str(before["balance"])) + 7
+    assert wallet["version"] == before["version"] + 1
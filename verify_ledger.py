@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Vérifier la cohérence du grand livre (ledger_entries) et des soldes en cache (wallets.balance)
+
+- chaque opération doit être équilibrée (débits = crédits)
+- le solde en cache de chaque portefeuille doit égaler la somme de ses écritures
+
+Remplace les vérifications manuelles de migrations/verify_and_fix_wallets.sql.
+
+    python verify_ledger.py              # vérifier (code de sortie 1 en cas d'écart)
+    python verify_ledger.py --snapshot   # prendre aussi les instantanés de soldes en attente
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import SessionLocal
+from app.models.user import User  # noqa: F401 (relations User <-> Wallet / Transaction)
+from app.services.ledger_service import LedgerService, run_ledger_snapshots
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Vérification du grand livre")
+    parser.add_argument("--snapshot", action="store_true", help="Prendre les instantanés de soldes en attente")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        print(f"📸 {run_ledger_snapshots()} instantané(s) pris")
+
+    db = SessionLocal()
+    try:
+        report = LedgerService(db).verify()
+    finally:
+        db.close()
+
+    for operation in report["unbalanced_operations"]:
+        print(f"❌ Opération déséquilibrée {operation['operation_id']}: écart {operation['net']}")
+    for wallet in report["wallet_drift"]:
+        print(
+            f"❌ Portefeuille {wallet['wallet_id']}: solde en cache {wallet['cached_balance']} "
+            f"!= grand livre {wallet['ledger_balance']}"
+        )
+    if report["unbalanced_operations"] or report["wallet_drift"]:
+        return 1
+    print("✅ Grand livre cohérent")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())